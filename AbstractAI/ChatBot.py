@@ -1,11 +1,89 @@
 from AbstractAI.Model.Converse import *
 from AbstractAI.LLMs.LLM import LLM, LLM_Response
 from AbstractAI.Model.Converse.ConversationCollection import ConversationCollection
+from threading import Condition, Thread
+from typing import Any, Dict, Optional
+import time
+
+class _HedgedAttempt:
+	'''Streams one model's answer on a worker thread, noting when its first token arrives.'''
+	def __init__(self, role:str, model:LLM, conversation:Conversation, condition:Condition):
+		self.role = role
+		self.model = model
+		self.conversation = conversation
+		self.condition = condition
+		
+		self.response:LLM_Response = None
+		self.error:Exception = None
+		self.start_time:float = None
+		self.ready_time:float = None
+		self.time_to_first_token:float = None
+		self.done = False
+		self.cancelled = False
+		
+		self.thread = Thread(target=self._run, daemon=True)
+	
+	@property
+	def ready(self) -> bool:
+		'''True once this has produced a token, or finished without failing.'''
+		return self.ready_time is not None
+	
+	def start(self):
+		self.start_time = time.perf_counter()
+		self.thread.start()
+	
+	def cancel(self):
+		with self.condition:
+			self.cancelled = True
+			response = self.response
+		if response is not None:
+			response.stop()
+	
+	def _run(self):
+		try:
+			responses = self.model.chat(self.conversation, stream=True)
+			try:
+				for response in responses:
+					with self.condition:
+						self.response = response
+						if self.time_to_first_token is None and len(response.message.content) > 0:
+							self.ready_time = time.perf_counter()
+							self.time_to_first_token = self.ready_time - self.start_time
+							self.condition.notify_all()
+						if self.cancelled:
+							break
+			finally:
+				responses.close()
+			if self.cancelled and self.response is not None:
+				self.response.stop()
+		except Exception as e:
+			with self.condition:
+				self.error = e
+		finally:
+			with self.condition:
+				self.done = True
+				if self.ready_time is None and self.error is None:
+					self.ready_time = time.perf_counter()
+				self.condition.notify_all()
+	
+	def summary(self) -> Dict[str,Any]:
+		return {
+			"model":self.model.settings.user_model_name,
+			"time_to_first_token":self.time_to_first_token,
+			"error":None if self.error is None else repr(self.error)
+		}
 
 class ChatBot:
-	def __init__(self, model:LLM, conversations:ConversationCollection, conversation:Conversation=None, fallback_model:LLM=None):
+	def __init__(self, model:LLM, conversations:ConversationCollection, conversation:Conversation=None, fallback_model:LLM=None, hedge_delay:float=None):
+		'''
+		If hedge_delay is set, fallback_model is also asked once model has
+		gone that many seconds without producing a token, and whichever of
+		them answers first is used. Otherwise fallback_model is only asked
+		if model fails.
+		'''
 		self.model = model
 		self.fallback_model = fallback_model
+		self.hedge_delay = hedge_delay
 		self.conversations = conversations
 		
 		if conversation is None:
@@ -16,29 +94,86 @@ class ChatBot:
 		self.default_source = UserSource()
 		
 		self.last_response = None
-		
+	
 	def prompt(self, prompt:str, source:MessageSource=None) -> str:
 		if source is None:
 			source = self.default_source
-			
+		
 		msg = Message(prompt, source)
 		self.conversation.add_message(msg)
 		
 		self.last_response = None
 		
-		try:
-			self.last_response = self.model.chat(self.conversation)
-		except:
-			if self.fallback_model is not None:
-				try:
-					self.last_response = self.fallback_model.chat(self.conversation)
-				except:
+		if self.fallback_model is not None and self.hedge_delay is not None:
+			self.last_response = self._hedged_chat()
+		else:
+			try:
+				self.last_response = self.model.chat(self.conversation)
+			except:
+				if self.fallback_model is not None:
+					try:
+						self.last_response = self.fallback_model.chat(self.conversation)
+					except:
+						pass
+				else:
 					pass
-			else:
-				pass
 		
 		if self.last_response is None:
 			return None
 		
 		self.conversation.add_message(self.last_response.message)
-		return self.last_response.message.content
\ No newline at end of file
+		return self.last_response.message.content
+	
+	def _hedged_chat(self) -> Optional[LLM_Response]:
+		'''
+		Streams from model, starting fallback_model alongside it if it
+		fails or hasn't produced a token within hedge_delay. The first to
+		produce a token wins and the other is stopped.
+		
+		If the winner fails after its first token the other has already
+		been stopped, so it's asked again from the start.
+		
+		Which won and each one's time to first token are recorded in
+		the winner's serialized_raw_output under "Hedge".
+		'''
+		condition = Condition()
+		primary = _HedgedAttempt("primary", self.model, self.conversation, condition)
+		fallback = _HedgedAttempt("fallback", self.fallback_model, self.conversation, condition)
+		
+		primary.start()
+		with condition:
+			condition.wait_for(lambda: primary.ready or primary.done, timeout=self.hedge_delay)
+			if not primary.ready:
+				fallback.start()
+				condition.wait_for(lambda: primary.ready or fallback.ready or (primary.done and fallback.done))
+		
+		attempts = [a for a in [primary, fallback] if a.ready]
+		if len(attempts) == 0:
+			return None
+		winner = min(attempts, key=lambda a: a.ready_time)
+		for attempt in [primary, fallback]:
+			if attempt is not winner and attempt.start_time is not None:
+				attempt.cancel()
+		
+		winner.thread.join()
+		failed = None
+		if winner.error is not None or winner.response is None:
+			failed = winner
+			other = fallback if winner is primary else primary
+			winner = _HedgedAttempt(other.role, other.model, self.conversation, condition)
+			winner.start()
+			winner.thread.join()
+			if winner.error is not None or winner.response is None:
+				return None
+			if winner.role == "primary":
+				primary = winner
+			else:
+				fallback = winner
+		
+		winner.response.source.serialized_raw_output["Hedge"] = {
+			"winner":winner.role,
+			"primary":primary.summary(),
+			"fallback":fallback.summary() if fallback.start_time is not None else None,
+			"failed":None if failed is None else failed.summary()
+		}
+		return winner.response
\ No newline at end of file
@@ -0,0 +1,27 @@
+from threading import Lock
+from typing import Callable, Generic, TypeVar
+import asyncio
+import weakref
+
+T = TypeVar("T")
+
+class LoopLocal(Generic[T]):
+	'''
+	One value per event loop, made by make the first time it's asked
+	for on each loop, for things like async clients and locks that are
+	bound to the loop they were first used on. Values are dropped with
+	their loop.
+	'''
+	def __init__(self, make:Callable[[], T]):
+		self.make = make
+		self._values:weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+		self._lock = Lock()
+	
+	def get(self) -> T:
+		'''The value for the running event loop.'''
+		loop = asyncio.get_running_loop()
+		with self._lock:
+			value = self._values.get(loop, None)
+			if value is None:
+				value = self._values[loop] = self.make()
+			return value
\ No newline at end of file
@@ -0,0 +1,51 @@
+from typing import Dict, Iterator
+import json
+import mmap
+import struct
+
+import torch
+
+_DTYPES = {
+	"F64":torch.float64, "F32":torch.float32, "F16":torch.float16, "BF16":torch.bfloat16,
+	"I64":torch.int64, "I32":torch.int32, "I16":torch.int16, "I8":torch.int8,
+	"U8":torch.uint8, "BOOL":torch.bool
+}
+
+class MappedSafetensors:
+	'''
+	The tensors in a .safetensors file, backed by a copy on write memory
+	map of it rather than read into memory.
+	
+	Pages are only read from disk when a tensor is first used, and are
+	shared through the page cache with every other process mapping the
+	same file until something writes to them.
+	'''
+	def __init__(self, path:str):
+		self.path = path
+		with open(path, "rb") as file:
+			self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+		
+		header_size = struct.unpack("<Q", self.mmap[:8])[0]
+		self.header:Dict[str,dict] = json.loads(self.mmap[8:8+header_size])
+		self.metadata:Dict[str,str] = self.header.pop("__metadata__", {})
+		self.data_start = 8 + header_size
+	
+	@property
+	def nbytes(self) -> int:
+		return len(self.mmap)
+	
+	def keys(self) -> Iterator[str]:
+		return iter(self.header.keys())
+	
+	def tensor(self, name:str) -> torch.Tensor:
+		'''The tensor called name, viewing the mapped file without copying it.'''
+		info = self.header[name]
+		dtype = _DTYPES[info["dtype"]]
+		start, end = info["data_offsets"]
+		count = (end - start) // torch.empty(0, dtype=dtype).element_size()
+		if count == 0:
+			return torch.empty(info["shape"], dtype=dtype)
+		return torch.frombuffer(self.mmap, dtype=dtype, count=count, offset=self.data_start + start).reshape(info["shape"])
+	
+	def state_dict(self) -> Dict[str, torch.Tensor]:
+		return {name:self.tensor(name) for name in self.keys()}
\ No newline at end of file
@@ -0,0 +1,19 @@
+from typing import Sequence
+
+def shared_prefix_length(a:Sequence, b:Sequence) -> int:
+	'''
+	The number of items at the start of a and b that are equal, found by
+	comparing slices so that long lists and strings are compared at C speed.
+	'''
+	length = min(len(a), len(b))
+	if a[:length] == b[:length]:
+		return length
+	# a[:low] matches b[:low] and a[:high] doesn't match b[:high]:
+	low, high = 0, length
+	while high - low > 1:
+		middle = (low + high) // 2
+		if a[:middle] == b[:middle]:
+			low = middle
+		else:
+			high = middle
+	return low
\ No newline at end of file
@@ -0,0 +1,246 @@
+from AbstractAI.Model.Converse import Message
+from AbstractAI.LLMs.CommonRoles import CommonRoles
+from AbstractAI.LLMs.ContextWindow import ContextWindow
+from AbstractAI.Helpers.shared_prefix_length import shared_prefix_length
+from operator import attrgetter
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+role_mapping = {
+	CommonRoles.System.value: "system",
+	CommonRoles.User.value: "user",
+	CommonRoles.Assistant.value: "assistant"
+}
+
+class RenderedMessages:
+	'''
+	The chat list rendered from a sequence of messages, along with
+	the state after each message needed to resume rendering from any
+	prefix of it.
+	
+	This is only ever added to, so the RenderedSequence views of its
+	prefixes never change. Entries in chat are never modified once added,
+	merging a message into the previous entry replaces that entry instead,
+	so a sequence that branches from a prefix of this can copy the lists.
+	'''
+	def __init__(self):
+		self.message_ids:List[str] = []
+		self.roles:List[Tuple[str, Optional[str]]] = []
+		self.entry_counts:List[int] = []
+		self.last_entries:List[Dict[str,str]] = []
+		self.chat:List[Dict[str,str]] = []
+		
+		# The content of messages a model was still writing when they
+		# were rendered, by index, since they're the only ones that change:
+		self.generating:Dict[int,str] = {}
+		
+		# Filled in as needed by the LLM that rendered this:
+		self.context = ContextWindow()
+		
+		# The prompt text of each entry in chat but the last, for each
+		# template, and the text of them all joined together so far:
+		self.segments:Dict[str, List[str]] = {}
+		self.heads:Dict[str, Tuple[int,str]] = {}
+		self._segments_lock = Lock()
+		
+		self.views:Dict[int, RenderedSequence] = {}
+	
+	def __len__(self):
+		return len(self.message_ids)
+	
+	def shared_prefix_length(self, message_ids:List[str], messages:List[Message]) -> int:
+		'''The number of messages at the start of messages that this was rendered from.'''
+		length = shared_prefix_length(message_ids, self.message_ids)
+		for index, content in self.generating.items():
+			if index < length and messages[index].content != content:
+				length = index
+		return length
+	
+	def truncated(self, length:int) -> "RenderedMessages":
+		'''A copy of this rendered from only the first length messages.'''
+		copy = RenderedMessages()
+		if length == 0:
+			return copy
+		copy.message_ids = self.message_ids[:length]
+		copy.roles = self.roles[:length]
+		copy.entry_counts = self.entry_counts[:length]
+		copy.last_entries = self.last_entries[:length]
+		copy.chat = self.chat[:self.entry_counts[length-1]]
+		copy.chat[-1] = self.last_entries[length-1]
+		copy.generating = {index:content for index, content in self.generating.items() if index < length}
+		copy.context = self.context.truncated(length)
+		with self._segments_lock:
+			for template, segments in self.segments.items():
+				copy.segments[template] = segments[:len(copy.chat)-1]
+		return copy
+	
+	def prompt_head(self, template:str, render_segment:Callable[[Dict[str,str],int],str], count:int) -> str:
+		'''
+		The prompt text of the first count entries of chat, rendering
+		only those that template hasn't rendered for this before.
+		'''
+		if count <= 0:
+			return ""
+		with self._segments_lock:
+			segments = self.segments.setdefault(template, [])
+			for index in range(len(segments), count):
+				segments.append(render_segment(self.chat[index], index))
+			
+			head_count, head = self.heads.get(template, (0, ""))
+			if head_count > count:
+				return "".join(segments[:count])
+			head += "".join(segments[head_count:count])
+			self.heads[template] = (count, head)
+			return head
+
+class RenderedSequence:
+	'''
+	The chat list rendered from the first length messages of a
+	RenderedMessages, which never changes once made so that any number
+	of requests can share it.
+	'''
+	def __init__(self, messages:RenderedMessages, length:int):
+		self.messages = messages
+		self.length = length
+		self.entry_count = messages.entry_counts[length-1] if length > 0 else 0
+		
+		# The (key, prompt) last made from this, replaced as a whole so
+		# that readers never see the key of one with the prompt of another:
+		self.prompt_cache:Tuple[Any, str] = (None, None)
+	
+	@property
+	def chat(self) -> List[Dict[str,str]]:
+		'''A new chat list for this sequence, whose entries are shared so shouldn't be modified.'''
+		if self.length == 0:
+			return []
+		chat = self.messages.chat[:self.entry_count-1]
+		chat.append(self.messages.last_entries[self.length-1])
+		return chat
+	
+	@property
+	def context(self) -> ContextWindow:
+		'''Token counts for the messages, which may go on past length.'''
+		return self.messages.context
+	
+	def role(self, index:int) -> str:
+		return self.messages.roles[index][0]
+	
+	def entries_added(self, index:int) -> int:
+		'''The number of chat entries message index started, 0 if it was merged into the one before.'''
+		entry_counts = self.messages.entry_counts
+		return entry_counts[index] - (entry_counts[index-1] if index > 0 else 0)
+	
+	def prompt_head(self, template:str, render_segment:Callable[[Dict[str,str],int],str]) -> str:
+		'''
+		The prompt text of every entry in chat but the last, which later
+		messages can still merge into, see RenderedMessages.prompt_head.
+		'''
+		return self.messages.prompt_head(template, render_segment, self.entry_count-1)
+
+class ChatRenderCache:
+	'''
+	Incrementally renders sequences of messages into chat lists.
+	
+	A few recently rendered sequences are kept, and each new one resumes
+	from whichever shares the longest prefix with it. Appending messages
+	to a conversation only renders the new ones, and editing or branching
+	it only renders what comes after the shared prefix.
+	'''
+	def __init__(self, max_sequences:int=16, max_views:int=4):
+		self.max_sequences = max_sequences
+		self.max_views = max_views
+		self._sequences:List[RenderedMessages] = []
+		self._must_alternate = None
+		self._lock = Lock()
+	
+	def render(self, messages:List[Message], must_alternate:bool) -> RenderedSequence:
+		'''
+		Returns the rendered chat for messages. The returned object is
+		shared, so don't modify it.
+		'''
+		message_ids = list(map(attrgetter("auto_id"), messages))
+		with self._lock:
+			if must_alternate != self._must_alternate:
+				self._sequences.clear()
+				self._must_alternate = must_alternate
+			
+			# Most recently used first, since that's usually the one we want:
+			best, best_length = None, 0
+			for rendered in reversed(self._sequences):
+				length = rendered.shared_prefix_length(message_ids, messages)
+				if best is None or length > best_length:
+					best, best_length = rendered, length
+				if best_length == len(messages):
+					break
+			
+			if best is not None and (best_length == len(best) or best_length == len(messages)):
+				# Every message best was rendered from is still here, or
+				# messages is a prefix of them, so we can share it:
+				self._sequences.remove(best)
+				rendered = best
+			elif best is not None and best_length > 0:
+				rendered = best.truncated(best_length)
+			else:
+				rendered = RenderedMessages()
+			
+			for message in messages[len(rendered):]:
+				self._render_message(rendered, message, must_alternate)
+			
+			self._sequences.append(rendered)
+			if len(self._sequences) > self.max_sequences:
+				self._sequences.pop(0)
+			
+			view = rendered.views.pop(len(messages), None)
+			if view is None:
+				view = RenderedSequence(rendered, len(messages))
+			rendered.views[len(messages)] = view
+			if len(rendered.views) > self.max_views:
+				del rendered.views[next(iter(rendered.views))]
+			return view
+	
+	def _render_message(self, rendered:RenderedMessages, message:Message, must_alternate:bool):
+		chat = rendered.chat
+		prev_role, prev_user_name = rendered.roles[-1] if len(rendered.roles) > 0 else (None, None)
+		
+		def append(msg:Dict[str,str], name:str):
+			if name is not None:
+				msg["name"] = name
+			chat.append(msg)
+		def merge():
+			chat[-1] = dict(chat[-1], content=chat[-1]["content"] + "\n\n" + message.content)
+		
+		message_role, user_name = CommonRoles.from_source(message.source)
+		role = role_mapping[message_role.value]
+		if must_alternate:
+			# Make sure roles alternate
+			if prev_role is None and role == "assistant":
+				append({
+					"role":role_mapping[CommonRoles.User.value],
+					"content":""
+				}, user_name)
+			if role == prev_role:
+				merge()
+			else:
+				append({
+					"role":role,
+					"content":message.content
+				}, user_name)
+		else:
+			if role == prev_role and user_name == prev_user_name:
+				merge()
+			else:
+				append({
+					"role":role,
+					"content":message.content
+				}, user_name)
+		
+		if getattr(message.source, "generating", False):
+			rendered.generating[len(rendered)] = message.content
+		rendered.roles.append((role, user_name))
+		rendered.entry_counts.append(len(chat))
+		rendered.last_entries.append(chat[-1])
+		rendered.message_ids.append(message.auto_id)
+	
+	def clear(self):
+		with self._lock:
+			self._sequences.clear()
\ No newline at end of file
@@ -0,0 +1,109 @@
+from array import array
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import base64
+import sys
+import time
+
+@dataclass
+class LoggedChunk:
+	index:int
+	delta:str
+	time:float
+	finish_reason:Optional[str] = None
+	raw:Optional[Dict[str,Any]] = None
+
+def _pack(values:array) -> str:
+	if sys.byteorder != "little":
+		values = array(values.typecode, values)
+		values.byteswap()
+	return base64.b64encode(values.tobytes()).decode("ascii")
+
+def _unpack(typecode:str, packed:str) -> array:
+	values = array(typecode)
+	values.frombytes(base64.b64decode(packed))
+	if sys.byteorder != "little":
+		values.byteswap()
+	return values
+
+class ChunkLog:
+	'''
+	A compact record of a streamed response: the text each chunk added,
+	when it arrived and any finish reason, in packed arrays.
+	
+	Raw chunks are only kept for the first and last chunk, and any that
+	carry usage, and are only converted to dicts when kept, so the rest
+	cost little more than their text.
+	'''
+	def __init__(self, to_dict:Callable[[Any],Dict[str,Any]]=None, start_time:float=None):
+		self.to_dict = to_dict if to_dict is not None else (lambda chunk: chunk)
+		self.start_time = start_time if start_time is not None else time.time()
+		
+		self.deltas:List[str] = []
+		self.times = array('d')
+		self.finish_reasons:Dict[int,str] = {}
+		self.raw:Dict[int,Dict[str,Any]] = {}
+		
+		self._perf_start = time.perf_counter()
+		self._last_chunk:Any = None
+		self._last_raw:Optional[Dict[str,Any]] = None
+	
+	def __len__(self):
+		return len(self.deltas)
+	
+	def append(self, chunk:Any, delta:Optional[str]=None, finish_reason:Optional[str]=None, usage:bool=False):
+		'''Logs chunk, keeping it raw if it's the first or usage is True.'''
+		index = len(self.deltas)
+		self.deltas.append(delta or "")
+		self.times.append(time.perf_counter() - self._perf_start)
+		if finish_reason is not None:
+			self.finish_reasons[index] = finish_reason
+		if index == 0 or usage:
+			self.raw[index] = self.to_dict(chunk)
+		self._last_chunk = chunk
+		self._last_raw = None
+	
+	def last_raw(self) -> Optional[Dict[str,Any]]:
+		'''The last chunk as a dict, or None if nothing has been logged.'''
+		index = len(self.deltas) - 1
+		if index < 0:
+			return None
+		if index in self.raw:
+			return self.raw[index]
+		if self._last_raw is None:
+			self._last_raw = self.to_dict(self._last_chunk)
+		return self._last_raw
+	
+	def text(self) -> str:
+		return "".join(self.deltas)
+	
+	def chunks(self) -> Iterator[LoggedChunk]:
+		for index, delta in enumerate(self.deltas):
+			yield LoggedChunk(index, delta, self.times[index], self.finish_reasons.get(index, None), self.raw.get(index, None))
+	
+	def serialize(self) -> Dict[str,Any]:
+		'''A json friendly form of this, keeping the last chunk raw too.'''
+		raw = dict(self.raw)
+		if len(self.deltas) > 0:
+			raw[len(self.deltas) - 1] = self.last_raw()
+		return {
+			"start_time":self.start_time,
+			"text":self.text(),
+			"lengths":_pack(array('I', (len(delta) for delta in self.deltas))),
+			"times":_pack(self.times),
+			"finish_reasons":{str(index):reason for index, reason in self.finish_reasons.items()},
+			"raw":{str(index):chunk for index, chunk in raw.items()}
+		}
+	
+	@staticmethod
+	def deserialize(serialized:Dict[str,Any]) -> "ChunkLog":
+		log = ChunkLog(start_time=serialized["start_time"])
+		text = serialized["text"]
+		position = 0
+		for length in _unpack('I', serialized["lengths"]):
+			log.deltas.append(text[position:position+length])
+			position += length
+		log.times = _unpack('d', serialized["times"])
+		log.finish_reasons = {int(index):reason for index, reason in serialized["finish_reasons"].items()}
+		log.raw = {int(index):chunk for index, chunk in serialized["raw"].items()}
+		return log
\ No newline at end of file
@@ -0,0 +1,150 @@
+from AbstractAI.Helpers.LoopLocal import LoopLocal
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Dict, Tuple
+import weakref
+import httpx
+
+@dataclass
+class ConnectionStats:
+	'''How often requests through a pooled client needed a new connection.'''
+	requests:int = 0
+	new_connections:int = 0
+	reused_connections:int = 0
+	
+	@property
+	def reuse_rate(self) -> float:
+		if self.requests == 0:
+			return 0
+		return self.reused_connections / self.requests
+
+class _ConnectionCounter:
+	'''
+	Tells new connections from reused ones by the network stream httpcore
+	reports each response was read from.
+	'''
+	def __init__(self, stats:ConnectionStats):
+		self.stats = stats
+		self._seen = weakref.WeakSet()
+		self._lock = Lock()
+	
+	def record(self, response:httpx.Response):
+		stream = response.extensions.get("network_stream", None)
+		with self._lock:
+			self.stats.requests += 1
+			if stream is None:
+				return
+			if stream in self._seen:
+				self.stats.reused_connections += 1
+			else:
+				self._seen.add(stream)
+				self.stats.new_connections += 1
+
+class CountingTransport(httpx.HTTPTransport):
+	def __init__(self, counter:_ConnectionCounter, **kwargs):
+		super().__init__(**kwargs)
+		self.counter = counter
+	
+	def handle_request(self, request:httpx.Request) -> httpx.Response:
+		response = super().handle_request(request)
+		self.counter.record(response)
+		return response
+
+class AsyncCountingTransport(httpx.AsyncHTTPTransport):
+	def __init__(self, counter:_ConnectionCounter, **kwargs):
+		super().__init__(**kwargs)
+		self.counter = counter
+	
+	async def handle_async_request(self, request:httpx.Request) -> httpx.Response:
+		response = await super().handle_async_request(request)
+		self.counter.record(response)
+		return response
+
+class ClientPool:
+	'''
+	Shares http clients, and the keep-alive connections in them, between
+	every LLM that talks to the same backend with the same credentials.
+	
+	Loading settings copies them, so without this each load would open
+	its own connections and redo the TLS handshakes.
+	
+	Async clients are shared per event loop, since their connections
+	can't be used from any loop but the one that opened them.
+	'''
+	singleton:"ClientPool" = None
+	
+	def __init__(self, max_connections:int=20, max_keepalive_connections:int=10, keepalive_expiry:float=60):
+		# Same as the openai and groq clients' own defaults, since
+		# passing them an http client means they use its timeout:
+		self.timeout = httpx.Timeout(600, connect=5)
+		self.max_connections = max_connections
+		self.max_keepalive_connections = max_keepalive_connections
+		self.keepalive_expiry = keepalive_expiry
+		
+		self._clients:Dict[Tuple[str,str,str], httpx.Client] = {}
+		self._async_clients:LoopLocal[Dict[Tuple[str,str,str], httpx.AsyncClient]] = LoopLocal(dict)
+		self._counters:Dict[Tuple[str,str,str], _ConnectionCounter] = {}
+		self._lock = Lock()
+		
+		if ClientPool.singleton is None:
+			ClientPool.singleton = self
+	
+	def client(self, backend:str, base_url:str, api_key:str) -> httpx.Client:
+		'''The shared http client for backend at base_url with api_key.'''
+		return self._get(self._clients, backend, base_url, api_key, False)
+	
+	def async_client(self, backend:str, base_url:str, api_key:str) -> httpx.AsyncClient:
+		'''
+		The shared async http client for backend at base_url with api_key
+		on the running event loop, so only call this from that loop.
+		'''
+		return self._get(self._async_clients.get(), backend, base_url, api_key, True)
+	
+	def stats(self, backend:str=None, base_url:str=None, api_key:str=None) -> ConnectionStats:
+		'''Connection stats for one backend, or summed over all of them if backend is None.'''
+		with self._lock:
+			if backend is not None:
+				counter = self._counters.get((backend, base_url or "", api_key or ""), None)
+				return ConnectionStats() if counter is None else ConnectionStats(**vars(counter.stats))
+			
+			total = ConnectionStats()
+			for counter in self._counters.values():
+				total.requests += counter.stats.requests
+				total.new_connections += counter.stats.new_connections
+				total.reused_connections += counter.stats.reused_connections
+			return total
+	
+	def clear(self):
+		'''Forgets every shared client, so new ones are made with the current limits.'''
+		with self._lock:
+			self._clients.clear()
+			self._async_clients = LoopLocal(dict)
+			self._counters.clear()
+	
+	def _limits(self) -> httpx.Limits:
+		return httpx.Limits(
+			max_connections=self.max_connections,
+			max_keepalive_connections=self.max_keepalive_connections,
+			keepalive_expiry=self.keepalive_expiry
+		)
+	
+	def _get(self, clients:Dict[Tuple[str,str,str], Any], backend:str, base_url:str, api_key:str, is_async:bool) -> Any:
+		connection_key = (backend, base_url or "", api_key or "")
+		with self._lock:
+			client = clients.get(connection_key, None)
+			if client is not None:
+				return client
+			
+			counter = self._counters.get(connection_key, None)
+			if counter is None:
+				counter = self._counters[connection_key] = _ConnectionCounter(ConnectionStats())
+			
+			limits = self._limits()
+			if is_async:
+				client = httpx.AsyncClient(transport=AsyncCountingTransport(counter, limits=limits), timeout=self.timeout)
+			else:
+				client = httpx.Client(transport=CountingTransport(counter, limits=limits), timeout=self.timeout)
+			clients[connection_key] = client
+			return client
+
+ClientPool()
\ No newline at end of file
@@ -0,0 +1,110 @@
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, List, Optional
+import hashlib
+import json
+import sqlite3
+import time
+
+@dataclass
+class CachedCompletion:
+	'''A finished completion, stored as the text of each chunk it streamed.'''
+	chunks: List[str] = field(default_factory=list)
+	in_token_count: int = -1
+	out_token_count: int = 0
+	finished: bool = False
+	
+	@property
+	def content(self) -> str:
+		return "".join(self.chunks)
+
+class CompletionCache:
+	'''
+	A size bounded store of completions in a local SQLite file, evicting
+	the least recently used ones first.
+	
+	Only meant for deterministic requests (eg, zero temperature) where
+	asking again would give the same answer, such as regression runs.
+	'''
+	def __init__(self, path:str, max_bytes:int=256*1024*1024):
+		self.path = path
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+		
+		self._lock = Lock()
+		self._connection = sqlite3.connect(path, check_same_thread=False)
+		with self._connection:
+			self._connection.execute(
+				"CREATE TABLE IF NOT EXISTS completions ("
+				"key TEXT PRIMARY KEY, "
+				"chunks TEXT NOT NULL, "
+				"in_token_count INTEGER NOT NULL, "
+				"out_token_count INTEGER NOT NULL, "
+				"finished INTEGER NOT NULL, "
+				"size INTEGER NOT NULL, "
+				"last_used REAL NOT NULL)"
+			)
+			self._connection.execute("CREATE INDEX IF NOT EXISTS completions_last_used ON completions (last_used)")
+	
+	@staticmethod
+	def key(*parts:Any) -> str:
+		'''Hashes everything that determines a completion into a cache key.'''
+		return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+	
+	def get(self, key:str) -> Optional[CachedCompletion]:
+		with self._lock:
+			row = self._connection.execute(
+				"SELECT chunks, in_token_count, out_token_count, finished FROM completions WHERE key = ?", (key,)
+			).fetchone()
+			if row is None:
+				self.misses += 1
+				return None
+			
+			with self._connection:
+				self._connection.execute("UPDATE completions SET last_used = ? WHERE key = ?", (time.time(), key))
+			self.hits += 1
+		
+		chunks, in_token_count, out_token_count, finished = row
+		return CachedCompletion(json.loads(chunks), in_token_count, out_token_count, bool(finished))
+	
+	def put(self, key:str, completion:CachedCompletion):
+		chunks = json.dumps(completion.chunks)
+		size = len(key) + len(chunks.encode("utf-8"))
+		if size > self.max_bytes:
+			return
+		
+		with self._lock:
+			with self._connection:
+				self._connection.execute(
+					"INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?, ?, ?)",
+					(key, chunks, completion.in_token_count, completion.out_token_count, int(completion.finished), size, time.time())
+				)
+				self._evict()
+	
+	def size(self) -> int:
+		'''Total size in bytes of everything stored.'''
+		with self._lock:
+			return self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+	
+	def clear(self):
+		with self._lock:
+			with self._connection:
+				self._connection.execute("DELETE FROM completions")
+	
+	def close(self):
+		with self._lock:
+			self._connection.close()
+	
+	def _evict(self):
+		total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+		if total <= self.max_bytes:
+			return
+		
+		to_delete = []
+		for key, size in self._connection.execute("SELECT key, size FROM completions ORDER BY last_used"):
+			to_delete.append((key,))
+			total -= size
+			if total <= self.max_bytes:
+				break
+		self._connection.executemany("DELETE FROM completions WHERE key = ?", to_delete)
\ No newline at end of file
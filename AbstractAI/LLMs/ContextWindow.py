@@ -0,0 +1,99 @@
+from bisect import bisect_left
+from threading import Lock
+from typing import Callable, Iterable, List, Optional, Tuple
+
+class ContextWindow:
+	'''
+	Running totals of the tokens each message in a sequence costs, so
+	that the largest suffix of it which fits in a budget can be found by
+	binary search over message boundaries.
+	
+	System messages are always kept, so the cost of keeping everything
+	from start onward includes the system messages before start.
+	
+	Windows can be shared by sequences that are prefixes of each other,
+	so most methods take the length of the sequence they're asking about.
+	'''
+	def __init__(self):
+		self.sums:List[int] = [0]
+		self.system_sums:List[int] = [0]
+		self.system_indices:List[int] = []
+		# The index of the first message we couldn't count, if any:
+		self.uncountable_from:Optional[int] = None
+		self._lock = Lock()
+	
+	def __len__(self):
+		return len(self.sums) - 1
+	
+	def extend(self, items:Iterable[Tuple[int, bool]]):
+		'''Adds (tokens, is_system) for each message after the ones already added.'''
+		with self._lock:
+			for tokens, is_system in items:
+				self._append(tokens, is_system)
+	
+	def extend_to(self, length:int, cost:Callable[[int],Tuple[int,bool]]):
+		'''Adds cost(i) for each message i not yet added up to length.'''
+		with self._lock:
+			for i in range(len(self), length):
+				self._append(*cost(i))
+	
+	def _append(self, tokens:int, is_system:bool):
+		if tokens < 0:
+			if self.uncountable_from is None:
+				self.uncountable_from = len(self)
+			tokens = 0
+		if is_system:
+			self.system_indices.append(len(self))
+		self.sums.append(self.sums[-1] + tokens)
+		self.system_sums.append(self.system_sums[-1] + (tokens if is_system else 0))
+	
+	def truncated(self, length:int) -> "ContextWindow":
+		'''A copy with only the first length messages.'''
+		with self._lock:
+			length = min(length, len(self))
+			copy = ContextWindow()
+			copy.sums = self.sums[:length+1]
+			copy.system_sums = self.system_sums[:length+1]
+			copy.system_indices = self.system_indices[:bisect_left(self.system_indices, length)]
+			if self.uncountable_from is not None and self.uncountable_from < length:
+				copy.uncountable_from = self.uncountable_from
+			return copy
+	
+	@property
+	def countable(self) -> bool:
+		return self.uncountable_from is None
+	
+	def countable_to(self, length:int=None) -> bool:
+		'''True if every message up to length could be counted.'''
+		if length is None:
+			length = len(self)
+		return self.uncountable_from is None or self.uncountable_from >= length
+	
+	def tokens(self, start:int, length:int=None) -> int:
+		'''Tokens needed to keep every message from start up to length, and every system message before start.'''
+		if length is None:
+			length = len(self)
+		return self.sums[length] - self.sums[start] + self.system_sums[start]
+	
+	def fit(self, budget:int, length:int=None) -> Optional[int]:
+		'''
+		The smallest start whose messages up to length fit in budget, or
+		None if we couldn't count them all. This is length if only the
+		system messages fit (or not even them).
+		'''
+		if length is None:
+			length = len(self)
+		if not self.countable_to(length):
+			return None
+		low, high = 0, length
+		while low < high:
+			middle = (low + high) // 2
+			if self.tokens(middle, length) <= budget:
+				high = middle
+			else:
+				low = middle + 1
+		return low
+	
+	def systems_before(self, start:int) -> List[int]:
+		'''The indices of the system messages before start.'''
+		return self.system_indices[:bisect_left(self.system_indices, start)]
\ No newline at end of file
@@ -1,25 +1,24 @@
-from AbstractAI.LLMs.LLM import Conversation, Iterator, LLM_Response, Union
 from AbstractAI.LLMs.OpenAI_LLM import *
-from groq import Groq
+from groq import Groq, AsyncGroq
 
 class Groq_LLM(OpenAI_LLM):
 	def _load_model(self):
-		self.client = Groq(api_key=self.settings.api_key)
+		pool = ClientPool.singleton
+		base_url = self.settings.base_url or None
+		self.client = Groq(
+			api_key=self.settings.api_key, base_url=base_url,
+			http_client=pool.client("Groq", base_url, self.settings.api_key)
+		)
+		self.async_client = LoopLocal(lambda: AsyncGroq(
+			api_key=self.settings.api_key, base_url=base_url,
+			http_client=pool.async_client("Groq", base_url, self.settings.api_key)
+		))
 	
-	def chat(self, conversation: Conversation, start_str: str = "", stream=False, max_tokens: int = None, auto_append: bool = False) -> LLM_Response | Iterator[LLM_Response]:
-		ret = super().chat(conversation, start_str, stream, max_tokens, auto_append)
-		if stream:
-			for r in ret:
-				try:
-					response_chunks = r.source.serialized_raw_output["Chunks"]
-					usage = response_chunks[-1]["x_groq"]["usage"]
-					r.source.in_token_count = usage.get("prompt_tokens",r.source.in_token_count)
-					total_tokens = usage.get("total_tokens",-1)
-					if total_tokens>-1:
-						r.source.out_token_count = total_tokens - r.source.in_token_count
-				except:
-					pass
-				
-				yield r
-		else:
-			return ret
\ No newline at end of file
+	def _stream_options(self) -> Optional[Dict[str,Any]]:
+		# Groq always reports usage, in x_groq:
+		return None
+	
+	def _chunk_usage(self, chunk:ChatCompletionChunk) -> Optional[Any]:
+		'''Groq reports usage in the x_groq field of the last stream chunk.'''
+		x_groq = getattr(chunk, "x_groq", None)
+		return getattr(x_groq, "usage", None)
\ No newline at end of file
@@ -1,16 +1,127 @@
 from .LLM import *
 
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer, TextIteratorStreamer, StoppingCriteria, StoppingCriteriaList
 import transformers
+from threading import Thread, Event
+from contextlib import nullcontext
+import hashlib
+import json
+import time
+import glob
+import gc
+import os
 
+from AbstractAI.Helpers.MappedSafetensors import MappedSafetensors
 from AbstractAI.Model.Settings.HuggingFace_LLMSettings import HuggingFace_LLMSettings
 
+class StopOnEvent(StoppingCriteria):
+	'''Stops generation once event is set, so that streams can be stopped from outside generate.'''
+	def __init__(self, event:Event):
+		self.event = event
+	
+	def __call__(self, input_ids:torch.LongTensor, scores:torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+		return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+class ForwardCounter:
+	'''Counts and times a model's forward passes while hooked.'''
+	def __init__(self, model:torch.nn.Module):
+		self.model = model
+		self.calls = 0
+		self.seconds = 0.0
+		self.first_seconds = 0.0
+		self._start = None
+		self._handles = []
+	
+	def hook(self):
+		self._handles = [
+			self.model.register_forward_pre_hook(self._pre_forward),
+			self.model.register_forward_hook(self._post_forward)
+		]
+	
+	def unhook(self):
+		for handle in self._handles:
+			handle.remove()
+		self._handles = []
+	
+	def _pre_forward(self, module, args):
+		self._start = time.perf_counter()
+	
+	def _post_forward(self, module, args, output):
+		seconds = time.perf_counter() - self._start
+		if self.calls == 0:
+			self.first_seconds = seconds
+		self.calls += 1
+		self.seconds += seconds
+
+class AssistedDecodingStats:
+	'''
+	Measures one assisted generate call, to estimate how many of the
+	draft model's tokens were accepted and how much faster it was than
+	decoding with the main model alone.
+	'''
+	def __init__(self, model:torch.nn.Module, draft_model:torch.nn.Module):
+		self.main = ForwardCounter(model)
+		self.draft = ForwardCounter(draft_model)
+		self.seconds = 0.0
+	
+	def __enter__(self):
+		self.main.hook()
+		self.draft.hook()
+		self._start = time.perf_counter()
+		return self
+	
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		self.seconds = time.perf_counter() - self._start
+		self.main.unhook()
+		self.draft.unhook()
+	
+	def summary(self, out_token_count:int) -> Dict[str, Any]:
+		# Each pass of the main model checks the draft's guesses and adds
+		# one token of its own, so every token past one per pass was a
+		# draft token it accepted. Plain decoding would have taken a pass
+		# per token, costing about what the passes after the prompt did:
+		accepted = max(out_token_count - self.main.calls, 0)
+		step_seconds = (self.main.seconds - self.main.first_seconds) / max(self.main.calls - 1, 1)
+		plain_seconds = self.main.first_seconds + step_seconds * max(out_token_count - 1, 0)
+		return {
+			"out_tokens":out_token_count,
+			"main_forwards":self.main.calls,
+			"draft_forwards":self.draft.calls,
+			"accepted_tokens":accepted,
+			"acceptance_rate":accepted / self.draft.calls if self.draft.calls > 0 else 0,
+			"seconds":self.seconds,
+			"estimated_plain_seconds":plain_seconds,
+			"estimated_speedup":plain_seconds / self.seconds if self.seconds > 0 else 0
+		}
+
+def model_bytes(model:torch.nn.Module) -> int:
+	'''
+	Bytes taken by model's weights and buffers, counting the packed
+	weights that quantized layers keep out of parameters().
+	'''
+	seen = set()
+	def size(value) -> int:
+		if isinstance(value, (tuple, list)):
+			return sum(size(v) for v in value)
+		if not isinstance(value, torch.Tensor) or value.data_ptr() in seen:
+			return 0
+		seen.add(value.data_ptr())
+		return value.element_size() * value.nelement()
+	return sum(size(value) for value in model.state_dict().values())
+
 class HuggingFaceLLM(LLM):
+	# Int8 tokens/sec measurements by _int8_key, so they're only taken once:
+	int8_benchmarks:Dict[str, Dict[str, float]] = {}
+	
 	def __init__(self, settings:HuggingFace_LLMSettings):
-		self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu') if settings.model.device_map == "auto" else settings.model.device
+		if settings.model.cpu_int8:
+			self.device = torch.device('cpu')
+		else:
+			self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu') if settings.model.device_map == "auto" else settings.model.device
 		super().__init__(settings)
 		self.model = None
+		self.draft_model = None
 		self.tokenizer = None
 	
 	def _load_model(self):
@@ -27,8 +138,19 @@ class HuggingFaceLLM(LLM):
 			use_fast=self.settings.tokenize.use_fast, 
 			trust_remote_code=self.settings.tokenize.trust_remote_code
 		)
-		self.model = AutoModelForCausalLM.from_pretrained(
-			self.settings.model_str,
+		self.model = self._load_causal_lm(self.settings.model_str)
+		if self.settings.draft_model_str:
+			self.draft_model = self._load_causal_lm(self.settings.draft_model_str)
+	
+	def _load_causal_lm(self, model_str:str) -> torch.nn.Module:
+		if self.settings.model.cpu_int8:
+			return self._load_int8(model_str)
+		if self.settings.model.mmap_weights:
+			model = self._load_mmapped(model_str)
+			if model is not None:
+				return model
+		return AutoModelForCausalLM.from_pretrained(
+			model_str,
 			# revision=self.settings.model.revision,
 			torch_dtype=self.settings.model.torch_dtype.to_torch(),
 			low_cpu_mem_usage=self.settings.model.low_cpu_mem_usage,
@@ -38,43 +160,312 @@ class HuggingFaceLLM(LLM):
 			attn_implementation='eager'
 		)
 	
-	def chat(self, conversation: Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False) -> Union[LLM_Response, Iterator[LLM_Response]]:
-		wip_message, message_list = self._new_message(conversation, start_str, auto_append=auto_append)
+	def _load_mmapped(self, model_str:str) -> Optional[torch.nn.Module]:
+		'''
+		Builds model_str without allocating its parameters, then assigns
+		them tensors viewing memory maps of its safetensors files.
 		
-		replace_parameters = {}
-		if max_tokens is not None:
-			replace_parameters["max_new_tokens"] = max_tokens
-		params = kwargs_from_instance(self.model.generate, self.settings.generate, replace_parameters)
+		Returns None if model_str has no safetensors files to map.
+		'''
+		from accelerate import init_empty_weights
+		from huggingface_hub import snapshot_download
+		
+		start = time.perf_counter()
+		if os.path.isdir(model_str):
+			path = model_str
+		else:
+			path = snapshot_download(model_str, revision=self.settings.model.revision or None, allow_patterns=["*.json", "*.safetensors"])
+		files = sorted(glob.glob(os.path.join(path, "*.safetensors")))
+		if len(files) == 0:
+			print(f"{model_str} has no safetensors files to map, loading it normally.")
+			return None
+		
+		config = AutoConfig.from_pretrained(path, trust_remote_code=self.settings.model.trust_remote_code)
+		# Buffers aren't always saved, so only parameters are left empty:
+		with init_empty_weights(include_buffers=False):
+			model = AutoModelForCausalLM.from_config(config, trust_remote_code=self.settings.model.trust_remote_code, attn_implementation='eager')
+		
+		# Checkpoints of the base model leave off its prefix:
+		expected = set(model.state_dict().keys())
+		prefix = model.base_model_prefix + "."
+		checkpoints = [MappedSafetensors(file) for file in files]
+		state_dict = {}
+		for checkpoint in checkpoints:
+			for name in checkpoint.keys():
+				key = prefix + name if name not in expected and prefix + name in expected else name
+				state_dict[key] = checkpoint.tensor(name)
+		model.load_state_dict(state_dict, strict=False, assign=True)
+		model.tie_weights()
+		
+		empty = [name for name, parameter in model.named_parameters() if parameter.is_meta]
+		if len(empty) > 0:
+			raise ValueError(f"{model_str}'s safetensors files are missing {len(empty)} parameters, like {empty[0]}.")
+		model.eval()
+		if self.device is not None and torch.device(self.device).type != "cpu":
+			model.to(self.device)
+		
+		mapped_mb = sum(checkpoint.nbytes for checkpoint in checkpoints) / 2**20
+		print(f"Mapped {model_str} from {len(files)} safetensors files ({mapped_mb:.0f}MB), ready in {time.perf_counter() - start:.2f}s")
+		return model
 	
-		inputs_local = self.tokenizer(wip_message.source.prompt, return_tensors="pt")
-		wip_message.source.in_token_count = len(inputs_local['input_ids'][0])
-		inputs = inputs_local.to(self.device)
+	def _load_int8(self, model_str:str) -> torch.nn.Module:
+		'''
+		Loads model_str on the CPU with its linear layers dynamically
+		quantized to int8, from the int8 cache if it's been done before.
+		'''
+		cache_path = self._int8_cache_path(model_str)
+		if cache_path is not None and os.path.exists(cache_path):
+			model = torch.load(cache_path, weights_only=False)
+			model.eval()
+			print(f"Loaded int8 {model_str} from {cache_path}: {model_bytes(model)/2**20:.0f}MB{self._int8_speeds(model_str)}")
+			return model
 		
-		try:
-			if self.settings.del_token_type_ids:
-				del inputs["token_type_ids"]
-		except:
-			pass
+		model = AutoModelForCausalLM.from_pretrained(
+			model_str,
+			torch_dtype=torch.float32,
+			low_cpu_mem_usage=self.settings.model.low_cpu_mem_usage,
+			trust_remote_code=self.settings.model.trust_remote_code,
+			attn_implementation='eager'
+		)
+		model.eval()
+		before_bytes = model_bytes(model)
+		benchmark = self.settings.model.int8_benchmark and self._int8_benchmark(model_str) is None
+		before_speed = self._tokens_per_second(model) if benchmark else 0
+		
+		model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+		if benchmark:
+			self._save_int8_benchmark(model_str, {"before":before_speed, "after":self._tokens_per_second(model)})
+		print(f"Quantized {model_str} to int8: {before_bytes/2**20:.0f}MB -> {model_bytes(model)/2**20:.0f}MB{self._int8_speeds(model_str)}")
+		
+		if cache_path is not None:
+			os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+			torch.save(model, cache_path)
+			print(f"Saved int8 {model_str} to {cache_path}")
+		return model
+	
+	def _int8_key(self, model_str:str) -> str:
+		# Pickled models are only good for the library versions that made them:
+		return hashlib.sha256(f"{model_str}|{self.settings.model.revision}|{torch.__version__}|{transformers.__version__}".encode("utf-8")).hexdigest()[:16]
+	
+	def _int8_cache_path(self, model_str:str, extension:str=".pt") -> Optional[str]:
+		if not self.settings.model.int8_cache_dir:
+			return None
+		return os.path.join(self.settings.model.int8_cache_dir, f"{model_str.replace('/', '--')}-{self._int8_key(model_str)}{extension}")
+	
+	def _int8_benchmark(self, model_str:str) -> Optional[Dict[str, float]]:
+		'''
+		The tokens/sec model_str measured before and after quantizing, from
+		memory or next to its int8 cache, or None if it's not been measured.
+		'''
+		key = self._int8_key(model_str)
+		if key not in HuggingFaceLLM.int8_benchmarks:
+			path = self._int8_cache_path(model_str, ".json")
+			if path is None or not os.path.exists(path):
+				return None
+			with open(path) as file:
+				HuggingFaceLLM.int8_benchmarks[key] = json.load(file)
+		return HuggingFaceLLM.int8_benchmarks[key]
+	
+	def _save_int8_benchmark(self, model_str:str, speeds:Dict[str, float]):
+		HuggingFaceLLM.int8_benchmarks[self._int8_key(model_str)] = speeds
+		path = self._int8_cache_path(model_str, ".json")
+		if path is not None:
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			with open(path, "w") as file:
+				json.dump(speeds, file)
+	
+	def _int8_speeds(self, model_str:str) -> str:
+		speeds = self._int8_benchmark(model_str)
+		if speeds is None:
+			return ""
+		return f", {speeds['before']:.1f} -> {speeds['after']:.1f} tokens/sec"
+	
+	def _tokens_per_second(self, model:torch.nn.Module, new_tokens:int=16) -> float:
+		'''Greedily generates new_tokens with model to time it.'''
+		inputs = self._model_inputs(self.tokenizer("The", return_tensors="pt"))
+		start = time.perf_counter()
+		with torch.no_grad():
+			output_tokens = model.generate(
+				**inputs,
+				max_new_tokens=new_tokens, min_new_tokens=new_tokens, do_sample=False,
+				pad_token_id=self.tokenizer.pad_token_id if self.tokenizer.pad_token_id is not None else self.tokenizer.eos_token_id
+			)
+		return (output_tokens.shape[1] - inputs['input_ids'].shape[1]) / (time.perf_counter() - start)
+	
+	def _unload_model(self):
+		self.model = None
+		self.draft_model = None
+		self.tokenizer = None
+		gc.collect()
+		if torch.cuda.is_available():
+			torch.cuda.empty_cache()
+	
+	def memory_footprint(self) -> Optional[int]:
+		# get_memory_footprint misses the packed weights of quantized layers:
+		footprint_of = model_bytes if self.settings.model.cpu_int8 else (lambda model: model.get_memory_footprint())
+		footprint = footprint_of(self.model)
+		if self.draft_model is not None:
+			footprint += footprint_of(self.draft_model)
+		return footprint
+	
+	def _chat(self, conversation: Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False) -> Union[LLM_Response, Iterator[LLM_Response]]:
+		wip_message, message_list = self._new_message(conversation, start_str, auto_append=auto_append, max_tokens=max_tokens)
+		
+		params = self._generate_params(max_tokens)
+	
+		inputs_local = self.tokenizer(wip_message.source.full_prompt(), return_tensors="pt")
+		wip_message.source.in_token_count = len(inputs_local['input_ids'][0])
+		inputs = self._model_inputs(inputs_local)
 	
 		response = LLM_Response(wip_message, stop_streaming_func=None)
+		stop_event = Event()
+		assisted = AssistedDecodingStats(self.model, self.draft_model) if self.draft_model is not None else None
 		if stream:
-			#stream not supported in this HF implementation, but we need to be an iterator so...
-			yield response 
+			# Generate on a worker thread so that we can yield
+			# each piece of text as the streamer decodes it:
+			streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+			generated = {}
+			def generate():
+				try:
+					with assisted or nullcontext():
+						generated["output_tokens"] = self.model.generate(
+							**inputs, **params,
+							streamer=streamer,
+							stopping_criteria=StoppingCriteriaList([StopOnEvent(stop_event)])
+						)
+				except Exception as e:
+					generated["exception"] = e
+					streamer.end()
+			
+			response.stop_streaming_func = stop_event.set
+			generate_thread = Thread(target=generate, daemon=True)
+			generate_thread.start()
+			try:
+				yield response
+				for text in streamer:
+					response.message.append(text)
+					yield response
+			except GeneratorExit:
+				stop_event.set()
+				raise
+			finally:
+				generate_thread.join()
 			
-		output_tokens = self.model.generate(**inputs, **params)
+			if "exception" in generated:
+				raise generated["exception"]
+			output_tokens = generated["output_tokens"]
+		else:
+			with assisted or nullcontext():
+				output_tokens = self.model.generate(**inputs, **params)
 		response_tokens = output_tokens[0][response.source.in_token_count:]
 		
-		response.source.finished = True
+		response.source.finished = not stop_event.is_set()
 		response.message.content = self.tokenizer.decode(response_tokens, skip_special_tokens=True)
-		response.source.out_token_count = len(response_tokens)
+		response.report_usage(len(inputs_local['input_ids'][0]), len(response_tokens))
 		response.source.serialized_raw_output = {
 			"in_tokens":inputs_local['input_ids'][0].tolist(),
 			"out_tokens":response_tokens.tolist()
 		}
-		response.source.generating = False
-		wip_message.emit_changed()
+		if assisted is not None:
+			response.source.serialized_raw_output["AssistedDecoding"] = dict(
+				draft_model=self.settings.draft_model_str,
+				**assisted.summary(len(response_tokens))
+			)
+		response.finish()
 		return response
 	
+	def chat_batch(self, conversations: List[Conversation], start_str:str="", max_tokens:int=None, auto_append:bool=False) -> List[LLM_Response]:
+		'''
+		Generates a response to each of conversations with one call to
+		generate by left padding all of their prompts into one batch.
+		
+		Returns the finished responses in the same order as conversations.
+		'''
+		self._add_in_flight(1)
+		try:
+			return self._chat_batch(conversations, start_str, max_tokens, auto_append)
+		finally:
+			self._add_in_flight(-1)
+	
+	def _chat_batch(self, conversations: List[Conversation], start_str:str="", max_tokens:int=None, auto_append:bool=False) -> List[LLM_Response]:
+		wip_messages = [
+			self._new_message(conversation, start_str, auto_append=auto_append, max_tokens=max_tokens)[0]
+			for conversation in conversations
+		]
+		if len(wip_messages) == 0:
+			return []
+		
+		# Assisted generation only supports one sequence at a time:
+		params = self._generate_params(max_tokens, assisted=False)
+		
+		if self.tokenizer.pad_token is None:
+			self.tokenizer.pad_token = self.tokenizer.eos_token
+		padding_side = self.tokenizer.padding_side
+		self.tokenizer.padding_side = "left"
+		try:
+			inputs_local = self.tokenizer([m.source.full_prompt() for m in wip_messages], return_tensors="pt", padding=True)
+		finally:
+			self.tokenizer.padding_side = padding_side
+		inputs = self._model_inputs(inputs_local)
+		
+		output_tokens = self.model.generate(**inputs, **params, pad_token_id=self.tokenizer.pad_token_id)
+		
+		# Every row of the output starts with the padded prompt, after which
+		# rows that finished early are padded out to the longest response:
+		padded_prompt_length = inputs_local['input_ids'].shape[1]
+		eos_token_ids = self.model.generation_config.eos_token_id
+		if eos_token_ids is None:
+			eos_token_ids = []
+		elif isinstance(eos_token_ids, int):
+			eos_token_ids = [eos_token_ids]
+		
+		responses = []
+		for i, wip_message in enumerate(wip_messages):
+			in_tokens = inputs_local['input_ids'][i][inputs_local['attention_mask'][i].bool()]
+			response_tokens = output_tokens[i][padded_prompt_length:].cpu()
+			for j, token in enumerate(response_tokens.tolist()):
+				if token in eos_token_ids:
+					response_tokens = response_tokens[:j+1]
+					break
+			
+			response = LLM_Response(wip_message, stop_streaming_func=None)
+			response.source.finished = True
+			response.message.content = self.tokenizer.decode(response_tokens, skip_special_tokens=True)
+			response.source.in_token_count = len(in_tokens)
+			response.source.out_token_count = len(response_tokens)
+			response.source.serialized_raw_output = {
+				"in_tokens":in_tokens.tolist(),
+				"out_tokens":response_tokens.tolist()
+			}
+			response.finish()
+			wip_message.emit_changed()
+			responses.append(response)
+		return responses
+	
+	def _generate_params(self, max_tokens:int=None, assisted:bool=True) -> Dict[str, Any]:
+		replace_parameters = {}
+		if max_tokens is not None:
+			replace_parameters["max_new_tokens"] = max_tokens
+		if assisted and self.draft_model is not None:
+			replace_parameters["assistant_model"] = self.draft_model
+		return kwargs_from_instance(self.model.generate, self.settings.generate, replace_parameters)
+	
+	def _model_inputs(self, inputs_local:transformers.BatchEncoding) -> transformers.BatchEncoding:
+		'''Moves tokenized inputs to the model's device, dropping anything it can't take.'''
+		inputs = inputs_local.to(self.device)
+		try:
+			if self.settings.del_token_type_ids:
+				del inputs["token_type_ids"]
+		except:
+			pass
+		return inputs
+	
+	def context_size(self) -> Optional[int]:
+		return getattr(self.model.config, "max_position_embeddings", None)
+	
+	def is_deterministic(self) -> bool:
+		return not self.settings.generate.do_sample
+	
 	def _apply_chat_template(self, chat: List[Dict[str,str]], start_str:str="") -> str:
 		chat_str = self.tokenizer.apply_chat_template(chat, tokenize=False, add_generation_prompt=True)
 		if start_str is not None and len(start_str) > 0:
@@ -83,4 +474,7 @@ class HuggingFaceLLM(LLM):
 	
 	def count_tokens(self, text:str) -> int:
 		'''Count the number of tokens in the passed text.'''
-		return len(self.tokenizer(text)["input_ids"][0])
\ No newline at end of file
+		return len(self.tokenizer(text)["input_ids"])
+	
+	def tokenizer_id(self) -> str:
+		return f"HuggingFace:{self.settings.model_str}"
\ No newline at end of file
@@ -1,10 +1,16 @@
 from AbstractAI.Model.Converse import *
+from AbstractAI.Model.Converse.GenerationTiming import GenerationTiming
 from AbstractAI.LLMs.CommonRoles import CommonRoles
 from AbstractAI.Helpers.merge_dictionaries import *
 from .LLM_Response import LLM_Response
+from .TokenCountCache import TokenCountCache, TemplateOverhead
+from .ChatRenderCache import ChatRenderCache, RenderedSequence
+from .CompletionCache import CompletionCache, CachedCompletion
 
 from datetime import datetime
-from typing import Any, Union, Dict, List, Iterator, Tuple, Optional
+from typing import Any, Union, Dict, List, Iterator, AsyncIterator, Tuple, Optional
+from threading import Lock
+import asyncio
 import json
 
 from AbstractAI.Helpers.func_to_model import kwargs_from_instance
@@ -13,15 +19,29 @@ from AbstractAI.Model.Settings.LLMSettings import LLMSettings
 default_start_request_prompt = r"""Please begin your response with:<|start_str|>"""
 
 class LLM():
+	# Used to 'ask' models that can't be given the start of their
+	# answer to begin with start_str, see _new_message:
+	start_request_prompt:str = None
+	
 	def __init__(self, settings:LLMSettings):
 		self.settings = settings
 		self.started = False
+		self._chat_render_cache = ChatRenderCache()
+		
+		# Requests being generated, so that ResidentModels doesn't unload us under them:
+		self.in_flight = 0
+		self._in_flight_lock = Lock()
+		
+		# Opt in to reusing completions of deterministic requests:
+		self.completion_cache:CompletionCache = None
 
 	def start(self):
 		if self.started:
 			return
 		print(f"Loading LLM \"{self.settings.user_model_name}\" using \"{type(self).__name__}\"")
 		self._load_model()
+		# Templates measured before the tokenizer was loaded can be measured now:
+		TokenCountCache.singleton.forget_uncalibrated(self.tokenizer_id())
 		print(f"LLM \"{self.settings.user_model_name}\" loaded!")
 		self.started = True
 	
@@ -29,74 +49,482 @@ class LLM():
 		'''Load the model into memory.'''
 		pass
 	
+	def unload(self):
+		if not self.started:
+			return
+		self._unload_model()
+		self._chat_render_cache.clear()
+		self.started = False
+	
+	def _unload_model(self):
+		'''Release the memory _load_model took.'''
+		pass
+	
+	def memory_footprint(self) -> Optional[int]:
+		'''The bytes this model keeps in memory once started, or None if unknown.'''
+		return None
+	
 	def chat(self, conversation: Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False) -> Union[LLM_Response, Iterator[LLM_Response]]:
 		'''
 		Prompts the model with a Conversation and starts it's answer with
 		start_str using a blocking method and creates a LLM_RawResponse
 		from what it returns.
+		
+		If stream is True this returns an iterator of the response as
+		it's generated, otherwise the finished response.
+		'''
+		key = self._chat_cache_key(conversation, start_str, max_tokens)
+		if key is None:
+			responses = self._chat(conversation, start_str, stream, max_tokens, auto_append)
+		else:
+			cached = self.completion_cache.get(key)
+			if cached is None:
+				responses = self._cache_responses(key, self._chat(conversation, start_str, True, max_tokens, auto_append))
+			else:
+				wip_message, _ = self._new_message(conversation, start_str, self.start_request_prompt, auto_append, max_tokens)
+				responses = self._replay_completion(key, wip_message, cached)
+		
+		responses = self._count_in_flight(LLM._timed(responses))
+		if stream:
+			return responses
+		return LLM._finish(responses)
+	
+	def _chat(self, conversation: Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False) -> Iterator[LLM_Response]:
+		'''
+		Implemented by each model to generate its answer to conversation,
+		yielding the response as it streams if stream is True.
 		'''
 		raise NotImplementedError("This model's implementation does not support chat.")
 	
+	async def achat(self, conversation: Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False) -> AsyncIterator[LLM_Response]:
+		'''
+		Async version of chat that always returns an async iterator of
+		LLM_Response's. If stream is False only the finished response
+		is yielded.
+		'''
+		if self._chat_cache_key(conversation, start_str, max_tokens) is None:
+			responses = self._achat(conversation, start_str, stream, max_tokens, auto_append)
+		else:
+			# Cached completions are only read and written by chat:
+			responses = self._achat_in_thread(conversation, start_str, stream, max_tokens, auto_append)
+		self._add_in_flight(1)
+		response = None
+		try:
+			async for response in responses:
+				response.note_progress()
+				yield response
+		finally:
+			self._add_in_flight(-1)
+			await responses.aclose()
+		# See _timed:
+		if response is not None:
+			response.message.emit_changed()
+	
+	def _achat(self, conversation: Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False) -> AsyncIterator[LLM_Response]:
+		'''
+		Implemented by models with async clients, by default this steps
+		the blocking chat on a worker thread so that models without one
+		can still share an event loop with ones that do.
+		'''
+		return self._achat_in_thread(conversation, start_str, stream, max_tokens, auto_append)
+	
+	async def _achat_in_thread(self, conversation: Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False) -> AsyncIterator[LLM_Response]:
+		responses = self.chat(conversation, start_str, True, max_tokens, auto_append)
+		done = object()
+		response = None
+		try:
+			while True:
+				next_response = await asyncio.to_thread(next, responses, done)
+				if next_response is done:
+					break
+				response = next_response
+				if stream:
+					yield response
+		except (asyncio.CancelledError, GeneratorExit):
+			if response is not None:
+				response.stop()
+			raise
+		
+		if not stream and response is not None:
+			yield response
+	
 	def complete_str(self, text:str, stream=False, max_tokens:int=None) -> Union[LLM_Response, Iterator[LLM_Response]]:
 		'''
 		Similar to prompt, but allows passing raw strings to the model
 		without any additional formatting being added.
 		'''
+		key = self._completion_cache_key("complete_str", text, max_tokens)
+		if key is None:
+			responses = self._complete_str(text, stream, max_tokens)
+		else:
+			cached = self.completion_cache.get(key)
+			if cached is None:
+				responses = self._cache_responses(key, self._complete_str(text, True, max_tokens))
+			else:
+				wip_message, _ = self._new_message(text)
+				responses = self._replay_completion(key, wip_message, cached)
+		
+		responses = self._count_in_flight(LLM._timed(responses))
+		if stream:
+			return responses
+		return LLM._finish(responses)
+	
+	def _complete_str(self, text:str, stream=False, max_tokens:int=None) -> Iterator[LLM_Response]:
 		raise NotImplementedError("This model's implementation does not support simple text completion.")
 	
+	def is_deterministic(self) -> bool:
+		'''
+		True if this model's settings give the same answer to the same
+		prompt every time, meaning its completions can be cached.
+		'''
+		return False
+	
+	def _completion_cache_key(self, *request:Any) -> Optional[str]:
+		'''The key request is cached under, or None if it shouldn't be cached.'''
+		if self.completion_cache is None or not self.is_deterministic():
+			return None
+		return CompletionCache.key(type(self).__name__, self.settings.auto_id, *request)
+	
+	def _chat_cache_key(self, conversation:Conversation, start_str:str, max_tokens:int) -> Optional[str]:
+		'''The key a chat is cached under, only rendering conversation if it could be cached.'''
+		if self.completion_cache is None or not self.is_deterministic():
+			return None
+		return self._completion_cache_key("chat", self.conversation_to_list(conversation), start_str, self.start_request_prompt, max_tokens)
+	
+	def _cache_responses(self, key:str, responses:Iterator[LLM_Response]) -> Iterator[LLM_Response]:
+		'''
+		Passes responses through, storing the text it grew by at each
+		step in the completion cache if it finishes without being stopped.
+		'''
+		chunks = []
+		content = ""
+		response = None
+		try:
+			for response in responses:
+				new_content = response.message.content
+				if new_content.startswith(content):
+					if len(new_content) > len(content):
+						chunks.append(new_content[len(content):])
+				else:
+					chunks = [new_content]
+				content = new_content
+				yield response
+		finally:
+			responses.close()
+		
+		if response is None or response.stopped:
+			return response
+		if response.message.content != content:
+			# Some models replace what they streamed with a final decode:
+			chunks = [response.message.content]
+		self.completion_cache.put(key, CachedCompletion(
+			chunks=chunks,
+			in_token_count=response.source.in_token_count,
+			out_token_count=response.source.out_token_count,
+			finished=response.source.finished
+		))
+		return response
+	
+	def _replay_completion(self, key:str, wip_message:Message, cached:CachedCompletion) -> Iterator[LLM_Response]:
+		'''Streams a cached completion as though the model was generating it.'''
+		stop_requested = False
+		def stop():
+			nonlocal stop_requested
+			stop_requested = True
+		response = LLM_Response(wip_message, stop)
+		response.source.serialized_raw_output = {"CompletionCache":key}
+		yield response
+		
+		for chunk in cached.chunks:
+			if stop_requested:
+				break
+			response.message.append(chunk)
+			yield response
+		
+		response.source.finished = cached.finished and not stop_requested
+		response.source.in_token_count = cached.in_token_count
+		response.source.out_token_count = cached.out_token_count
+		response.finish()
+		return response
+	
+	def _count_in_flight(self, responses:Iterator[LLM_Response]) -> Iterator[LLM_Response]:
+		'''Passes responses through, counting them in in_flight from the first until they're done.'''
+		self._add_in_flight(1)
+		try:
+			return (yield from responses)
+		finally:
+			self._add_in_flight(-1)
+	
+	def _add_in_flight(self, count:int):
+		with self._in_flight_lock:
+			self.in_flight += count
+	
+	@staticmethod
+	def _timed(responses:Iterator[LLM_Response]) -> Iterator[LLM_Response]:
+		'''
+		Passes responses through, noting when each grew so that finish can
+		time it.
+		
+		Streams finish after their last response was yielded, so once
+		they're done this emits the message's changed signal for whatever
+		saves it (eg, ConversationCollection) to see the finished source.
+		'''
+		response = None
+		try:
+			while True:
+				try:
+					response = next(responses)
+				except StopIteration as e:
+					response = e.value if e.value is not None else response
+					if response is not None:
+						response.message.emit_changed()
+					return response
+				response.note_progress()
+				yield response
+		finally:
+			responses.close()
+	
+	@staticmethod
+	def _finish(responses:Iterator[LLM_Response]) -> LLM_Response:
+		'''Runs responses to the end, returning the finished response.'''
+		response = None
+		while True:
+			try:
+				response = next(responses)
+			except StopIteration as e:
+				return e.value if e.value is not None else response
+	
 	def _apply_chat_template(self, chat: List[Dict[str,str]], start_str:str="") -> str:
 		'''Generate a string prompt for the passed conversation in this LLM's preferred format.'''
+		if not self._has_segmented_template():
+			raise NotImplementedError("This LLM does not expose it's chat format.")
+		return "".join(self._chat_template_segment(entry, index) for index, entry in enumerate(chat)) + self._chat_template_end(start_str)
+	
+	def _chat_template_segment(self, entry:Dict[str,str], index:int) -> str:
+		'''
+		The text entry adds to the prompt as the index'th entry of a chat,
+		for chat templates that are just that for each entry followed by
+		_chat_template_end. Prompts for those are made from the text of
+		the entries they share with earlier prompts instead of from scratch.
+		
+		Templates that can look at the whole chat at once, like jinja ones,
+		override _apply_chat_template instead.
+		'''
 		raise NotImplementedError("This LLM does not expose it's chat format.")
 	
+	def _chat_template_end(self, start_str:str="") -> str:
+		'''The text after the last entry of a segmented chat template, which begins the response.'''
+		return start_str
+	
+	def _has_segmented_template(self) -> bool:
+		return type(self)._chat_template_segment is not LLM._chat_template_segment
+	
+	def _has_whole_template(self) -> bool:
+		return type(self)._apply_chat_template is not LLM._apply_chat_template
+	
+	@staticmethod
+	def _json_segment(entry:Dict[str,str], index:int) -> str:
+		'''Segments that make the same prompt as json.dumps(chat), for models we don't know the template of.'''
+		return ("[" if index == 0 else ", ") + json.dumps(entry)
+	
+	def _render_prompt(self, rendered:RenderedSequence, chat:List[Dict[str,str]], start_str:str="", start_request_prompt:str=None) -> str:
+		'''
+		The prompt for chat, which is rendered's chat with any start
+		request added, reusing the prompt made from rendered last time if
+		nothing else changed.
+		
+		Segmented templates only render the entries rendered's messages
+		haven't been rendered with before. Other templates are rendered
+		whole, and anything that can't be rendered falls back to json.
+		'''
+		key = (start_str, start_request_prompt)
+		cached_key, prompt = rendered.prompt_cache
+		if cached_key == key:
+			return prompt
+		
+		def segmented(template:str, render_segment) -> str:
+			start = max(rendered.entry_count - 1, 0)
+			return rendered.prompt_head(template, render_segment) + "".join(render_segment(entry, index) for index, entry in enumerate(chat[start:], start))
+		prompt = None
+		try:
+			if self._has_segmented_template():
+				prompt = segmented("template", self._chat_template_segment) + self._chat_template_end(start_str)
+			elif self._has_whole_template():
+				prompt = self._apply_chat_template(chat, start_str)
+		except:
+			pass
+		if prompt is None:
+			prompt = segmented("json", LLM._json_segment) + "]" if len(chat) > 0 else "[]"
+		
+		rendered.prompt_cache = (key, prompt)
+		return prompt
+	
 	def count_tokens(self, text:str) -> int:
 		'''Count the number of tokens in the passed text.'''
 		raise NotImplementedError("This LLM does not support token counting.")
 	
+	def tokenizer_id(self) -> str:
+		'''
+		Identifies the tokenizer count_tokens uses so that cached token
+		counts can be shared by every instance that uses the same one.
+		'''
+		return f"{type(self).__name__}:{id(self)}"
+	
+	def template_overhead(self) -> TemplateOverhead:
+		'''
+		Measures how many tokens this LLM's chat template adds around
+		message contents, calibrated once per tokenizer.
+		
+		Calibration only renders chats whose roles alternate, since many
+		templates reject anything else. Roles that can't be measured are
+		given the user's overhead, and a template that can't be rendered at
+		all is remembered as uncalibrated rather than tried every call.
+		'''
+		tokenizer_id = self.tokenizer_id()
+		overhead = TokenCountCache.singleton.overhead(tokenizer_id)
+		if overhead is not None:
+			return overhead
+		
+		overhead = self._calibrate_template_overhead()
+		TokenCountCache.singleton.set_overhead(tokenizer_id, overhead)
+		return overhead
+	
+	def _calibrate_template_overhead(self) -> TemplateOverhead:
+		empty_message = lambda role: {"role":role, "content":""}
+		def count(*roles:str) -> Optional[int]:
+			try:
+				return self.count_tokens(self._apply_chat_template([empty_message(role) for role in roles]))
+			except:
+				return None
+		
+		one_message = count("user")
+		if one_message is None or one_message < 0:
+			return TemplateOverhead(calibrated=False)
+		try:
+			empty_text = max(self.count_tokens(""), 0)
+		except:
+			empty_text = 0
+		
+		# Each role's overhead is what it adds after a role it can follow:
+		per_message = {}
+		user_assistant = count("user", "assistant")
+		if user_assistant is not None:
+			per_message["assistant"] = user_assistant - one_message
+			user_assistant_user = count("user", "assistant", "user")
+			if user_assistant_user is not None:
+				per_message["user"] = user_assistant_user - user_assistant
+		system_user = count("system", "user")
+		if system_user is not None:
+			per_message["system"] = system_user - one_message
+		
+		default = per_message.get("user", per_message.get("assistant", 0))
+		for role in ["user", "assistant", "system"]:
+			per_message.setdefault(role, default)
+		return TemplateOverhead(
+			base=one_message - per_message["user"],
+			per_message=per_message,
+			empty_text=empty_text
+		)
+	
+	def count_content_tokens(self, text:str) -> int:
+		'''Count the tokens in text as part of a larger prompt, so without eg a bos token.'''
+		token_count = self.count_tokens(text)
+		if token_count < 0:
+			return token_count
+		return max(token_count - self.template_overhead().empty_text, 0)
+	
+	def count_message_tokens(self, message:Message) -> int:
+		'''Count the tokens in message's content, memoized by its id.'''
+		return TokenCountCache.singleton.count(self.tokenizer_id(), message.auto_id, message.content, self.count_content_tokens)
+	
+	def count_conversation_tokens(self, messages:List[Message], rendered:RenderedSequence, start:int=0) -> int:
+		'''
+		Estimates the tokens in the prompt made from messages, where
+		rendered is what they rendered to, leaving out the messages before
+		start other than system messages.
+		
+		This reads the running totals rendered shares with the other
+		sequences rendered from the same messages, so only messages they
+		haven't counted yet get tokenized.
+		
+		Returns -1 if any message could not be counted.
+		'''
+		self._count_context(messages, rendered)
+		if not rendered.context.countable_to(rendered.length):
+			return -1
+		return self.template_overhead().base + rendered.context.tokens(start, rendered.length)
+	
+	def _count_context(self, messages:List[Message], rendered:RenderedSequence):
+		'''
+		Adds the tokens of each message to rendered's context window,
+		along with what the template adds for each chat entry it starts.
+		'''
+		overhead = self.template_overhead()
+		default_overhead = overhead.per_message.get("user", 0)
+		def cost(i:int) -> Tuple[int,bool]:
+			role = rendered.role(i)
+			tokens = self.count_message_tokens(messages[i])
+			if tokens >= 0:
+				tokens += rendered.entries_added(i) * overhead.per_message.get(role, default_overhead)
+			return tokens, role == "system"
+		rendered.context.extend_to(rendered.length, cost)
+	
+	def _extra_text_tokens(self, extra_text:str) -> int:
+		'''Tokens that start_str or a start request adds to a prompt, counted as its own message.'''
+		return max(self.count_content_tokens(extra_text), 0) + self.template_overhead().per_message.get("user", 0)
+	
+	def context_size(self) -> Optional[int]:
+		'''The most tokens this model can attend to, prompt and response together, or None if unknown.'''
+		return None
+	
+	def _fit_context(self, messages:List[Message], rendered:RenderedSequence, max_tokens:int=None, extra_text:str="") -> int:
+		'''
+		The index of the first message to keep so that messages fit in
+		context_size with room for max_tokens of response, keeping any
+		system messages before it. 0 keeps everything.
+		
+		Finding it only tokenizes messages this hasn't seen before, and
+		then searches the running totals rendered shares with the other
+		sequences rendered from the same messages.
+		'''
+		context_size = self.context_size()
+		if context_size is None or context_size <= 0:
+			return 0
+		
+		try:
+			self._count_context(messages, rendered)
+			overhead = self.template_overhead()
+			budget = context_size - (max_tokens or 0) - overhead.base
+			if extra_text:
+				budget -= self._extra_text_tokens(extra_text)
+		except:
+			return 0
+		
+		start = rendered.context.fit(budget, rendered.length)
+		if start is None:
+			return 0
+		# Always leave the model something to answer:
+		return min(start, max(len(messages) - 1, 0))
+	
 	def conversation_to_list(self, conversation: Conversation) -> List[Dict[str,str]]:
-		chat = []
-		prev_role = None
-		prev_user_name = None
-		role_mapping  = {
-			CommonRoles.System.value: "system",
-			CommonRoles.User.value: "user",
-			CommonRoles.Assistant.value: "assistant"
-		}
-		must_alternate = self.settings.roles.must_alternate
-		
-		def append(msg:Dict[str,str], name:str):
-			if name is not None:
-				msg["name"] = name
-			chat.append(msg)
-		for message in conversation.message_sequence.messages:
-			message_role, user_name = CommonRoles.from_source(message.source)
-			role = role_mapping[message_role.value]
-			if must_alternate:
-				# Make sure roles alternate
-				if prev_role is None and role == "assistant":
-					append({
-						"role":role_mapping[CommonRoles.User.value],
-						"content":""
-					}, user_name)
-				if role == prev_role:
-					chat[-1]["content"] += "\n\n" + message.content
-				else:
-					append({
-						"role":role,
-						"content":message.content
-					}, user_name)
-			else:
-				if role == prev_role and user_name == prev_user_name:
-					chat[-1]["content"] += "\n\n" + message.content
-				else:
-					append({
-						"role":role,
-						"content":message.content
-					}, user_name)
-			prev_role = role
-			prev_user_name = user_name
-		return chat
+		return self._render_conversation(conversation).chat
+	
+	def _render_conversation(self, conversation: Conversation) -> RenderedSequence:
+		'''
+		Renders conversation into a chat list, reusing whatever was
+		already rendered for the longest prefix of its messages.
+		'''
+		return self._chat_render_cache.render(conversation.message_sequence.messages, self.settings.roles.must_alternate)
 		
-	def _new_message(self, input:Union[str,Conversation]=None, start_str:str="", start_request_prompt:str=None, auto_append=False) -> Tuple[Message, Optional[List[Dict[str,str]]]]:
+	@staticmethod
+	def _last_model_source(conversation:Conversation) -> Optional[ModelSource]:
+		'''The source of the latest message in conversation whose prompt was stored as blocks.'''
+		for message in reversed(conversation.message_sequence.messages):
+			if isinstance(message.source, ModelSource) and message.source.prompt_block is not None:
+				return message.source
+		return None
+	
+	def _new_message(self, input:Union[str,Conversation]=None, start_str:str="", start_request_prompt:str=None, auto_append=False, max_tokens:int=None) -> Tuple[Message, Optional[List[Dict[str,str]]]]:
 		'''
 		Creates a new message that the model will fill in.
 		
@@ -107,33 +535,52 @@ class LLM():
 		"<|start_str|>" will be replaced with start_str. If start_request_prompt is left
 		None then it is assumed your model can handle start_str and it will be stored in
 		the source information as normal. - Note that this method WILL cost you input tokens.
+		
+		If the conversation won't fit in context_size along with max_tokens
+		of response, its oldest messages other than system messages are left
+		out, which is recorded in the source's context_start_index.
 		'''
 		source = ModelSource(model_class=type(self).__name__, settings=self.settings, start_str=start_str)
+		source.timing = GenerationTiming(model_class=source.model_class, model_name=self.settings.user_model_name or source.model_class)
 		source.generating = True
 		message_list = None
 		new_message = Message("", source)
 		
 		if isinstance(input, Conversation):
 			source.message_sequence = input.message_sequence
-			message_list = self.conversation_to_list(input)
+			messages = input.message_sequence.messages
+			rendered = self._render_conversation(input)
 			
+			extra_text = start_str
 			if start_request_prompt and start_str and len(start_str)>0:
 				start_request_prompt = start_request_prompt.replace("<|start_str|>", start_str)
-				if message_list[-1]["role"] is not "user":
-					message_list.append[{"role":"user", "content":start_request_prompt}]
-				else:
-					message_list[-1]["content"] = f"{message_list[-1]['content']}\n\n{start_request_prompt}"
+				extra_text = start_request_prompt
+			
+			source.context_start_index = self._fit_context(messages, rendered, max_tokens, extra_text)
 			try:
-				source.prompt = self._apply_chat_template(message_list, start_str)
-				source.in_token_count = self.count_tokens(source.prompt)
+				source.in_token_count = self.count_conversation_tokens(messages, rendered, source.context_start_index)
+				if source.in_token_count >= 0 and extra_text:
+					source.in_token_count += self._extra_text_tokens(extra_text)
 			except:
-				if source.prompt is None:
-					source.prompt = json.dumps(message_list, indent=4)
+				pass
+			if source.context_start_index > 0:
+				messages = [messages[i] for i in rendered.context.systems_before(source.context_start_index)] + messages[source.context_start_index:]
+				rendered = self._chat_render_cache.render(messages, self.settings.roles.must_alternate)
+			message_list = rendered.chat
+			
+			if start_request_prompt and start_str and len(start_str)>0:
+				if len(message_list) == 0 or message_list[-1]["role"] != "user":
+					message_list.append({"role":"user", "content":start_request_prompt})
+				else:
+					# Replaced rather than modified since rendered shares its entries:
+					message_list[-1] = dict(message_list[-1], content=f"{message_list[-1]['content']}\n\n{start_request_prompt}")
+			prompt = self._render_prompt(rendered, message_list, start_str, start_request_prompt)
+			source.store_prompt(prompt, LLM._last_model_source(input))
 			if auto_append:
 				input.add_message(new_message)
 				
 		elif isinstance(input, str):
-			source.prompt = input
+			source.store_prompt(input)
 			try:
 				source.in_token_count = self.count_tokens(input)
 			except:
@@ -141,4 +588,15 @@ class LLM():
 		else:
 			raise ValueError("Invalid input type. 'Input' should be a Conversation or a string.")
 			
-		return new_message, message_list
\ No newline at end of file
+		return new_message, message_list
+
+class PlainTemplate_LLM(LLM):
+	'''
+	An LLM that prompts with each message on a line of its own as
+	"role: content", for stand-ins that have no chat template of their own.
+	'''
+	def _chat_template_segment(self, entry:Dict[str,str], index:int) -> str:
+		return f"{entry['role']}: {entry['content']}\n"
+	
+	def _chat_template_end(self, start_str:str="") -> str:
+		return "assistant: " + start_str
\ No newline at end of file
@@ -1,23 +1,129 @@
 from AbstractAI.Model.Converse.Message import Message
 from AbstractAI.Model.Converse.MessageSources import ModelSource
-from typing import Callable, Iterator, Dict, Any
-from dataclasses import dataclass
+from AbstractAI.Helpers.dict_from_obj import dict_from_obj
+from .ChunkLog import ChunkLog
+from typing import Callable, Iterator, Dict, Any, List, Optional
+from dataclasses import dataclass, field
+import time
+
+@dataclass
+class TokenUsage:
+	'''Token counts a model reported for a response, None where it didn't say.'''
+	in_token_count:Optional[int] = None
+	out_token_count:Optional[int] = None
 
 @dataclass
 class LLM_Response:
 	message:Message
 	stop_streaming_func:Callable[[],None]
+	stopped:bool = field(default=False, init=False)
+	
+	# Log stream chunks compactly in a ChunkLog rather than
+	# as a list of dicts under serialized_raw_output["Chunks"]:
+	compact_chunk_log:bool = field(default=True, kw_only=True)
+	chunk_log:ChunkLog = field(default=None, init=False)
+	usage:TokenUsage = field(default=None, init=False)
+	
+	# When the message grew, as noted by note_progress:
+	_arrival_times:List[float] = field(default_factory=list, init=False, repr=False)
+	_seen_length:Optional[int] = field(default=None, init=False, repr=False)
 	
 	@property
 	def source(self) -> ModelSource:
 		return self.message.source
 	
 	def stop(self):
+		self.stopped = True
 		if self.stop_streaming_func:
 			self.stop_streaming_func()
 			self.stop_streaming_func = None
 	
-	def log_chunk(self, chunk:Dict[str,Any]):
-		if "Chunks" not in self.source.serialized_raw_output:
-			self.source.serialized_raw_output["Chunks"] = []
-		self.source.serialized_raw_output["Chunks"].append(chunk)
\ No newline at end of file
+	def log_chunk(self, chunk:Any, delta:Optional[str]=None, finish_reason:Optional[str]=None, usage:bool=False):
+		'''
+		Logs a raw stream chunk along with the text it added, its finish
+		reason and whether it carries usage information.
+		'''
+		if not self.compact_chunk_log:
+			if "Chunks" not in self.source.serialized_raw_output:
+				self.source.serialized_raw_output["Chunks"] = []
+			self.source.serialized_raw_output["Chunks"].append(dict_from_obj(chunk))
+			return
+		
+		if self.chunk_log is None:
+			self.chunk_log = ChunkLog(dict_from_obj)
+		self.chunk_log.append(chunk, delta, finish_reason, usage)
+	
+	def report_usage(self, in_token_count:Optional[int]=None, out_token_count:Optional[int]=None):
+		'''Records the usage a model reported, applied to the source by finish.'''
+		self.usage = TokenUsage(in_token_count, out_token_count)
+	
+	def note_progress(self):
+		'''
+		Notes the time if the message has grown since the last call. LLM
+		calls this as each response is read, so that every model's stream
+		is timed the same way.
+		'''
+		content = self.message.content
+		if self._seen_length is None:
+			start_str = self.source.start_str or ""
+			self._seen_length = len(start_str) if content.startswith(start_str) else 0
+		if len(content) > self._seen_length:
+			self._arrival_times.append(time.time())
+			self._seen_length = len(content)
+	
+	def last_chunk(self) -> Optional[Dict[str,Any]]:
+		'''The last chunk logged as a dict, or None if there were none.'''
+		if self.chunk_log is not None:
+			return self.chunk_log.last_raw()
+		chunks = self.source.serialized_raw_output.get("Chunks", None)
+		if chunks:
+			return chunks[-1]
+		return None
+	
+	def finish(self):
+		'''
+		Marks the response done generating, storing its chunk log in the
+		source and filling in its token counts from the reported usage.
+		
+		Where a stream reported no output count, it's taken to be the
+		number of chunks that added text.
+		'''
+		usage = self.usage if self.usage is not None else TokenUsage()
+		if usage.in_token_count is not None:
+			self.source.in_token_count = usage.in_token_count
+		if usage.out_token_count is not None:
+			self.source.out_token_count = usage.out_token_count
+		elif self.chunk_log is not None:
+			self.source.out_token_count = sum(1 for delta in self.chunk_log.deltas if delta)
+		elif "Chunks" in self.source.serialized_raw_output:
+			self.source.out_token_count = len(self.source.serialized_raw_output["Chunks"])
+		
+		if self.chunk_log is not None:
+			self.source.serialized_raw_output["ChunkLog"] = self.chunk_log.serialize()
+		if self.source.timing is not None:
+			self._record_timing(self.source.timing)
+		self.source.generating = False
+	
+	def _record_timing(self, timing:"GenerationTiming"):
+		end = time.time()
+		start = timing.start_time.timestamp()
+		# Responses that weren't streamed arrive all at once:
+		arrivals = self._arrival_times if len(self._arrival_times) > 0 else [end]
+		
+		timing.total_seconds = end - start
+		timing.time_to_first_token = arrivals[0] - start
+		gaps = sorted(b - a for a, b in zip(arrivals, arrivals[1:]))
+		if len(gaps) > 0:
+			percentile = lambda p: gaps[min(int(p * len(gaps)), len(gaps) - 1)]
+			timing.inter_token_p50 = percentile(0.5)
+			timing.inter_token_p90 = percentile(0.9)
+			timing.inter_token_p99 = percentile(0.99)
+		
+		out_token_count = max(self.source.out_token_count, 0)
+		decode_seconds = end - arrivals[0]
+		if out_token_count > 1 and decode_seconds > 0:
+			timing.tokens_per_second = (out_token_count - 1) / decode_seconds
+		elif timing.total_seconds > 0:
+			timing.tokens_per_second = out_token_count / timing.total_seconds
+		timing.out_token_count = out_token_count
+		timing.chunk_count = len(self._arrival_times)
\ No newline at end of file
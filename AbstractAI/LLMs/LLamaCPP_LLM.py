@@ -1,15 +1,18 @@
 from AbstractAI.LLMs.CommonRoles import CommonRoles
 from .LLM import *
 
-from llama_cpp import Llama
+from llama_cpp import Llama, LlamaRAMCache
+import os
 from llama_cpp.llama_chat_format import LlamaChatCompletionHandlerRegistry, ChatFormatter, ChatFormatterResponse
+from AbstractAI.LLMs.LLamaCPP_Scheduler import LLamaCPP_Scheduler, SamplingSettings
 from AbstractAI.Model.Settings.LLamaCpp_LLMSettings import LLamaCpp_LLMSettings
 
 class LLamaCPP_LLM(LLM):
 	def __init__(self, settings:LLamaCpp_LLMSettings):
 		super().__init__(settings)
 		self.model = None
-		
+		self.scheduler:LLamaCPP_Scheduler = None
+	
 	def _load_model(self):
 		self.model = Llama(
 			self.settings.model.model_path,
@@ -21,9 +24,38 @@ class LLamaCPP_LLM(LLM):
 			flash_attn=self.settings.model.flash_attn,
 			verbose=self.settings.model.verbose
 		)
+		
+		# Llama reuses the prefix it evaluated last on its own, but the
+		# cache lets it resume from any earlier prompt too, like when we
+		# regenerate a message or switch between conversations:
+		if self.settings.model.prefix_cache_mb > 0:
+			self.model.set_cache(LlamaRAMCache(capacity_bytes=self.settings.model.prefix_cache_mb * 1024 * 1024))
+		
+		if self.settings.model.parallel_slots > 1:
+			self.scheduler = LLamaCPP_Scheduler(
+				self.model,
+				n_slots=self.settings.model.parallel_slots,
+				n_ctx_per_slot=self.settings.model.n_ctx,
+				n_batch=self.model.n_batch,
+				n_threads=self.settings.model.n_threads
+			)
 	
-	def chat(self, conversation: Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False) -> Union[LLM_Response, Iterator[LLM_Response]]:
-		wip_message, message_list = self._new_message(conversation, start_str, auto_append=auto_append)
+	def _unload_model(self):
+		if self.scheduler is not None:
+			self.scheduler.close()
+			self.scheduler = None
+		if hasattr(self.model, "close"):
+			self.model.close()
+		self.model = None
+	
+	def memory_footprint(self) -> Optional[int]:
+		# Weights are memory mapped, so most of what Llama holds is the file:
+		return os.path.getsize(self.settings.model.model_path)
+	
+	def _chat(self, conversation: Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False) -> Union[LLM_Response, Iterator[LLM_Response]]:
+		wip_message, message_list = self._new_message(conversation, start_str, auto_append=auto_append, max_tokens=max_tokens)
+		if self.scheduler is not None:
+			return (yield from self._scheduled_chat(wip_message, start_str, stream, max_tokens))
 		
 		params = kwargs_from_instance(self.model.create_completion, self.settings.generate)
 		
@@ -31,7 +63,7 @@ class LLamaCPP_LLM(LLM):
 			params["max_tokens"] = max_tokens
 		
 		completion = self.model(
-			wip_message.source.prompt,
+			wip_message.source.full_prompt(),
 			**params,
 			stream=stream
 		)
@@ -42,22 +74,62 @@ class LLamaCPP_LLM(LLM):
 			yield response
 			
 			for i, chunk in enumerate(completion):
-				if response.message.append(chunk['choices'][0]['text']):
-					response.source.out_token_count += 1
-				response.log_chunk(chunk)
+				delta = chunk['choices'][0]['text']
+				response.message.append(delta)
+				response.log_chunk(chunk, delta, chunk['choices'][0].get('finish_reason', None))
 				response.source.finished = chunk['choices'][0].get('finish_reason', None) == 'stop'
 				yield response
-			response.source.generating = False
+			response.finish()
 		else:
+			response = LLM_Response(wip_message, None)
 			response.source.finished = completion['choices'][0]['finish_reason'] == 'stop'
 			response.message.append(completion['choices'][0]['text'])
-			response.source.in_token_count = completion["usage"]["prompt_tokens"]
-			response.source.out_token_count = completion["usage"]["completion_tokens"]
+			response.report_usage(completion["usage"]["prompt_tokens"], completion["usage"]["completion_tokens"])
 			response.source.serialized_raw_output = completion
-			response.source.generating = False
+			response.finish()
 		
 		return response
 	
+	def _scheduled_chat(self, wip_message:Message, start_str:str, stream:bool, max_tokens:int) -> Iterator[LLM_Response]:
+		'''
+		Generates through the scheduler, which decodes this alongside any
+		other chats running on the model at the same time.
+		'''
+		prompt_tokens = self.model.tokenize(wip_message.source.full_prompt().encode("utf-8"), special=True)
+		generate = self.settings.generate
+		request = self.scheduler.submit(prompt_tokens, max_tokens, SamplingSettings(
+			temperature=generate.temperature,
+			top_k=generate.top_k,
+			top_p=generate.top_p,
+			min_p=generate.min_p,
+			repeat_penalty=generate.repeat_penalty
+		))
+		
+		response = LLM_Response(wip_message, request.cancel)
+		response.message.content = start_str
+		try:
+			if stream:
+				yield response
+			for text in request:
+				response.message.append(text)
+				response.log_chunk(text, text)
+				if stream:
+					yield response
+		except GeneratorExit:
+			request.cancel()
+			raise
+		
+		response.source.finished = request.finish_reason == "stop"
+		response.report_usage(len(prompt_tokens), len(request.generated_tokens))
+		response.finish()
+		return response
+	
+	def context_size(self) -> Optional[int]:
+		return self.settings.model.n_ctx
+	
+	def is_deterministic(self) -> bool:
+		return self.settings.generate.temperature <= 0
+	
 	def _apply_chat_template(self, chat: List[Dict[str,str]], start_str:str="") -> str:
 		# The formatter functions in LlamaCPP are wrapped by the register_chat_format
 		# decorator, which stores them in a registry of chat completion handlers with
@@ -70,4 +142,7 @@ class LLamaCPP_LLM(LLM):
 	
 	def count_tokens(self, text:str) -> int:
 		'''Count the number of tokens in the passed text.'''
-		return len(self.model.tokenize(text.encode("utf-8") if text != "" else [self.model.token_bos()], special=True))
\ No newline at end of file
+		return len(self.model.tokenize(text.encode("utf-8"), special=True))
+	
+	def tokenizer_id(self) -> str:
+		return f"LLamaCPP:{self.settings.model.model_path}"
\ No newline at end of file
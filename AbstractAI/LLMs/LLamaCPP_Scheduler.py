@@ -0,0 +1,328 @@
+from collections import deque
+from dataclasses import dataclass, field
+from threading import Condition, Thread
+from typing import Deque, Iterator, List, Optional, Set
+import codecs
+import queue
+
+import numpy as np
+import llama_cpp
+from llama_cpp import Llama
+
+@dataclass
+class SamplingSettings:
+	temperature:float = 0.8
+	top_k:int = 40
+	top_p:float = 0.95
+	min_p:float = 0.05
+	repeat_penalty:float = 1.1
+	repeat_last_n:int = 64
+
+def sample(logits:np.ndarray, settings:SamplingSettings, recent_tokens:List[int], rng:np.random.Generator) -> int:
+	'''Picks the next token from a row of logits.'''
+	logits = logits.astype(np.float32, copy=True)
+	if settings.repeat_penalty != 1 and len(recent_tokens) > 0:
+		recent = np.unique(np.asarray(recent_tokens[-settings.repeat_last_n:], dtype=np.int64))
+		penalized = logits[recent]
+		logits[recent] = np.where(penalized > 0, penalized / settings.repeat_penalty, penalized * settings.repeat_penalty)
+	
+	if settings.temperature <= 0:
+		return int(np.argmax(logits))
+	
+	candidates = np.arange(len(logits))
+	if 0 < settings.top_k < len(logits):
+		candidates = np.argpartition(-logits, settings.top_k)[:settings.top_k]
+	candidates = candidates[np.argsort(-logits[candidates])]
+	
+	scaled = logits[candidates] / settings.temperature
+	probabilities = np.exp(scaled - scaled[0])
+	probabilities /= probabilities.sum()
+	
+	keep = len(candidates)
+	if settings.min_p > 0:
+		keep = min(keep, max(int(np.sum(probabilities >= settings.min_p * probabilities[0])), 1))
+	if settings.top_p < 1:
+		keep = min(keep, int(np.searchsorted(np.cumsum(probabilities), settings.top_p)) + 1)
+	probabilities = probabilities[:keep] / probabilities[:keep].sum()
+	return int(candidates[rng.choice(keep, p=probabilities)])
+
+@dataclass
+class SlotRequest:
+	'''One generation being served by the scheduler, iterated for its text as it's decoded.'''
+	prompt_tokens:List[int]
+	max_tokens:int
+	sampling:SamplingSettings
+	
+	generated_tokens:List[int] = field(default_factory=list)
+	context_tokens:List[int] = field(default_factory=list)
+	finish_reason:Optional[str] = None
+	error:Optional[Exception] = None
+	cancelled:bool = False
+	
+	slot:int = -1
+	n_past:int = 0
+	next_token:int = -1
+	
+	def __post_init__(self):
+		self._text = queue.Queue()
+		self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+		self._scheduler:Optional["LLamaCPP_Scheduler"] = None
+		if len(self.context_tokens) == 0:
+			self.context_tokens = list(self.prompt_tokens)
+	
+	def cancel(self):
+		'''
+		Stops generating. A request still waiting for a slot finishes at
+		once, one that has a slot frees it at the scheduler's next step.
+		'''
+		if self._scheduler is None:
+			self.cancelled = True
+			return
+		with self._scheduler._condition:
+			self.cancelled = True
+			waiting = self._scheduler._waiting
+			for i in range(len(waiting)):
+				if waiting[i] is self:
+					del waiting[i]
+					self._finish("cancelled")
+					break
+			self._scheduler._condition.notify_all()
+	
+	def __iter__(self) -> Iterator[str]:
+		while True:
+			text = self._text.get()
+			if text is None:
+				break
+			yield text
+		if self.error is not None:
+			raise self.error
+	
+	def _emit(self, token_bytes:bytes):
+		text = self._decoder.decode(token_bytes)
+		if len(text) > 0:
+			self._text.put(text)
+	
+	def _finish(self, reason:str, error:Exception=None):
+		self.finish_reason = reason
+		self.error = error
+		text = self._decoder.decode(b"", final=True)
+		if len(text) > 0:
+			self._text.put(text)
+		self._text.put(None)
+
+def _seq_rm(ctx, seq_id:int):
+	'''Clears everything seq_id has in the KV cache, across llama.cpp's renames of it.'''
+	if hasattr(llama_cpp, "llama_memory_seq_rm"):
+		llama_cpp.llama_memory_seq_rm(llama_cpp.llama_get_memory(ctx), seq_id, -1, -1)
+	elif hasattr(llama_cpp, "llama_kv_self_seq_rm"):
+		llama_cpp.llama_kv_self_seq_rm(ctx, seq_id, -1, -1)
+	else:
+		llama_cpp.llama_kv_cache_seq_rm(ctx, seq_id, -1, -1)
+
+class LLamaCPP_Scheduler:
+	'''
+	Serves several generations at once from one loaded model, giving
+	each a sequence (slot) of its own in a shared context and decoding
+	a token for every one of them in each batch (continuous batching).
+	
+	Each step every decoding slot gets exactly one token, and whatever
+	is left of the batch goes to prompts waiting to be evaluated, a
+	chunk at a time and round robin, so long prompts don't stall the
+	generations already running. Requests beyond the number of slots
+	wait for one to free up, first come first served.
+	'''
+	def __init__(self, llama:Llama, n_slots:int, n_ctx_per_slot:int, n_batch:int=512, prefill_chunk:int=128, n_threads:int=1, seed:int=None):
+		self.llama = llama
+		self.n_slots = n_slots
+		self.n_ctx_per_slot = n_ctx_per_slot
+		self.n_batch = max(n_batch, n_slots)
+		self.prefill_chunk = prefill_chunk
+		self.rng = np.random.default_rng(seed)
+		
+		self.ctx, self.batch = self._new_context(n_threads)
+		self.n_vocab = llama.n_vocab()
+		self.end_tokens = self._end_tokens()
+		
+		self._slots:List[Optional[SlotRequest]] = [None] * n_slots
+		self._waiting:Deque[SlotRequest] = deque()
+		self._next_prefill = 0
+		self._condition = Condition()
+		self._running = True
+		self._thread = Thread(target=self._loop, daemon=True)
+		self._thread.start()
+	
+	def _new_context(self, n_threads:int) -> tuple:
+		'''Creates the shared context and batch, returning (ctx, batch).'''
+		params = llama_cpp.llama_context_default_params()
+		params.n_ctx = self.n_ctx_per_slot * self.n_slots
+		params.n_batch = self.n_batch
+		params.n_threads = n_threads
+		params.n_threads_batch = n_threads
+		if hasattr(params, "n_seq_max"):
+			params.n_seq_max = self.n_slots
+		new_context = getattr(llama_cpp, "llama_init_from_model", None) or llama_cpp.llama_new_context_with_model
+		ctx = new_context(self.llama.model, params)
+		if ctx is None:
+			raise RuntimeError("Failed to create a llama.cpp context for the scheduler.")
+		return ctx, llama_cpp.llama_batch_init(self.n_batch, 0, 1)
+	
+	def _free_context(self):
+		llama_cpp.llama_batch_free(self.batch)
+		llama_cpp.llama_free(self.ctx)
+	
+	def _decode(self) -> int:
+		return llama_cpp.llama_decode(self.ctx, self.batch)
+	
+	def _logits(self, batch_index:int) -> np.ndarray:
+		return np.ctypeslib.as_array(llama_cpp.llama_get_logits_ith(self.ctx, batch_index), shape=(self.n_vocab,))
+	
+	def _clear_slot(self, slot:int):
+		_seq_rm(self.ctx, slot)
+	
+	def _end_tokens(self) -> Set[int]:
+		end_tokens = {self.llama.token_eos()}
+		try:
+			end_tokens.add(self.llama._model.token_eot())
+		except:
+			pass
+		return {token for token in end_tokens if token is not None and token >= 0}
+	
+	def submit(self, prompt_tokens:List[int], max_tokens:int, sampling:SamplingSettings) -> SlotRequest:
+		'''Queues a generation, returning the request to iterate for its text.'''
+		if len(prompt_tokens) == 0:
+			raise ValueError("Can't generate from an empty prompt.")
+		if len(prompt_tokens) > self.n_ctx_per_slot:
+			raise ValueError(f"The prompt is {len(prompt_tokens)} tokens, more than the {self.n_ctx_per_slot} each slot has room for.")
+		if max_tokens is None or max_tokens <= 0:
+			max_tokens = self.n_ctx_per_slot - len(prompt_tokens)
+		request = SlotRequest(list(prompt_tokens), max_tokens, sampling)
+		request._scheduler = self
+		with self._condition:
+			self._waiting.append(request)
+			self._condition.notify_all()
+		return request
+	
+	@property
+	def active_requests(self) -> int:
+		with self._condition:
+			return sum(1 for request in self._slots if request is not None)
+	
+	@property
+	def waiting_requests(self) -> int:
+		with self._condition:
+			return len(self._waiting)
+	
+	def close(self):
+		with self._condition:
+			self._running = False
+			self._condition.notify_all()
+		self._thread.join()
+		for request in list(self._waiting) + [r for r in self._slots if r is not None]:
+			request._finish("cancelled")
+		self._free_context()
+	
+	def _loop(self):
+		while True:
+			with self._condition:
+				self._condition.wait_for(lambda: not self._running or len(self._waiting) > 0 or self.active_requests > 0)
+				if not self._running:
+					return
+				self._assign_slots()
+			
+			entries = self._build_batch()
+			if len(entries) == 0:
+				continue
+			result = self._decode()
+			if result != 0:
+				# Most likely out of KV cache, so give up on the requests in this batch:
+				for request in {id(request):request for request, _ in entries}.values():
+					self._free(request, "error", RuntimeError(f"llama_decode failed with {result}"))
+				continue
+			
+			for request, batch_index in entries:
+				if batch_index >= 0:
+					self._sample(request, batch_index)
+	
+	def _assign_slots(self):
+		for slot in range(self.n_slots):
+			if self._slots[slot] is None and len(self._waiting) > 0:
+				request = self._waiting.popleft()
+				if request.cancelled:
+					request._finish("cancelled")
+					continue
+				request.slot = slot
+				self._clear_slot(slot)
+				self._slots[slot] = request
+	
+	def _add(self, i:int, token:int, pos:int, seq_id:int, logits:bool):
+		self.batch.token[i] = token
+		self.batch.pos[i] = pos
+		self.batch.n_seq_id[i] = 1
+		self.batch.seq_id[i][0] = seq_id
+		self.batch.logits[i] = logits
+	
+	def _build_batch(self) -> List[tuple]:
+		'''
+		Fills the batch, returning (request, batch index of its logits or -1)
+		for every request with tokens in it.
+		'''
+		entries = []
+		n = 0
+		
+		# One token for everything that's generating:
+		prefilling = []
+		for request in self._slots:
+			if request is None:
+				continue
+			if request.cancelled:
+				self._free(request, "cancelled")
+				continue
+			if request.n_past < len(request.prompt_tokens):
+				prefilling.append(request)
+				continue
+			self._add(n, request.next_token, request.n_past, request.slot, True)
+			request.n_past += 1
+			entries.append((request, n))
+			n += 1
+		
+		# Then the rest of the batch to prompts, round robin:
+		if len(prefilling) > 0:
+			start = self._next_prefill % len(prefilling)
+			self._next_prefill += 1
+			for request in prefilling[start:] + prefilling[:start]:
+				if n >= self.n_batch:
+					break
+				count = min(self.prefill_chunk, self.n_batch - n, len(request.prompt_tokens) - request.n_past)
+				for j in range(count):
+					position = request.n_past + j
+					last = position == len(request.prompt_tokens) - 1
+					self._add(n, request.prompt_tokens[position], position, request.slot, last)
+					entries.append((request, n if last else -1))
+					n += 1
+				request.n_past += count
+		
+		self.batch.n_tokens = n
+		return entries
+	
+	def _sample(self, request:SlotRequest, batch_index:int):
+		token = sample(self._logits(batch_index), request.sampling, request.context_tokens, self.rng)
+		
+		if token in self.end_tokens:
+			self._free(request, "stop")
+			return
+		request.generated_tokens.append(token)
+		request.context_tokens.append(token)
+		request._emit(self.llama.detokenize([token]))
+		request.next_token = token
+		
+		if request.cancelled:
+			self._free(request, "cancelled")
+		elif len(request.generated_tokens) >= request.max_tokens or request.n_past + 1 >= self.n_ctx_per_slot:
+			self._free(request, "length")
+	
+	def _free(self, request:SlotRequest, reason:str, error:Exception=None):
+		with self._condition:
+			if request.slot >= 0 and self._slots[request.slot] is request:
+				self._slots[request.slot] = None
+				self._clear_slot(request.slot)
+		request._finish(reason, error)
\ No newline at end of file
@@ -1,40 +1,130 @@
 from AbstractAI.LLMs.LLM import *
+from AbstractAI.Helpers.LoopLocal import LoopLocal
 from AbstractAI.Model.Settings.Ollama_LLMSettings import Ollama_LLMSettings
 import ollama
 
 class Ollama_LLM(LLM):
+	start_request_prompt = default_start_request_prompt
+	
 	def __init__(self, settings:Ollama_LLMSettings):
 		self.client = None
+		# One per event loop, since its connections are bound to the loop they're opened on:
+		self.async_client:LoopLocal[ollama.AsyncClient] = None
 		super().__init__(settings)
 	
-	def chat(self, conversation: Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False) -> Union[LLM_Response, Iterator[LLM_Response]]:
-		wip_message, message_list = self._new_message(conversation, start_str, default_start_request_prompt, auto_append)
+	def _load_model(self):
+		self.client = ollama.Client()
+		self.async_client = LoopLocal(ollama.AsyncClient)
+	
+	def _unload_model(self):
+		self.client = None
+		self.async_client = None
+	
+	def memory_footprint(self) -> Optional[int]:
+		# The model is held by the Ollama server, not this process:
+		return 0
+	
+	def _chat(self, conversation: Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False) -> Union[LLM_Response, Iterator[LLM_Response]]:
+		wip_message, message_list = self._new_message(conversation, start_str, self.start_request_prompt, auto_append, max_tokens)
+		
+		completion = self.client.chat(**self._chat_params(message_list, stream, max_tokens))
+		
+		if stream:
+			# The stream can't be closed while it's waiting on the next chunk,
+			# so stop just flags the loop below to close it:
+			stop_requested = False
+			def stop():
+				nonlocal stop_requested
+				stop_requested = True
+			response = LLM_Response(wip_message, stop)
+			yield response
+			
+			try:
+				for chunk in completion:
+					self._process_chunk(response, chunk)
+					yield response
+					if stop_requested:
+						break
+			finally:
+				# Closing the stream drops the connection, which stops the server generating:
+				completion.close()
+			response.finish()
+		else:
+			response = LLM_Response(wip_message, None)
+			self._process_completion(response, completion)
+		
+		return response
+	
+	async def _achat(self, conversation: Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False) -> AsyncIterator[LLM_Response]:
+		wip_message, message_list = self._new_message(conversation, start_str, self.start_request_prompt, auto_append, max_tokens)
 		
-		completion = ollama.chat(
-			model=self.settings.model_name,
-			messages=message_list,
-			stream=stream
-		)
+		completion = await self.async_client.get().chat(**self._chat_params(message_list, stream, max_tokens))
 		
 		if stream:
-			response = LLM_Response(wip_message, completion.close)
+			# The async stream can only be closed by awaiting it,
+			# so stop just flags the loop below to close it:
+			stop_requested = False
+			def stop():
+				nonlocal stop_requested
+				stop_requested = True
+			response = LLM_Response(wip_message, stop)
 			yield response
 			
-			for i, chunk in enumerate(completion):
-				if i > max_tokens-1:
-					response.stop()
-					break
-				if response.message.append(chunk['message']['content']):
-					response.source.out_token_count += 1
-				response.log_chunk(chunk)
-				response.source.finished = chunk.get('done_reason', None) == 'stop'
-				yield response
-			response.source.generating = False
+			try:
+				async for chunk in completion:
+					self._process_chunk(response, chunk)
+					yield response
+					if stop_requested:
+						break
+			finally:
+				await completion.aclose()
+			response.finish()
 		else:
-			response.source.finished = completion['done_reason'] == 'stop'
-			response.message.content = completion['message']['content']
-			response.source.out_token_count = completion['eval_count']
-			response.source.serialized_raw_output = completion
-			response.source.generating = False
+			response = LLM_Response(wip_message, None)
+			self._process_completion(response, completion)
+			yield response
+	
+	def _chat_params(self, message_list:List[Dict[str,str]], stream:bool, max_tokens:int=None) -> Dict[str,Any]:
+		'''
+		Arguments for chat, with the limits passed as options so that the
+		server stops generating at them rather than us ignoring the rest.
+		'''
+		options = {}
+		num_predict = max_tokens if max_tokens is not None else self.settings.num_predict
+		if num_predict is not None and num_predict >= 0:
+			options["num_predict"] = num_predict
+		if self.settings.num_ctx > 0:
+			options["num_ctx"] = self.settings.num_ctx
 		
-		return response
\ No newline at end of file
+		params = {
+			"model":self.settings.model_name,
+			"messages":message_list,
+			"stream":stream
+		}
+		if len(options) > 0:
+			params["options"] = options
+		keep_alive = self.settings.keep_alive
+		if keep_alive:
+			# The server only takes plain seconds, like -1, as a number:
+			params["keep_alive"] = int(keep_alive) if keep_alive.lstrip("-").isdigit() else keep_alive
+		return params
+	
+	def context_size(self) -> Optional[int]:
+		return self.settings.num_ctx if self.settings.num_ctx > 0 else None
+	
+	def _process_chunk(self, response:LLM_Response, chunk:Dict[str,Any]):
+		delta = chunk['message']['content']
+		response.message.append(delta)
+		done = chunk.get('done', False)
+		response.log_chunk(chunk, delta, chunk.get('done_reason', None), done)
+		if done:
+			# The last chunk carries the counts for the whole response:
+			response.source.finished = chunk.get('done_reason', None) == 'stop'
+			response.report_usage(chunk.get('prompt_eval_count', None), chunk.get('eval_count', None))
+	
+	def _process_completion(self, response:LLM_Response, completion:Dict[str,Any]):
+		response.source.finished = completion['done_reason'] == 'stop'
+		response.message.content = completion['message']['content']
+		response.report_usage(completion.get('prompt_eval_count', None), completion.get('eval_count', None))
+		response.source.serialized_raw_output = completion
+		response.finish()
\ No newline at end of file
@@ -1,67 +1,229 @@
 from .LLM import *
 from AbstractAI.LLMs.CommonRoles import CommonRoles
 from AbstractAI.Helpers.dict_from_obj import dict_from_obj
-import tiktoken
-from openai import OpenAI
+from AbstractAI.LLMs.ClientPool import ClientPool
+from AbstractAI.Helpers.LoopLocal import LoopLocal
+from AbstractAI.LLMs.RateLimiter import RequestScheduler
+from openai import OpenAI, AsyncOpenAI
 from openai.types.chat import ChatCompletion, ChatCompletionChunk
 from openai._streaming import Stream
 import json
 import os
+from functools import lru_cache
 from AbstractAI.Model.Settings.OpenAI_LLMSettings import OpenAI_LLMSettings
 
+@lru_cache(maxsize=None)
+def encoding_for_model(model_name:str) -> "tiktoken.Encoding":
+	# tiktoken is slow to import, and only needed once we count tokens:
+	import tiktoken
+	return tiktoken.encoding_for_model(model_name)
+
 class OpenAI_LLM(LLM):
+	start_request_prompt = default_start_request_prompt
+	
 	def __init__(self, settings:OpenAI_LLMSettings):
 		self.client = None
+		# One per event loop, see ClientPool:
+		self.async_client:LoopLocal[AsyncOpenAI] = None
 		super().__init__(settings)
 	
-	def chat(self, conversation: Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False) -> Union[LLM_Response, Iterator[LLM_Response]]:
-		wip_message, message_list = self._new_message(conversation, start_str, default_start_request_prompt, auto_append)
+	def _chat(self, conversation: Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False) -> Union[LLM_Response, Iterator[LLM_Response]]:
+		wip_message, message_list = self._new_message(conversation, start_str, self.start_request_prompt, auto_append, max_tokens)
 		
-		completion:ChatCompletion|Stream[ChatCompletionChunk] = self.client.chat.completions.create(
-			model=self.settings.model_name,
-			messages=message_list,
-			max_tokens=max_tokens,
-			# temperature=self.settings.temperature,
-			stream=stream
-		)
+		params = self._completion_params(message_list, stream, max_tokens)
+		scheduler = self._scheduler()
+		if scheduler is None:
+			completion:ChatCompletion|Stream[ChatCompletionChunk] = self.client.chat.completions.create(**params)
+		else:
+			completion, reservation = scheduler.run(
+				lambda: self.client.chat.completions.create(**params),
+				self._estimate_tokens(wip_message, max_tokens),
+				self._is_rate_limited, self._retry_after
+			)
 		
-		if stream:
-			response = LLM_Response(wip_message, completion.close)
-			yield response
-			
-			for i, chunk in enumerate(completion):
-				if response.message.append(chunk.choices[0].delta.content):
-					response.source.out_token_count += 1
-				response.log_chunk(dict_from_obj(chunk))
-				response.source.finished = chunk.choices[0].finish_reason == 'stop'
+		response = None
+		try:
+			if stream:
+				response = LLM_Response(wip_message, completion.close)
 				yield response
-			response.source.generating = False
+				
+				for chunk in completion:
+					self._process_chunk(response, chunk)
+					yield response
+				response.finish()
+			else:
+				response = LLM_Response(wip_message, None)
+				self._process_completion(response, completion)
+		finally:
+			# Settled however the request ends, even if it's stopped or fails part way:
+			if scheduler is not None:
+				scheduler.settle(reservation, self._tokens_used(response))
+		return response
+	
+	async def _achat(self, conversation: Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False) -> AsyncIterator[LLM_Response]:
+		wip_message, message_list = self._new_message(conversation, start_str, self.start_request_prompt, auto_append, max_tokens)
+		
+		params = self._completion_params(message_list, stream, max_tokens)
+		scheduler = self._scheduler()
+		if scheduler is None:
+			completion = await self.async_client.get().chat.completions.create(**params)
 		else:
-			response.source.finished = completion.choices[0].finish_reason == 'stop'
-			response.message.content = completion.choices[0].message.content
-			response.source.in_token_count = completion.usage.prompt_tokens
-			response.source.out_token_count = completion.usage.completion_tokens
-			response.source.serialized_raw_output = dict_from_obj(completion)
-			response.source.generating = False
+			completion, reservation = await scheduler.arun(
+				lambda: self.async_client.get().chat.completions.create(**params),
+				self._estimate_tokens(wip_message, max_tokens),
+				self._is_rate_limited, self._retry_after
+			)
 		
-		return response
+		response = None
+		try:
+			if stream:
+				# AsyncStream.close is a coroutine, so stop just flags
+				# the loop below which closes the stream itself:
+				stop_requested = False
+				def stop():
+					nonlocal stop_requested
+					stop_requested = True
+				response = LLM_Response(wip_message, stop)
+				yield response
+				
+				try:
+					async for chunk in completion:
+						self._process_chunk(response, chunk)
+						yield response
+						if stop_requested:
+							break
+				finally:
+					await completion.close()
+				response.finish()
+			else:
+				response = LLM_Response(wip_message, None)
+				self._process_completion(response, completion)
+				yield response
+		finally:
+			# Settled however the request ends, even if it's stopped or fails part way:
+			if scheduler is not None:
+				scheduler.settle(reservation, self._tokens_used(response))
+	
+	def _scheduler(self) -> Optional[RequestScheduler]:
+		'''The scheduler shared by every request counted against the same rate limits, if any are set.'''
+		requests_per_minute = getattr(self.settings, "requests_per_minute", 0)
+		tokens_per_minute = getattr(self.settings, "tokens_per_minute", 0)
+		if requests_per_minute <= 0 and tokens_per_minute <= 0:
+			return None
+		return RequestScheduler.shared(
+			(type(self).__name__, self.settings.base_url, self.settings.api_key, self.settings.model_name),
+			requests_per_minute, tokens_per_minute
+		)
+	
+	@staticmethod
+	def _estimate_tokens(wip_message:Message, max_tokens:int) -> int:
+		'''Tokens a request could use, counting its prompt and the most it could generate.'''
+		return max(wip_message.source.in_token_count, 0) + (max_tokens or 0)
+	
+	@staticmethod
+	def _tokens_used(response:Optional[LLM_Response]) -> int:
+		if response is None or response.source.in_token_count < 0:
+			return -1
+		return response.source.in_token_count + response.source.out_token_count
+	
+	@staticmethod
+	def _is_rate_limited(e:Exception) -> bool:
+		return getattr(e, "status_code", None) == 429
 	
-	def _apply_chat_template(self, chat: List[Dict[str,str]], start_str:str="") -> str:
+	@staticmethod
+	def _retry_after(e:Exception) -> Optional[float]:
+		'''How long the provider asked us to wait, if it said.'''
+		try:
+			return float(e.response.headers["retry-after"])
+		except:
+			return None
+	
+	def _completion_params(self, message_list:List[Dict[str,str]], stream:bool, max_tokens:int) -> Dict[str,Any]:
+		'''The arguments to chat.completions.create shared by chat and achat.'''
+		params = {
+			"model":self.settings.model_name,
+			"messages":message_list,
+			"max_tokens":max_tokens,
+			"stream":stream
+		}
+		if stream and self._stream_options() is not None:
+			params["stream_options"] = self._stream_options()
+		temperature = getattr(self.settings, "temperature", None)
+		if temperature is not None and temperature >= 0:
+			params["temperature"] = temperature
+		return params
+	
+	def _process_chunk(self, response:LLM_Response, chunk:ChatCompletionChunk):
+		delta, finish_reason = None, None
+		# The usage chunk at the end of a stream has no choices:
+		if len(chunk.choices) > 0:
+			delta = chunk.choices[0].delta.content
+			finish_reason = chunk.choices[0].finish_reason
+			response.message.append(delta)
+			if finish_reason is not None:
+				response.source.finished = finish_reason == 'stop'
+		usage = self._chunk_usage(chunk)
+		response.log_chunk(chunk, delta, finish_reason, usage is not None)
+		if usage is not None:
+			response.report_usage(usage.prompt_tokens, usage.completion_tokens)
+	
+	def _stream_options(self) -> Optional[Dict[str,Any]]:
+		'''Asks for a usage chunk at the end of streams.'''
+		return {"include_usage":True}
+	
+	def _chunk_usage(self, chunk:ChatCompletionChunk) -> Optional[Any]:
+		'''The token usage a stream chunk carries, if any.'''
+		return getattr(chunk, "usage", None)
+	
+	def _process_completion(self, response:LLM_Response, completion:ChatCompletion):
+		response.source.finished = completion.choices[0].finish_reason == 'stop'
+		response.message.content = completion.choices[0].message.content
+		response.report_usage(completion.usage.prompt_tokens, completion.usage.completion_tokens)
+		response.source.serialized_raw_output = dict_from_obj(completion)
+		response.finish()
+	
+	def context_size(self) -> Optional[int]:
+		return getattr(self.settings, "context_size", 0) or None
+	
+	def is_deterministic(self) -> bool:
+		return getattr(self.settings, "temperature", None) == 0
+	
+	def _chat_template_segment(self, entry:Dict[str,str], index:int) -> str:
+		return ("" if index == 0 else "\n\n") + f"#{entry['role']}:\n{entry['content']}"
+	
+	def _chat_template_end(self, start_str:str="") -> str:
 		if start_str is not None and len(start_str) > 0:
 			raise Exception("Start string not supported by OpenAI")
-		prompt_peices = []
-		for message in chat:
-			prompt_peices.append( f"#{message['role']}:\n{message['content']}" )
-		return "\n\n".join(prompt_peices)
+		return ""
 	
 	def _load_model(self):
-		self.client = OpenAI(api_key=self.settings.api_key)
+		pool = ClientPool.singleton
+		base_url = self.settings.base_url or None
+		organization = self.settings.organization or None
+		self.client = OpenAI(
+			api_key=self.settings.api_key, base_url=base_url, organization=organization,
+			http_client=pool.client("OpenAI", base_url, self.settings.api_key)
+		)
+		self.async_client = LoopLocal(lambda: AsyncOpenAI(
+			api_key=self.settings.api_key, base_url=base_url, organization=organization,
+			http_client=pool.async_client("OpenAI", base_url, self.settings.api_key)
+		))
+	
+	def _unload_model(self):
+		self.client = None
+		self.async_client = None
+	
+	def memory_footprint(self) -> Optional[int]:
+		return 0
 	
 	def count_tokens(self, text:str, model_name:str=None) -> int:
 		'''Count the number of tokens in the passed text.'''
 		if model_name is None:
 			model_name = self.settings.model_name
 		try:
-			return len(tiktoken.encoding_for_model(model_name).encode(text))
+			return len(encoding_for_model(model_name).encode(text))
 		except:
-			return -1
\ No newline at end of file
+			return -1
+	
+	def tokenizer_id(self) -> str:
+		return f"tiktoken:{self.settings.model_name}"
\ No newline at end of file
@@ -0,0 +1,236 @@
+from AbstractAI.Helpers.FairLock import FairLock
+from AbstractAI.Helpers.LoopLocal import LoopLocal
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+import asyncio
+import random
+import time
+
+T = TypeVar("T")
+
+class TokenBucket:
+	'''
+	Allows up to per_minute of something per minute, refilling
+	continuously rather than all at once each minute.
+	'''
+	def __init__(self, per_minute:float, clock:Callable[[],float]=time.monotonic):
+		self.capacity = per_minute
+		self.rate = per_minute / 60
+		self.available = per_minute
+		self.clock = clock
+		self._last = clock()
+	
+	def _refill(self):
+		now = self.clock()
+		self.available = min(self.capacity, self.available + (now - self._last) * self.rate)
+		self._last = now
+	
+	def wait_time(self, amount:float) -> float:
+		'''Seconds until amount is available, never more than it takes to fill up.'''
+		self._refill()
+		deficit = min(amount, self.capacity) - self.available
+		return max(deficit, 0) / self.rate
+	
+	def take(self, amount:float):
+		'''Uses amount, which can go into debt if it's more than is available.'''
+		self._refill()
+		self.available -= amount
+	
+	def give_back(self, amount:float):
+		self._refill()
+		self.available = min(self.capacity, self.available + amount)
+
+@dataclass
+class Reservation:
+	'''What one request took from the buckets, to settle once we know what it used.'''
+	tokens:int
+	wait_seconds:float
+
+@dataclass
+class SchedulerStats:
+	requests:int = 0
+	rate_limited:int = 0
+	total_wait_seconds:float = 0
+	max_wait_seconds:float = 0
+	
+	@property
+	def average_wait_seconds(self) -> float:
+		if self.requests == 0:
+			return 0
+		return self.total_wait_seconds / self.requests
+
+class RequestScheduler:
+	'''
+	Holds requests back in the order they arrive so that they stay within
+	requests_per_minute and tokens_per_minute, where 0 means no limit, and
+	retries ones the provider rate limits anyway with jittered exponential
+	backoff, pausing every request until then.
+	
+	Tokens are reserved up front from an estimate of what a request will
+	use, then settled against what it actually used once it's done.
+	
+	Threads wait their turn in one queue, and async requests wait theirs
+	in one queue per event loop without blocking it.
+	'''
+	_shared:Dict[Any, "RequestScheduler"] = {}
+	_shared_lock = Lock()
+	
+	def __init__(self, requests_per_minute:int=0, tokens_per_minute:int=0, max_retries:int=6, base_backoff:float=1, max_backoff:float=60, clock:Callable[[],float]=time.monotonic, sleep:Callable[[float],None]=time.sleep, async_sleep:Callable[[float],Awaitable[None]]=asyncio.sleep, jitter:Callable[[],float]=random.random):
+		self.max_retries = max_retries
+		self.base_backoff = base_backoff
+		self.max_backoff = max_backoff
+		self.clock = clock
+		self.sleep = sleep
+		self.async_sleep = async_sleep
+		self.jitter = jitter
+		self.stats = SchedulerStats()
+		
+		self._set_limits(requests_per_minute, tokens_per_minute)
+		self._paused_until = 0
+		self._queue_depth = 0
+		self._queue = FairLock()
+		self._async_queue:LoopLocal[asyncio.Lock] = LoopLocal(asyncio.Lock)
+		self._lock = Lock()
+	
+	@classmethod
+	def shared(cls, key:Any, requests_per_minute:int=0, tokens_per_minute:int=0) -> "RequestScheduler":
+		'''
+		Returns the scheduler for everything sharing the limits identified
+		by key (eg, an api key and model), updating its limits if they changed.
+		'''
+		with cls._shared_lock:
+			scheduler = cls._shared.get(key, None)
+			if scheduler is None:
+				scheduler = cls._shared[key] = cls(requests_per_minute, tokens_per_minute)
+			elif (scheduler.requests_per_minute, scheduler.tokens_per_minute) != (requests_per_minute, tokens_per_minute):
+				with scheduler._lock:
+					scheduler._set_limits(requests_per_minute, tokens_per_minute)
+			return scheduler
+	
+	def _set_limits(self, requests_per_minute:int, tokens_per_minute:int):
+		self.requests_per_minute = requests_per_minute
+		self.tokens_per_minute = tokens_per_minute
+		self._requests = TokenBucket(requests_per_minute, self.clock) if requests_per_minute > 0 else None
+		self._tokens = TokenBucket(tokens_per_minute, self.clock) if tokens_per_minute > 0 else None
+	
+	@property
+	def queue_depth(self) -> int:
+		'''The number of requests waiting for their turn or for the limits.'''
+		return self._queue_depth
+	
+	def acquire(self, tokens:int) -> Reservation:
+		'''Blocks until a request estimated to use tokens can be sent.'''
+		start = self.clock()
+		self._add_queue_depth(1)
+		try:
+			with self._queue:
+				while True:
+					wait = self._take(tokens)
+					if wait <= 0:
+						break
+					self.sleep(wait)
+		finally:
+			self._add_queue_depth(-1)
+		return self._reserved(tokens, start)
+	
+	async def aacquire(self, tokens:int) -> Reservation:
+		'''Async version of acquire, which waits without blocking the event loop.'''
+		start = self.clock()
+		self._add_queue_depth(1)
+		try:
+			async with self._async_queue.get():
+				while True:
+					wait = self._take(tokens)
+					if wait <= 0:
+						break
+					await self.async_sleep(wait)
+		finally:
+			self._add_queue_depth(-1)
+		return self._reserved(tokens, start)
+	
+	def _take(self, tokens:int) -> float:
+		'''Takes what a request uses from the limits if they allow it, otherwise returns how long until they will.'''
+		with self._lock:
+			wait = max(
+				self._paused_until - self.clock(),
+				self._requests.wait_time(1) if self._requests else 0,
+				self._tokens.wait_time(tokens) if self._tokens else 0
+			)
+			if wait <= 0:
+				if self._requests:
+					self._requests.take(1)
+				if self._tokens:
+					self._tokens.take(tokens)
+			return wait
+	
+	def _add_queue_depth(self, count:int):
+		with self._lock:
+			self._queue_depth += count
+	
+	def _reserved(self, tokens:int, start:float) -> Reservation:
+		waited = self.clock() - start
+		with self._lock:
+			self.stats.requests += 1
+			self.stats.total_wait_seconds += waited
+			self.stats.max_wait_seconds = max(self.stats.max_wait_seconds, waited)
+		return Reservation(tokens, waited)
+	
+	def settle(self, reservation:Reservation, tokens_used:int):
+		'''Corrects the tokens reserved for a request to what it actually used.'''
+		if self._tokens is None or tokens_used < 0:
+			return
+		with self._lock:
+			if tokens_used < reservation.tokens:
+				self._tokens.give_back(reservation.tokens - tokens_used)
+			else:
+				self._tokens.take(tokens_used - reservation.tokens)
+		reservation.tokens = tokens_used
+	
+	def refund(self, reservation:Reservation):
+		'''Gives back the tokens reserved for a request that failed, so a retry doesn't pay for them twice.'''
+		self.settle(reservation, 0)
+	
+	def backoff(self, attempt:int, retry_after:Optional[float]=None) -> float:
+		'''Seconds to wait before retry number attempt, half of it random.'''
+		delay = min(self.max_backoff, self.base_backoff * 2**attempt)
+		delay = delay / 2 + self.jitter() * delay / 2
+		if retry_after is not None:
+			delay = max(delay, retry_after)
+		return delay
+	
+	def run(self, request:Callable[[],T], tokens:int, is_rate_limited:Callable[[Exception],bool], retry_after:Callable[[Exception],Optional[float]]=lambda e: None) -> Tuple[T, Reservation]:
+		'''
+		Calls request once the limits allow it, retrying while it raises
+		an exception that is_rate_limited, up to max_retries times.
+		'''
+		attempt = 0
+		while True:
+			reservation = self.acquire(tokens)
+			try:
+				return request(), reservation
+			except Exception as e:
+				self.refund(reservation)
+				self._back_off(e, attempt, is_rate_limited, retry_after)
+				attempt += 1
+	
+	async def arun(self, request:Callable[[],Awaitable[T]], tokens:int, is_rate_limited:Callable[[Exception],bool], retry_after:Callable[[Exception],Optional[float]]=lambda e: None) -> Tuple[T, Reservation]:
+		'''Async version of run.'''
+		attempt = 0
+		while True:
+			reservation = await self.aacquire(tokens)
+			try:
+				return await request(), reservation
+			except Exception as e:
+				self.refund(reservation)
+				self._back_off(e, attempt, is_rate_limited, retry_after)
+				attempt += 1
+	
+	def _back_off(self, e:Exception, attempt:int, is_rate_limited:Callable[[Exception],bool], retry_after:Callable[[Exception],Optional[float]]):
+		'''Pauses every request before retrying a rate limited one, or re-raises e.'''
+		if not is_rate_limited(e) or attempt >= self.max_retries:
+			raise e
+		delay = self.backoff(attempt, retry_after(e))
+		with self._lock:
+			self.stats.rate_limited += 1
+			self._paused_until = max(self._paused_until, self.clock() + delay)
\ No newline at end of file
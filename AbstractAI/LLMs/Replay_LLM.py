@@ -0,0 +1,117 @@
+from .LLM import *
+from .ChunkLog import ChunkLog
+from AbstractAI.Model.Settings.Replay_LLMSettings import Replay_LLMSettings
+from threading import Event
+from copy import deepcopy
+import time
+
+def raw_chunk_delta(chunk:Dict[str,Any]) -> str:
+	'''The text a raw chunk from any of our streaming backends added.'''
+	choices = chunk.get("choices", None)
+	if choices:
+		choice = choices[0]
+		if "delta" in choice:
+			return (choice["delta"] or {}).get("content", None) or ""
+		return choice.get("text", None) or ""
+	if "message" in chunk:
+		return (chunk["message"] or {}).get("content", None) or ""
+	return ""
+
+class Replay_LLM(PlainTemplate_LLM):
+	'''
+	Answers every prompt by re-streaming the same recorded message, from
+	its ChunkLog (or legacy Chunks list) at its original pace scaled by
+	speed, through the same LLM_Response path a real model uses.
+	
+	Set message directly to replay one that's already loaded, otherwise
+	the settings' message_id is looked up in storage_location on start.
+	'''
+	def __init__(self, settings:Replay_LLMSettings, message:Message=None):
+		super().__init__(settings)
+		self.message = message
+	
+	def _load_model(self):
+		if self.message is not None:
+			return
+		from ClassyFlaskDB.DATA import DATAEngine
+		engine = DATAEngine(DATA, engine_str=f"sqlite:///{self.settings.storage_location}")
+		with engine.session() as session:
+			self.message = deepcopy(session.query(Message).filter(Message.auto_id == self.settings.message_id).first())
+		if self.message is None or not isinstance(self.message.source, ModelSource):
+			raise ValueError(f"No model message {self.settings.message_id} in {self.settings.storage_location} to replay.")
+	
+	def memory_footprint(self) -> Optional[int]:
+		return 0
+	
+	def recorded_chunks(self) -> List[Tuple[float, str]]:
+		'''
+		The (seconds after the request started, text) of each recorded
+		chunk. Chunks logged without times are spread evenly over the
+		message's recorded timing, or paced by chunks_per_second.
+		'''
+		source:ModelSource = self.message.source
+		timing = source.timing
+		first_token = timing.time_to_first_token if timing is not None and timing.time_to_first_token is not None else None
+		
+		raw_output = source.serialized_raw_output or {}
+		if "ChunkLog" in raw_output:
+			log = ChunkLog.deserialize(raw_output["ChunkLog"])
+			if len(log) == 0:
+				return []
+			offset = first_token if first_token is not None else log.times[0]
+			return [(offset + log.times[i] - log.times[0], delta) for i, delta in enumerate(log.deltas)]
+		
+		if "Chunks" in raw_output:
+			deltas = [raw_chunk_delta(chunk) for chunk in raw_output["Chunks"]]
+		else:
+			deltas = [self.message.content]
+		if first_token is not None and timing.total_seconds is not None and len(deltas) > 1:
+			step = (timing.total_seconds - first_token) / (len(deltas) - 1)
+			return [(first_token + i * step, delta) for i, delta in enumerate(deltas)]
+		step = 1 / self.settings.chunks_per_second if self.settings.chunks_per_second > 0 else 0
+		return [((first_token or 0) + i * step, delta) for i, delta in enumerate(deltas)]
+	
+	def _chat(self, conversation: Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False) -> Union[LLM_Response, Iterator[LLM_Response]]:
+		wip_message, message_list = self._new_message(conversation, start_str, auto_append=auto_append, max_tokens=max_tokens)
+		return (yield from self._replay(wip_message, stream))
+	
+	def _complete_str(self, text:str, stream=False, max_tokens:int=None) -> Union[LLM_Response, Iterator[LLM_Response]]:
+		wip_message, _ = self._new_message(text)
+		return (yield from self._replay(wip_message, stream))
+	
+	def _replay(self, wip_message:Message, stream:bool) -> Iterator[LLM_Response]:
+		chunks = self.recorded_chunks()
+		original:ModelSource = self.message.source
+		
+		# Whatever the chunks don't cover, like a start_str, was there from the start:
+		content = self.message.content
+		streamed = "".join(delta for _, delta in chunks)
+		prefix = content[:len(content) - len(streamed)] if content.endswith(streamed) else ""
+		
+		stop_event = Event()
+		response = LLM_Response(wip_message, stop_event.set)
+		response.message.content = prefix
+		response.source.serialized_raw_output["Replay"] = {"message":self.message.auto_id, "speed":self.settings.speed}
+		if stream:
+			yield response
+		
+		start = time.perf_counter()
+		for offset, delta in chunks:
+			if self.settings.speed > 0:
+				wait = start + offset / self.settings.speed - time.perf_counter()
+				if stop_event.wait(max(wait, 0)):
+					break
+			elif stop_event.is_set():
+				break
+			response.message.append(delta)
+			response.log_chunk({"text":delta}, delta)
+			if stream:
+				yield response
+		
+		if not stop_event.is_set():
+			# Some models replace what they streamed with a final decode:
+			response.message.content = content
+		response.source.finished = original.finished and not stop_event.is_set()
+		response.report_usage(original.in_token_count, original.out_token_count if not stop_event.is_set() else None)
+		response.finish()
+		return response
\ No newline at end of file
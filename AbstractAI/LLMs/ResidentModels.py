@@ -0,0 +1,124 @@
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from threading import RLock
+from typing import Deque, Dict, Optional
+import os
+import time
+
+@dataclass
+class ResidencyEvent:
+	'''A model being loaded into or evicted from memory.'''
+	kind:str
+	model_name:str
+	seconds:float
+	footprint_bytes:int
+
+@dataclass
+class ResidentModel:
+	llm:"LLM"
+	footprint_bytes:int
+
+def _rss_bytes() -> Optional[int]:
+	'''This process's resident memory, or None where we can't read it.'''
+	try:
+		with open("/proc/self/statm") as f:
+			return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+	except:
+		return None
+
+class ResidentModels:
+	'''
+	Keeps started LLMs loaded so that switching back to one we used
+	recently doesn't load it again, evicting the least recently used
+	ones once their combined memory footprint is over ram_budget_mb, or
+	once there are more than max_models of them. Remote models have no
+	footprint, so the count is what keeps them from piling up.
+	
+	Models with requests in flight are never evicted, they're evicted by
+	a later get once they're done if we're still over.
+	
+	Models are keyed by the auto_id of the settings they're loaded from,
+	so changing a model's settings loads it again with the new ones.
+	'''
+	singleton:"ResidentModels" = None
+	
+	def __init__(self, ram_budget_mb:int=0, max_models:int=8):
+		self.ram_budget_mb = ram_budget_mb
+		self.max_models = max_models
+		self.history:Deque[ResidencyEvent] = deque(maxlen=100)
+		
+		self._models:OrderedDict[str, ResidentModel] = OrderedDict()
+		self._lock = RLock()
+		
+		if ResidentModels.singleton is None:
+			ResidentModels.singleton = self
+	
+	def get(self, settings:"LLMSettings") -> "LLM":
+		'''Returns a started LLM for settings, only loading it if it isn't already.'''
+		key = settings.auto_id
+		with self._lock:
+			resident = self._models.get(key, None)
+			if resident is not None:
+				self._models.move_to_end(key)
+				return resident.llm
+			
+			rss_before = _rss_bytes()
+			start = time.perf_counter()
+			llm = settings.load()
+			llm.start()
+			seconds = time.perf_counter() - start
+			
+			footprint = llm.memory_footprint()
+			if footprint is None:
+				rss_after = _rss_bytes()
+				footprint = max(rss_after - rss_before, 0) if rss_before is not None and rss_after is not None else 0
+			
+			self._models[key] = ResidentModel(llm, footprint)
+			self._record("load", llm, seconds, footprint)
+			self._evict_over_budget(keep=key)
+			return llm
+	
+	def evict(self, settings:"LLMSettings") -> bool:
+		'''Unloads the model loaded from settings, returning False if there was none.'''
+		with self._lock:
+			resident = self._models.pop(settings.auto_id, None)
+			if resident is None:
+				return False
+			self._unload(resident)
+			return True
+	
+	def clear(self):
+		with self._lock:
+			while len(self._models) > 0:
+				self._unload(self._models.popitem(last=False)[1])
+	
+	def footprint_bytes(self) -> int:
+		'''The combined memory footprint of every resident model.'''
+		with self._lock:
+			return sum(resident.footprint_bytes for resident in self._models.values())
+	
+	def __contains__(self, settings:"LLMSettings") -> bool:
+		return settings.auto_id in self._models
+	
+	def __len__(self):
+		return len(self._models)
+	
+	def _evict_over_budget(self, keep:str):
+		budget = self.ram_budget_mb * 1024 * 1024
+		for key in list(self._models.keys()):
+			if self.footprint_bytes() <= budget and len(self._models) <= self.max_models:
+				break
+			if key != keep and getattr(self._models[key].llm, "in_flight", 0) == 0:
+				self._unload(self._models.pop(key))
+	
+	def _unload(self, resident:ResidentModel):
+		start = time.perf_counter()
+		resident.llm.unload()
+		self._record("evict", resident.llm, time.perf_counter() - start, resident.footprint_bytes)
+	
+	def _record(self, kind:str, llm:"LLM", seconds:float, footprint:int):
+		event = ResidencyEvent(kind, llm.settings.user_model_name, seconds, footprint)
+		self.history.append(event)
+		print(f"{'Loaded' if kind == 'load' else 'Evicted'} LLM \"{event.model_name}\" in {seconds:.2f}s ({footprint / (1024*1024):.0f}MB, {len(self._models)} resident)")
+
+ResidentModels()
\ No newline at end of file
@@ -0,0 +1,89 @@
+from .LLM import *
+from AbstractAI.Model.Settings.Synthetic_LLMSettings import Synthetic_LLMSettings
+from threading import Event
+import random
+
+WORDS = (
+	"the of and to in is that for it as with was on be by this are at from or an which have not "
+	"model token stream message signal view window system response prompt context cache load"
+).split()
+
+class SyntheticFailure(Exception):
+	'''Raised by Synthetic_LLM when failure_rate has it fail a request.'''
+
+class Synthetic_LLM(PlainTemplate_LLM):
+	'''
+	Streams random words at the pace its settings describe, so that the
+	UI, persistence and signals can be measured under a known load.
+	
+	Each word is counted as one token.
+	'''
+	def __init__(self, settings:Synthetic_LLMSettings):
+		super().__init__(settings)
+		self.random:random.Random = None
+	
+	def _load_model(self):
+		self.random = random.Random(self.settings.seed if self.settings.seed != 0 else None)
+	
+	def _unload_model(self):
+		self.random = None
+	
+	def memory_footprint(self) -> Optional[int]:
+		return 0
+	
+	def _chat(self, conversation: Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False) -> Union[LLM_Response, Iterator[LLM_Response]]:
+		wip_message, message_list = self._new_message(conversation, start_str, auto_append=auto_append, max_tokens=max_tokens)
+		return (yield from self._generate(wip_message, start_str, stream, max_tokens))
+	
+	def _complete_str(self, text:str, stream=False, max_tokens:int=None) -> Union[LLM_Response, Iterator[LLM_Response]]:
+		wip_message, _ = self._new_message(text)
+		return (yield from self._generate(wip_message, "", stream, max_tokens))
+	
+	def _generate(self, wip_message:Message, start_str:str, stream:bool, max_tokens:int=None) -> Iterator[LLM_Response]:
+		token_count = max_tokens if max_tokens is not None else self.settings.response_tokens
+		fail_at = self.random.randrange(max(token_count, 1)) if self.random.random() < self.settings.failure_rate else None
+		
+		stop_event = Event()
+		response = LLM_Response(wip_message, stop_event.set)
+		response.message.content = start_str
+		if stream:
+			yield response
+		
+		generated = 0
+		delay = self.settings.time_to_first_token
+		while generated < token_count:
+			if stop_event.wait(self._jittered(delay)):
+				break
+			if fail_at is not None and generated >= fail_at:
+				raise SyntheticFailure(f"Synthetic failure after {generated} tokens.")
+			
+			words = [self.random.choice(WORDS) for _ in range(min(self.settings.chunk_tokens, token_count - generated))]
+			delta = ("" if generated == 0 and not start_str else " ") + " ".join(words)
+			generated += len(words)
+			delay = len(words) / self.settings.tokens_per_second if self.settings.tokens_per_second > 0 else 0
+			
+			response.message.append(delta)
+			response.log_chunk({"text":delta, "tokens":len(words)}, delta, "length" if generated >= token_count else None)
+			if stream:
+				yield response
+		
+		response.source.finished = not stop_event.is_set()
+		response.report_usage(wip_message.source.in_token_count, generated)
+		response.finish()
+		return response
+	
+	def _jittered(self, delay:float) -> float:
+		jitter = self.settings.jitter
+		if jitter <= 0:
+			return delay
+		return max(delay * (1 + self.random.uniform(-jitter, jitter)), 0)
+	
+	def context_size(self) -> Optional[int]:
+		return self.settings.context_size if self.settings.context_size > 0 else None
+	
+	def count_tokens(self, text:str) -> int:
+		'''Count the number of tokens in the passed text.'''
+		return len(text.split())
+	
+	def tokenizer_id(self) -> str:
+		return "Synthetic:words"
\ No newline at end of file
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+
+@dataclass
+class TemplateOverhead:
+	'''
+	Models the tokens a chat template adds around message contents,
+	so that the size of a prompt can be estimated from the token counts
+	of its messages without tokenizing the whole rendered prompt:
+	
+	tokens(prompt) = base + sum(per_message[role] + tokens(content))
+	
+	empty_text is what the tokenizer reports for an empty string (eg, a
+	bos token) and is subtracted from every content count.
+	
+	calibrated is False when the template couldn't be measured, in which
+	case everything is 0 and the estimate is just the content tokens.
+	'''
+	base:int = 0
+	per_message:Dict[str,int] = field(default_factory=dict)
+	empty_text:int = 0
+	calibrated:bool = True
+	
+	def estimate(self, chat:List[Dict[str,str]], content_tokens:int) -> int:
+		'''Estimate the token count of chat whose contents total content_tokens.'''
+		default = self.per_message.get("user", 0)
+		return self.base + content_tokens + sum(self.per_message.get(entry["role"], default) for entry in chat)
+
+class TokenCountCache:
+	'''
+	A bounded, least recently used cache of token counts keyed by
+	the tokenizer that counted them and the id of what was counted.
+	
+	Each entry also remembers a hash of the text it counted, so text
+	that changed under the same id (like a message still being generated)
+	is counted again rather than returning a stale count.
+	'''
+	singleton:"TokenCountCache" = None
+	
+	def __init__(self, max_entries:int=200_000):
+		self.max_entries = max_entries
+		self.hits = 0
+		self.misses = 0
+		
+		self._counts:OrderedDict[Tuple[str,str], Tuple[int,int]] = OrderedDict()
+		self._overheads:Dict[str, TemplateOverhead] = {}
+		self._lock = Lock()
+		
+		if TokenCountCache.singleton is None:
+			TokenCountCache.singleton = self
+	
+	def count(self, tokenizer_id:str, key:str, text:str, count_tokens:Callable[[str],int]) -> int:
+		'''
+		Returns the number of tokens in text, only calling count_tokens
+		if (tokenizer_id, key) has not already been counted with this text.
+		'''
+		cache_key = (tokenizer_id, key)
+		text_hash = hash(text)
+		with self._lock:
+			entry = self._counts.get(cache_key, None)
+			if entry is not None and entry[0] == text_hash:
+				self._counts.move_to_end(cache_key)
+				self.hits += 1
+				return entry[1]
+		
+		# Count outside the lock so slow tokenizers don't block other threads:
+		token_count = count_tokens(text)
+		
+		with self._lock:
+			self.misses += 1
+			self._counts[cache_key] = (text_hash, token_count)
+			self._counts.move_to_end(cache_key)
+			while len(self._counts) > self.max_entries:
+				self._counts.popitem(last=False)
+		return token_count
+	
+	def overhead(self, tokenizer_id:str) -> Optional[TemplateOverhead]:
+		with self._lock:
+			return self._overheads.get(tokenizer_id, None)
+	
+	def set_overhead(self, tokenizer_id:str, overhead:TemplateOverhead):
+		with self._lock:
+			self._overheads[tokenizer_id] = overhead
+	
+	def forget_uncalibrated(self, tokenizer_id:str):
+		'''Drops tokenizer_id's overhead if it couldn't be measured, so it's measured again.'''
+		with self._lock:
+			overhead = self._overheads.get(tokenizer_id, None)
+			if overhead is not None and not overhead.calibrated:
+				del self._overheads[tokenizer_id]
+	
+	def clear(self):
+		with self._lock:
+			self._counts.clear()
+			self._overheads.clear()
+			self.hits = 0
+			self.misses = 0
+	
+	def __len__(self):
+		return len(self._counts)
+
+TokenCountCache()
\ No newline at end of file
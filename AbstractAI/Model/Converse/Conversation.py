@@ -43,6 +43,10 @@ class Conversation:
 		self.new_message_sequence()
 		self.message_sequence.add_message(message)
 	
+	def add_messages(self, messages:List[Message]):
+		self.new_message_sequence()
+		self.message_sequence.add_messages(messages)
+	
 	def insert_message(self, message:Message, index:int):
 		self.new_message_sequence()
 		self.message_sequence.insert_message(message, index)
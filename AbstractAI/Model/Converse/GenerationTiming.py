@@ -0,0 +1,49 @@
+from AbstractAI.Model.Decorator import *
+from datetime import datetime
+from copy import deepcopy
+from typing import List
+
+@DATA
+@dataclass
+class GenerationTiming:
+	'''
+	How long a model took to produce a message, kept with its ModelSource
+	so that latency can be compared across models and over time.
+	
+	Times are in seconds. Inter token latencies are the gaps between
+	the stream growing, so they're per chunk for models that send
+	several tokens at once, and are None if it never streamed.
+	'''
+	model_class:str = None
+	model_name:str = None
+	start_time:datetime = field(default_factory=get_local_time)
+	
+	time_to_first_token:float = None
+	inter_token_p50:float = None
+	inter_token_p90:float = None
+	inter_token_p99:float = None
+	# Output tokens per second after the first:
+	tokens_per_second:float = None
+	total_seconds:float = None
+	
+	out_token_count:int = 0
+	chunk_count:int = 0
+	
+	@staticmethod
+	def query(engine:"DATAEngine", model_name:str=None, since:datetime=None, until:datetime=None) -> List["GenerationTiming"]:
+		'''
+		Every timing in engine's database for model_name (the user's name
+		for the model, or its class where unnamed), started in [since, until).
+		
+		since and until are compared with the local times the timings
+		were started at.
+		'''
+		with engine.session() as session:
+			query = session.query(GenerationTiming)
+			if model_name is not None:
+				query = query.filter(GenerationTiming.model_name == model_name)
+			if since is not None:
+				query = query.filter(GenerationTiming.start_time__DateTimeObj >= since.replace(tzinfo=None))
+			if until is not None:
+				query = query.filter(GenerationTiming.start_time__DateTimeObj < until.replace(tzinfo=None))
+			return deepcopy(query.order_by(GenerationTiming.start_time__DateTimeObj).all())
\ No newline at end of file
@@ -17,6 +17,17 @@ class MessageSequence:
 			self.conversation.message_added(message)
 			self.conversation.conversation_changed()
 	
+	def add_messages(self, messages: List[Message]):
+		'''Adds messages in order, changing the id once for all of them.'''
+		for message in messages:
+			self._add_message(message)
+		self.new_id()
+		
+		if self.conversation is not None:
+			for message in messages:
+				self.conversation.message_added(message)
+			self.conversation.conversation_changed()
+	
 	def insert_message(self, message: Message, index:int):
 		message.conversation = self.conversation
 		
@@ -1,6 +1,8 @@
 from .MessageSource import MessageSource
 from AbstractAI.Model.Decorator import *
 from AbstractAI.Model.Converse.ModelInfo import *
+from AbstractAI.Model.Converse.GenerationTiming import GenerationTiming
+from AbstractAI.Model.Converse.PromptBlock import PromptBlock
 from AbstractAI.Model.Converse.MessageSequence import MessageSequence
 from typing import Dict, Any, List, Union
 
@@ -11,12 +13,42 @@ class ModelSource(MessageSource):
 	model_class: str = None
 	settings:"LLMSettings" = None
 	message_sequence: MessageSequence = None
+	# The whole prompt for sources saved before prompt_block, or that
+	# haven't been split into blocks. Read either through full_prompt:
 	prompt: str = None
+	prompt_block: PromptBlock = None
 	start_str: str = ""
 	model_info:ModelInfo=None #This is a legacy field that is no longer used, here only to support legacy database entries and can be removed completely and safely for new users
 
 	serialized_raw_output: Dict[str,Any] = field(default_factory=dict, compare=False)
 	
+	# Messages before this in message_sequence, other than system
+	# messages, were left out of the prompt to fit the context window:
+	context_start_index: int = 0
+	
 	in_token_count: int = -1
 	out_token_count: int = 0
-	finished: bool = False
\ No newline at end of file
+	finished: bool = False
+	
+	# How long generating this took, filled in once it's done:
+	timing: GenerationTiming = None
+	
+	def full_prompt(self) -> str:
+		'''The prompt this was generated from, rebuilt from its blocks if need be.'''
+		if self.prompt is not None or self.prompt_block is None:
+			return self.prompt
+		if getattr(self, "_prompt_text", None) is None:
+			self._prompt_text = self.prompt_block.full_text()
+		return self._prompt_text
+	
+	def store_prompt(self, prompt:str, previous:"ModelSource"=None):
+		'''
+		Stores prompt as blocks, sharing whatever it starts with from
+		previous's prompt, rather than as a whole string.
+		'''
+		if previous is not None and previous.prompt_block is not None:
+			self.prompt_block = PromptBlock.store(prompt, previous.prompt_block, previous.full_prompt())
+		else:
+			self.prompt_block = PromptBlock.store(prompt)
+		self._prompt_text = prompt
+		self.prompt = None
\ No newline at end of file
@@ -0,0 +1,67 @@
+from AbstractAI.Model.Decorator import *
+from AbstractAI.Helpers.shared_prefix_length import shared_prefix_length
+from typing import List, Optional
+
+@DATA(generated_id_type=ID_Type.HASHID, hashed_fields=["text", "previous"])
+@dataclass
+class PromptBlock:
+	'''
+	A piece of a prompt that follows the blocks before it.
+	
+	Blocks are identified by their text and everything before them, so
+	prompts that start the same way share the blocks for that start
+	rather than each storing it again. A conversation's prompts usually
+	start with the one before them, so each new prompt only adds the
+	blocks for what it appended.
+	
+	Only full blocks are shared, so every block but the last in a chain
+	is full and chains stay as short as their text allows, however many
+	prompts they were built up over.
+	'''
+	text:str = ""
+	previous:"PromptBlock" = None
+	# Length of the whole prompt up to the end of this block:
+	length:int = 0
+	
+	# Longest text a block holds. When a prompt only shares part of a
+	# block with the one before it, or all of one that isn't full, that
+	# part is stored again, so this bounds how much is repeated:
+	max_text_length = 4096
+	
+	def chain(self) -> List["PromptBlock"]:
+		'''Every block up to and including this one, from the first.'''
+		blocks = []
+		block = self
+		while block is not None:
+			blocks.append(block)
+			block = block.previous
+		blocks.reverse()
+		return blocks
+	
+	def full_text(self) -> str:
+		return "".join(block.text for block in self.chain())
+	
+	@staticmethod
+	def store(text:str, previous_prompt:"PromptBlock"=None, previous_text:Optional[str]=None) -> "PromptBlock":
+		'''
+		The last block of a chain holding text, reusing as many of
+		previous_prompt's full blocks as text starts with. previous_text
+		saves rebuilding previous_prompt's text where it's already known.
+		'''
+		block = None
+		offset = 0
+		if previous_prompt is not None:
+			if previous_text is None:
+				previous_text = previous_prompt.full_text()
+			shared = shared_prefix_length(text, previous_text)
+			for candidate in previous_prompt.chain():
+				# Chains stored before blocks had to be full are rebuilt from their first short one:
+				if candidate.length > shared or len(candidate.text) < PromptBlock.max_text_length:
+					break
+				block, offset = candidate, candidate.length
+		
+		while offset < len(text) or block is None:
+			piece = text[offset:offset + PromptBlock.max_text_length]
+			offset += len(piece)
+			block = PromptBlock(piece, block, offset)
+		return block
\ No newline at end of file
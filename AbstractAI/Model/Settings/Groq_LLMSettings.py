@@ -9,6 +9,14 @@ class Groq_LLMSettings(LLMSettings):
 	api_key:str = ""
 	base_url:str = ""
 	
+	# Tokens the model can attend to, prompt and response together.
+	# Older messages are left out of prompts that won't fit, 0 to never:
+	context_size:int = 0
+	
+	# Limits to hold requests to, 0 for no limit:
+	requests_per_minute:int = 0
+	tokens_per_minute:int = 0
+	
 	def load(self):
 		from AbstractAI.LLMs.Groq_LLM import Groq_LLM
 		return Groq_LLM(self.copy())
\ No newline at end of file
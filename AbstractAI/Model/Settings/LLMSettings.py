@@ -4,7 +4,10 @@ from AbstractAI.LLMs.CommonRoles import CommonRoles
 from dataclasses import field
 from copy import deepcopy
 from typing import List
-from typing import Dict
+from typing import Dict, Type
+
+# Every subclass of LLMSettings by its UI name, filled in as each is defined:
+_settings_types:Dict[str,Type["LLMSettings"]] = {}
 
 @DATA(generated_id_type=ID_Type.HASHID)
 @dataclass
@@ -24,7 +27,16 @@ class LLMSettings:
 	user_description:str = field(default="", kw_only=True)
 	roles:RolesSettings = field(default_factory=RolesSettings, kw_only=True)
 	
+	def __init_subclass__(cls, **kwargs):
+		super().__init_subclass__(**kwargs)
+		_settings_types[cls.ui_name()] = cls
+	
 	def load(self) -> "LLM":
+		'''
+		Creates the model these settings describe. Subclasses import their
+		backend here rather than at module level, so that listing and
+		editing settings never pulls in torch, openai or the like.
+		'''
 		raise NotImplementedError("Subclasses must implement this method.")
 	
 	@classmethod
@@ -42,25 +54,14 @@ class LLMSettings:
 		keys and the subclassed types as values.
 		'''
 		import importlib
-		import inspect
 		import os
-
-		# Get a list of all Python files in the directory of this class
-		files = []
-		for root, dirs, filenames in os.walk(os.path.dirname(__file__)):
-			for filename in filenames:
-				if filename.endswith('.py'):
-					files.append(filename[:-3])  # Remove .py extension
-
-		classes = {}
-		for file in files:
-			module_name = '.' + file
-			module = importlib.import_module(module_name, package=__package__)
-			for name, obj in inspect.getmembers(module, inspect.isclass):
-				if issubclass(obj, LLMSettings) and obj != LLMSettings:
-					classes[obj.ui_name()] = obj
-
-		return classes
+		
+		# Importing each settings module registers its classes:
+		for filename in sorted(os.listdir(os.path.dirname(__file__))):
+			if filename.endswith('.py') and filename != '__init__.py':
+				importlib.import_module('.' + filename[:-3], package=__package__)
+		
+		return dict(_settings_types)
 	
 	def copy(self) -> "LLMSettings":
 		'''
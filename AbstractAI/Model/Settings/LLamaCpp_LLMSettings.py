@@ -17,6 +17,15 @@ class LLamaCpp_LLMInitSettings:
 	chat_format:str = None
 	flash_attn:bool = False
 	verbose:bool = False
+	
+	# RAM budget for saved model states, used to skip re-evaluating
+	# prompt prefixes we've seen before. Least recently used states are
+	# evicted first. 0 disables the cache:
+	prefix_cache_mb:int = 0
+	
+	# How many chats can generate at once, each with n_ctx tokens of its
+	# own, by batching their decode steps together. 1 serves one at a time:
+	parallel_slots:int = 1
 
 @DATA(generated_id_type=ID_Type.HASHID)
 @dataclass
@@ -37,7 +46,7 @@ class LLamaCpp_LLMGenerateSettings:
 	mirostat_mode: int = 0
 	mirostat_tau: float = 5.0
 	mirostat_eta: float = 0.1
-	
+
 @DATA(generated_id_type=ID_Type.HASHID)
 @dataclass
 class LLamaCpp_LLMSettings(LLMSettings):
@@ -5,6 +5,16 @@ from .LLMSettings import *
 class Ollama_LLMSettings(LLMSettings):
 	__ui_name__ = "Ollama"
 	model_name:str = ""
+	
+	# Most tokens the server generates when a request doesn't give
+	# max_tokens. -1 lets it generate until the model stops:
+	num_predict:int = -1
+	# Context window the server loads the model with. 0 uses its default:
+	num_ctx:int = 0
+	# How long the server keeps the model loaded after each request, like
+	# "10m" or "1h". "-1" keeps it loaded, empty uses the server's default:
+	keep_alive:str = ""
+	
 	def load(self):
 		from AbstractAI.LLMs.Ollama_LLM import Ollama_LLM
 		return Ollama_LLM(self.copy())
\ No newline at end of file
@@ -10,7 +10,18 @@ class OpenAI_LLMSettings(LLMSettings):
 	base_url:str = ""
 	organization: str = ""
 	
-	temperature: float = 0.2
+	# Sampling temperature sent with each request. Negative leaves it
+	# to the server's default:
+	temperature: float = -1
+	
+	# Tokens the model can attend to, prompt and response together.
+	# Older messages are left out of prompts that won't fit, 0 to never:
+	context_size:int = 0
+	
+	# Limits to hold requests to, 0 for no limit:
+	requests_per_minute:int = 0
+	tokens_per_minute:int = 0
+	
 	def load(self):
 		from AbstractAI.LLMs.OpenAI_LLM import OpenAI_LLM
 		return OpenAI_LLM(self.copy())
\ No newline at end of file
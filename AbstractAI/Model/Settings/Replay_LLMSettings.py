@@ -0,0 +1,23 @@
+from .LLMSettings import *
+
+@DATA(generated_id_type=ID_Type.HASHID)
+@dataclass
+class Replay_LLMSettings(LLMSettings):
+	'''
+	Re-streams a message a model already generated, with the timing it
+	was originally streamed at, to reproduce real traffic exactly.
+	'''
+	__ui_name__ = "Replay"
+	
+	# The message to replay, and the database to find it in:
+	message_id:str = ""
+	storage_location:str = ""
+	
+	# Multiplies the original pace. 0 or less sends every chunk at once:
+	speed:float = 1.0
+	# Pace for chunks logged without times, when the message wasn't timed either:
+	chunks_per_second:float = 30
+	
+	def load(self):
+		from AbstractAI.LLMs.Replay_LLM import Replay_LLM
+		return Replay_LLM(self.copy())
\ No newline at end of file
@@ -0,0 +1,30 @@
+from .LLMSettings import *
+
+@DATA(generated_id_type=ID_Type.HASHID)
+@dataclass
+class Synthetic_LLMSettings(LLMSettings):
+	'''
+	A stand in model that streams made up text at a controlled pace,
+	for measuring everything around a model without running one.
+	'''
+	__ui_name__ = "Synthetic"
+	
+	# Seconds before the first chunk arrives:
+	time_to_first_token:float = 0.2
+	tokens_per_second:float = 50
+	# Tokens (words) sent in each chunk:
+	chunk_tokens:int = 1
+	# Each delay is randomly scaled by up to this fraction either way:
+	jitter:float = 0.1
+	# Chance that a request fails partway through:
+	failure_rate:float = 0.0
+	
+	# Tokens in an answer when max_tokens isn't given:
+	response_tokens:int = 200
+	context_size:int = 4096
+	# Seeds the made up text and timing. 0 for different runs each load:
+	seed:int = 0
+	
+	def load(self):
+		from AbstractAI.LLMs.Synthetic_LLM import Synthetic_LLM
+		return Synthetic_LLM(self.copy())
\ No newline at end of file
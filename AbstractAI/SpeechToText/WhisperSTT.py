@@ -1,11 +1,10 @@
 
-import whisper
 from AbstractAI.Helpers.Stopwatch import Stopwatch
-import torch
 from .SpeechToText import SpeechToText
-from typing import List
-from pydub import AudioSegment
-import numpy as np
+from typing import List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+	from pydub import AudioSegment
 
 class WhisperSTT(SpeechToText):
 	def __init__(self, model_name: str=None):
@@ -19,11 +18,14 @@ class WhisperSTT(SpeechToText):
 		self.model = None
 
 		# Load the Whisper model
+		import whisper
 		Stopwatch.singleton.start("Loading Whisper model", f" {self.model_name}")
 		self.model = whisper.load_model(self.model_name)
 		Stopwatch.singleton.stop("Loading Whisper model")
 	
-	def transcribe(self, audio:AudioSegment) -> dict:
+	def transcribe(self, audio:"AudioSegment") -> dict:
+		import numpy as np
+		import torch
 		Stopwatch.singleton.start("Transcribing")
 
 		# Convert to the expected format:
@@ -40,7 +42,7 @@ class WhisperSTT(SpeechToText):
 		
 		return result
 	
-	def transcribe_str(self, audio:AudioSegment) -> str:
+	def transcribe_str(self, audio:"AudioSegment") -> str:
 		return self.transcribe(audio)['text']
 	
 	@classmethod
@@ -1,8 +1,11 @@
 from AbstractAI.Helpers.Stopwatch import Stopwatch
 from abc import ABC, abstractmethod
-from pydub import AudioSegment
+from typing import TYPE_CHECKING
 import re
 
+if TYPE_CHECKING:
+	from pydub import AudioSegment
+
 class TextToSpeech(ABC):
 	def __init__(self):
 		import torch
@@ -10,7 +13,7 @@ class TextToSpeech(ABC):
 		self.sw = Stopwatch()
 
 	@abstractmethod
-	def text_to_speech(self, text:str) -> AudioSegment:
+	def text_to_speech(self, text:str) -> "AudioSegment":
 		pass
 	
 	@staticmethod
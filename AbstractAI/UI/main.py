@@ -21,6 +21,7 @@ from AbstractAI.Model.Settings.LLMSettings import *
 llm_settings_types = LLMSettings.load_subclasses()
 
 from AbstractAI.LLMs.LLM import LLM
+from AbstractAI.LLMs.ResidentModels import ResidentModels
 
 Stopwatch("DATAEngine", log_statistics=False)
 from ClassyFlaskDB.DATA import DATAEngine
@@ -51,6 +52,7 @@ class Application(QMainWindow):
 	def __init__(self):
 		super().__init__()
 		self.llm : LLM = None
+		ResidentModels.singleton.ram_budget_mb = Context.args.resident_models_ram_budget_mb
 		
 		Stopwatch.new_scope()
 		self.setWindowTitle("AbstractAI")
@@ -442,8 +444,7 @@ class Application(QMainWindow):
 		
 		def load_model():
 			try:
-				self.llm = model.load()
-				self.llm.start()
+				self.llm = ResidentModels.singleton.get(model)
 				return True
 			except Exception as e:
 				print(f"Error loading model '{model.user_model_name}' with exception: {e}")
@@ -503,8 +504,15 @@ if __name__ == "__main__":
 		help='Path to SQLite database file (default: %(default)s)'
 	)
 	
+	parser.add_argument(
+		'--resident_models_ram_budget_mb', type=int,
+		default=Context.settings.value("main/resident_models_ram_budget_mb", 0, type=int),
+		help='RAM to keep recently used models loaded in, so switching back to them is instant. 0 keeps only the selected model (default: %(default)s)'
+	)
+	
 	Context.args = parser.parse_args()
 	Context.settings.setValue("main/storage_location", Context.args.storage_location)
+	Context.settings.setValue("main/resident_models_ram_budget_mb", Context.args.resident_models_ram_budget_mb)
 	
 	# new model loading code:
 	Stopwatch("Load window", log_statistics=False)
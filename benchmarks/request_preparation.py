@@ -0,0 +1,193 @@
+'''
+Times the work a chat request does before it reaches a model: rendering
+the conversation, building the prompt and counting its tokens, resolving
+roles through edit chains and picking generate arguments from settings.
+
+Conversations of each size are made up, with branches and chains of
+edits, ending in a message each model generated so that its prompt is
+stored as it is in a chat. Every template is given the same fake
+tokenizer so that only our own code is measured.
+	
+	python benchmarks/request_preparation.py                  # compare to the baseline
+	python benchmarks/request_preparation.py --save-baseline  # record a new one
+
+Exits with 1 if any step got slower than its baseline by more than
+--threshold (a fraction, 0.25 by default).
+'''
+from AbstractAI.Model.Converse import *
+from AbstractAI.LLMs.LLM import LLM
+from AbstractAI.LLMs.CommonRoles import CommonRoles
+from AbstractAI.LLMs.TokenCountCache import TokenCountCache
+from AbstractAI.LLMs.Synthetic_LLM import Synthetic_LLM
+from AbstractAI.Helpers.func_to_model import kwargs_from_instance
+from AbstractAI.Model.Settings.LLMSettings import LLMSettings
+from AbstractAI.Model.Settings.Synthetic_LLMSettings import Synthetic_LLMSettings
+from AbstractAI.Model.Settings.LLamaCpp_LLMSettings import LLamaCpp_LLMSettings, LLamaCpp_LLMGenerateSettings
+
+from typing import Callable, Dict, List
+from dataclasses import fields
+import argparse
+import inspect
+import json
+import os
+import random
+import sys
+import time
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "request_preparation.json")
+
+WORDS = "the of and to in is that for it as with was on be by this are at from or an model token stream message".split()
+
+def fake_count_tokens(text:str) -> int:
+	'''About what a BPE tokenizer gives for English, without the cost of one.'''
+	return (len(text) + 3) // 4
+
+def build_conversation(length:int, llm:LLM, branch_every:int=50, edit_every:int=10, edit_depth:int=5, seed:int=0) -> Conversation:
+	'''
+	A conversation of length messages alternating between a user and a
+	model after a system message, the last of which llm generates.
+	Every edit_every'th message is the end of a chain of edit_depth
+	edits, and every branch_every messages the sequence so far is left
+	behind as an alternate.
+	'''
+	rng = random.Random(seed)
+	text = lambda: " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 60)))
+	
+	# User sources are shared, as they are in a chat, since making each one looks up its caller:
+	user_source = UserSource()
+	
+	conversation = Conversation()
+	branch = []
+	for i in range(length - 1):
+		if i == 0:
+			source = SystemSource()
+		else:
+			source = user_source if i % 2 == 1 else ModelSource(model_class="Synthetic_LLM", caller_source=None)
+		message = Message(text(), source)
+		if edit_every > 0 and i % edit_every == edit_every - 1:
+			for _ in range(edit_depth):
+				message = Message(text(), EditSource(message, user_source, caller_source=None))
+		branch.append(message)
+		
+		if branch_every > 0 and i % branch_every == branch_every - 1:
+			conversation.add_messages(branch)
+			branch = []
+	conversation.add_messages(branch)
+	
+	# Generated like a chat does, so its prompt is stored in blocks for the next to share:
+	message, _ = llm._new_message(conversation, auto_append=True)
+	message.content = text()
+	message.source.generating = False
+	return conversation
+
+class JSONFallbackLLM(LLM):
+	'''Has no chat template, like Ollama, so prompts fall back to JSON.'''
+	def count_tokens(self, text:str) -> int:
+		return fake_count_tokens(text)
+
+class FakeTokenizerSynthetic_LLM(Synthetic_LLM):
+	def count_tokens(self, text:str) -> int:
+		return fake_count_tokens(text)
+
+def template_llms() -> Dict[str, LLM]:
+	llms = {
+		"json_fallback":JSONFallbackLLM(LLMSettings()),
+		"synthetic":FakeTokenizerSynthetic_LLM(Synthetic_LLMSettings())
+	}
+	try:
+		from AbstractAI.LLMs.LLamaCPP_LLM import LLamaCPP_LLM
+		class FakeTokenizerLLamaCPP_LLM(LLamaCPP_LLM):
+			def count_tokens(self, text:str) -> int:
+				return fake_count_tokens(text)
+		llms["llamacpp"] = FakeTokenizerLLamaCPP_LLM(LLamaCpp_LLMSettings())
+	except ImportError:
+		print("llama_cpp is not installed, skipping its template.", file=sys.stderr)
+	return llms
+
+def best_time(step:Callable[[], None], repeats:int, setup:Callable[[], None]=None) -> float:
+	'''The fastest of repeats runs of step in seconds, calling setup untimed before each.'''
+	best = float("inf")
+	for _ in range(repeats):
+		if setup is not None:
+			setup()
+		start = time.perf_counter()
+		step()
+		best = min(best, time.perf_counter() - start)
+	return best
+
+def create_completion() -> Callable:
+	'''
+	llama_cpp's create_completion, whose arguments we pick from settings,
+	or where it's not installed a stand in taking every generate setting.
+	'''
+	try:
+		from llama_cpp import Llama
+		return Llama.create_completion
+	except ImportError:
+		def stand_in(prompt:str, **kwargs):
+			pass
+		parameters = [inspect.Parameter("prompt", inspect.Parameter.POSITIONAL_OR_KEYWORD)]
+		parameters += [inspect.Parameter(f.name, inspect.Parameter.KEYWORD_ONLY) for f in fields(LLamaCpp_LLMGenerateSettings)]
+		stand_in.__signature__ = inspect.Signature(parameters)
+		return stand_in
+
+def run(sizes:List[int], repeats:int) -> Dict[str, float]:
+	results = {}
+	def record(name:str, seconds:float):
+		results[name] = seconds
+		print(f"{name:<52} {seconds*1000:>12.3f}ms")
+	
+	generate_settings = LLamaCpp_LLMGenerateSettings()
+	completion_function = create_completion()
+	record("kwargs_from_instance", best_time(lambda: kwargs_from_instance(completion_function, generate_settings, {"max_tokens":100}), repeats * 100))
+	
+	llms = template_llms()
+	for size in sizes:
+		messages = build_conversation(size, llms["synthetic"]).message_sequence.messages
+		record(f"from_source/{size}", best_time(lambda: [CommonRoles.from_source(m.source) for m in messages], repeats))
+		
+		for template, llm in llms.items():
+			conversation = build_conversation(size, llm)
+			def cold():
+				llm._chat_render_cache.clear()
+				TokenCountCache.singleton.clear()
+			
+			record(f"{template}/conversation_to_list/cold/{size}", best_time(lambda: llm.conversation_to_list(conversation), repeats, cold))
+			record(f"{template}/conversation_to_list/warm/{size}", best_time(lambda: llm.conversation_to_list(conversation), repeats))
+			record(f"{template}/_new_message/cold/{size}", best_time(lambda: llm._new_message(conversation, "Sure,", llm.start_request_prompt), repeats, cold))
+			record(f"{template}/_new_message/warm/{size}", best_time(lambda: llm._new_message(conversation, "Sure,", llm.start_request_prompt), repeats))
+	return results
+
+def compare(results:Dict[str, float], baseline:Dict[str, float], threshold:float) -> List[str]:
+	'''The names of the steps that took more than threshold longer than their baseline.'''
+	regressions = []
+	for name, seconds in results.items():
+		if name in baseline and baseline[name] > 0 and seconds > baseline[name] * (1 + threshold):
+			regressions.append(name)
+			print(f"REGRESSION {name}: {baseline[name]*1000:.3f}ms -> {seconds*1000:.3f}ms ({seconds/baseline[name]:.2f}x)")
+	return regressions
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Benchmarks the work done preparing a chat request.")
+	parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000], help="Conversation lengths to measure (default: %(default)s)")
+	parser.add_argument("--repeats", type=int, default=5, help="Runs of each step, the fastest of which is kept (default: %(default)s)")
+	parser.add_argument("--threshold", type=float, default=0.25, help="Slowdown over the baseline, as a fraction, that counts as a regression (default: %(default)s)")
+	parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file to compare with or save to (default: %(default)s)")
+	parser.add_argument("--save-baseline", action="store_true", help="Save these results as the baseline instead of comparing with it")
+	args = parser.parse_args()
+	
+	results = run(args.sizes, args.repeats)
+	
+	if args.save_baseline:
+		os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+		with open(args.baseline, "w") as file:
+			json.dump(results, file, indent=4, sort_keys=True)
+		print(f"Saved baseline to {args.baseline}")
+	elif os.path.exists(args.baseline):
+		with open(args.baseline) as file:
+			baseline = json.load(file)
+		if len(compare(results, baseline, args.threshold)) > 0:
+			sys.exit(1)
+		print(f"No step slower than {args.baseline} by more than {args.threshold:.0%}")
+	else:
+		print(f"No baseline at {args.baseline}, run with --save-baseline to record one.")
\ No newline at end of file
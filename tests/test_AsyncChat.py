@@ -0,0 +1,135 @@
+import unittest
+import asyncio
+from threading import Event
+from AbstractAI.Model.Converse import *
+from AbstractAI.LLMs.LLM import LLM, LLM_Response
+from AbstractAI.Model.Settings.LLMSettings import LLMSettings
+
+class StreamingLLM(LLM):
+	'''Streams chunks one at a time, waiting delay seconds before each.'''
+	def __init__(self, chunks, delay:float=0):
+		super().__init__(LLMSettings())
+		self.chunks = chunks
+		self.delay = delay
+		self.stop_requested = Event()
+		self.generated = 0
+	
+	def _chat(self, conversation:Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False):
+		wip_message, _ = self._new_message(conversation, start_str, auto_append=auto_append, max_tokens=max_tokens)
+		response = LLM_Response(wip_message, self.stop_requested.set)
+		if stream:
+			yield response
+		for chunk in self.chunks:
+			if self.stop_requested.wait(self.delay):
+				break
+			response.message.append(chunk)
+			self.generated += 1
+			if stream:
+				yield response
+		response.source.finished = not self.stop_requested.is_set()
+		response.finish()
+		return response
+
+class NativeAsyncLLM(StreamingLLM):
+	'''Streams from its own coroutine rather than a worker thread.'''
+	async def _achat(self, conversation:Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False):
+		wip_message, _ = self._new_message(conversation, start_str, auto_append=auto_append, max_tokens=max_tokens)
+		response = LLM_Response(wip_message, None)
+		for chunk in self.chunks:
+			await asyncio.sleep(self.delay)
+			response.message.append(chunk)
+			if stream:
+				yield response
+		response.finish()
+		if not stream:
+			yield response
+
+def conversation() -> Conversation:
+	conv = Conversation()
+	conv.add_message(Message("Hello?", UserSource()))
+	return conv
+
+async def contents(llm:LLM, stream:bool):
+	return [response.message.content async for response in llm.achat(conversation(), stream=stream)]
+
+class TestAsyncChat(unittest.TestCase):
+	def test_stream_yields_each_chunk_in_order(self):
+		llm = StreamingLLM(["Hel", "lo", "!"])
+		self.assertEqual(asyncio.run(contents(llm, True)), ["", "Hel", "Hello", "Hello!"])
+	
+	def test_not_streamed_yields_only_the_finished_response(self):
+		llm = StreamingLLM(["Hel", "lo", "!"])
+		async def responses():
+			return [response async for response in llm.achat(conversation())]
+		responses = asyncio.run(responses())
+		self.assertEqual(len(responses), 1)
+		self.assertEqual(responses[0].message.content, "Hello!")
+		self.assertTrue(responses[0].source.finished)
+		self.assertFalse(responses[0].source.generating)
+	
+	def test_concurrent_chats_keep_their_own_order(self):
+		words = [f" {i}" for i in range(10)]
+		letters = [f" {c}" for c in "abcdefghij"]
+		numbers_llm, letters_llm = StreamingLLM(words, delay=0.001), StreamingLLM(letters, delay=0.001)
+		async def both():
+			return await asyncio.gather(contents(numbers_llm, True), contents(letters_llm, True))
+		numbers, letters_seen = asyncio.run(both())
+		self.assertEqual(numbers[-1], "".join(words))
+		self.assertEqual(letters_seen[-1], "".join(letters))
+		for seen in [numbers, letters_seen]:
+			for before, after in zip(seen, seen[1:]):
+				self.assertTrue(after.startswith(before))
+	
+	def test_cancelling_stops_the_model(self):
+		llm = StreamingLLM([f" {i}" for i in range(1000)], delay=0.01)
+		async def cancel_after_first_chunk():
+			first_chunk = asyncio.Event()
+			async def consume():
+				async for response in llm.achat(conversation(), stream=True):
+					if len(response.message.content) > 0:
+						first_chunk.set()
+			task = asyncio.create_task(consume())
+			await first_chunk.wait()
+			task.cancel()
+			with self.assertRaises(asyncio.CancelledError):
+				await task
+		asyncio.run(cancel_after_first_chunk())
+		self.assertTrue(llm.stop_requested.wait(1))
+		self.assertLess(llm.generated, 1000)
+	
+	def test_native_async_models_are_timed(self):
+		llm = NativeAsyncLLM(["Hel", "lo", "!"], delay=0.001)
+		async def last_response():
+			async for response in llm.achat(conversation(), stream=True):
+				pass
+			return response
+		response = asyncio.run(last_response())
+		self.assertEqual(response.message.content, "Hello!")
+		self.assertEqual(response.source.timing.chunk_count, 3)
+	
+	def test_uncached_chat_only_renders_for_the_prompt(self):
+		llm = StreamingLLM(["Hi"])
+		renders = []
+		render = llm._render_conversation
+		llm._render_conversation = lambda conversation: renders.append(conversation) or render(conversation)
+		llm.chat(conversation())
+		self.assertEqual(len(renders), 1)
+		asyncio.run(contents(llm, False))
+		self.assertEqual(len(renders), 2)
+	
+	def test_requests_are_in_flight_until_done(self):
+		llm = StreamingLLM(["Hel", "lo"])
+		responses = llm.chat(conversation(), stream=True)
+		next(responses)
+		self.assertEqual(llm.in_flight, 1)
+		list(responses)
+		self.assertEqual(llm.in_flight, 0)
+		
+		async def check_in_flight():
+			async for response in llm.achat(conversation(), stream=True):
+				self.assertGreater(llm.in_flight, 0)
+		asyncio.run(check_in_flight())
+		self.assertEqual(llm.in_flight, 0)
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
@@ -0,0 +1,91 @@
+import unittest
+from threading import Event
+from AbstractAI.Model.Converse import *
+from AbstractAI.LLMs.LLM import LLM, LLM_Response
+from AbstractAI.Model.Settings.LLMSettings import LLMSettings
+from AbstractAI.ChatBot import ChatBot
+
+class HedgedLLM(LLM):
+	'''
+	Waits first_token_delay seconds before streaming its chunks, raising
+	error after fail_after of them if it's set. Calls after the first
+	answer straight away without failing.
+	'''
+	def __init__(self, name:str, chunks, first_token_delay:float=0, error:Exception=None, fail_after:int=0):
+		super().__init__(LLMSettings(user_model_name=name))
+		self.chunks = chunks
+		self.first_token_delay = first_token_delay
+		self.error = error
+		self.fail_after = fail_after
+		self.calls = 0
+		self.stop_requests = []
+	
+	def _chat(self, conversation:Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False):
+		self.calls += 1
+		first_call = self.calls == 1
+		stop_requested = Event()
+		self.stop_requests.append(stop_requested)
+		
+		wip_message, _ = self._new_message(conversation, start_str, auto_append=auto_append, max_tokens=max_tokens)
+		response = LLM_Response(wip_message, stop_requested.set)
+		yield response
+		if stop_requested.wait(self.first_token_delay if first_call else 0):
+			response.finish()
+			return response
+		for i, chunk in enumerate(self.chunks):
+			if first_call and self.error is not None and i == self.fail_after:
+				raise self.error
+			response.message.append(chunk)
+			yield response
+		response.source.finished = True
+		response.finish()
+		return response
+
+def chat_bot(model:LLM, fallback_model:LLM, hedge_delay:float=0.05) -> ChatBot:
+	return ChatBot(model, None, Conversation(), fallback_model=fallback_model, hedge_delay=hedge_delay)
+
+class TestHedgedChat(unittest.TestCase):
+	def test_fast_primary_wins_without_asking_fallback(self):
+		primary, fallback = HedgedLLM("primary", ["Hi"]), HedgedLLM("fallback", ["Hello"])
+		bot = chat_bot(primary, fallback, hedge_delay=5)
+		self.assertEqual(bot.prompt("Hello?"), "Hi")
+		self.assertEqual(fallback.calls, 0)
+		hedge = bot.last_response.source.serialized_raw_output["Hedge"]
+		self.assertEqual(hedge["winner"], "primary")
+		self.assertIsNone(hedge["fallback"])
+	
+	def test_fallback_wins_when_primary_is_slow(self):
+		primary, fallback = HedgedLLM("primary", ["Hi"], first_token_delay=5), HedgedLLM("fallback", ["Hello"])
+		bot = chat_bot(primary, fallback)
+		self.assertEqual(bot.prompt("Hello?"), "Hello")
+		self.assertEqual(bot.last_response.source.serialized_raw_output["Hedge"]["winner"], "fallback")
+		# The slow primary was stopped rather than left to run:
+		self.assertTrue(primary.stop_requests[0].wait(1))
+		self.assertIs(bot.conversation.message_sequence.messages[-1], bot.last_response.message)
+	
+	def test_primary_failing_before_a_token_uses_fallback(self):
+		primary = HedgedLLM("primary", ["Hi"], error=ConnectionError(), fail_after=0)
+		fallback = HedgedLLM("fallback", ["Hello"])
+		bot = chat_bot(primary, fallback, hedge_delay=5)
+		self.assertEqual(bot.prompt("Hello?"), "Hello")
+		self.assertEqual(bot.last_response.source.serialized_raw_output["Hedge"]["winner"], "fallback")
+	
+	def test_winner_failing_after_its_first_token_asks_the_other_again(self):
+		primary = HedgedLLM("primary", ["Hi", " there"], first_token_delay=5)
+		fallback = HedgedLLM("fallback", ["Hel", "lo"], error=ConnectionError(), fail_after=1)
+		bot = chat_bot(primary, fallback)
+		self.assertEqual(bot.prompt("Hello?"), "Hi there")
+		self.assertEqual(primary.calls, 2)
+		hedge = bot.last_response.source.serialized_raw_output["Hedge"]
+		self.assertEqual(hedge["winner"], "primary")
+		self.assertIn("ConnectionError", hedge["failed"]["error"])
+	
+	def test_both_failing_returns_none(self):
+		primary = HedgedLLM("primary", ["Hi", " there"], error=ConnectionError(), fail_after=1)
+		fallback = HedgedLLM("fallback", ["Hello"], error=ConnectionError(), fail_after=0)
+		bot = chat_bot(primary, fallback, hedge_delay=5)
+		self.assertIsNone(bot.prompt("Hello?"))
+		self.assertEqual((primary.calls, fallback.calls), (1, 1))
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
@@ -0,0 +1,148 @@
+import unittest
+from copy import deepcopy
+from AbstractAI.Model.Converse import *
+from AbstractAI.LLMs.ChatRenderCache import ChatRenderCache
+from AbstractAI.LLMs.LLM import LLM
+from AbstractAI.Model.Settings.LLMSettings import LLMSettings
+import json
+
+class SegmentedLLM(LLM):
+	def _chat_template_segment(self, entry, index):
+		return f"<{entry['role']}> {entry['content']}\n"
+	
+	def _chat_template_end(self, start_str=""):
+		return "<assistant> " + start_str
+	
+	def count_tokens(self, text:str) -> int:
+		return len(text.split())
+	
+	def tokenizer_id(self) -> str:
+		return "test:segmented words"
+
+def render_fresh(messages, must_alternate:bool):
+	return ChatRenderCache().render(messages, must_alternate).chat
+
+class TestChatRenderCache(unittest.TestCase):
+	def create_conversation(self, message_count:int) -> Conversation:
+		conv = Conversation()
+		conv.add_message(Message.HardCoded("You are a helpful assistant.", system_message=True))
+		for i in range(message_count):
+			if i % 3 == 2:
+				source = ModelSource()
+			else:
+				source = UserSource()
+			conv.add_message(Message(f"Message {i}", source))
+		return conv
+	
+	def test_append_matches_fresh_render(self):
+		for must_alternate in [False, True]:
+			cache = ChatRenderCache()
+			conv = self.create_conversation(6)
+			cache.render(conv.message_sequence.messages, must_alternate)
+			
+			conv.add_message(Message("Another user message", UserSource()))
+			conv.add_message(Message("And another", UserSource()))
+			rendered = cache.render(conv.message_sequence.messages, must_alternate)
+			self.assertEqual(rendered.chat, render_fresh(conv.message_sequence.messages, must_alternate))
+	
+	def test_branch_reuses_shared_prefix_without_changing_it(self):
+		cache = ChatRenderCache()
+		conv = self.create_conversation(8)
+		original_messages = list(conv.message_sequence.messages)
+		original_chat = deepcopy(cache.render(original_messages, False).chat)
+		
+		edited = original_messages[4].create_edited("An edited message", UserSource())
+		conv.replace_message(original_messages[4], edited)
+		conv.add_message(Message("After the edit", UserSource()))
+		rendered = cache.render(conv.message_sequence.messages, False)
+		self.assertEqual(rendered.chat, render_fresh(conv.message_sequence.messages, False))
+		
+		self.assertEqual(cache.render(original_messages, False).chat, original_chat)
+	
+	def test_identical_sequence_keeps_prompt(self):
+		cache = ChatRenderCache()
+		conv = self.create_conversation(4)
+		rendered = cache.render(conv.message_sequence.messages, False)
+		rendered.prompt_cache = (("", None), "prompt")
+		
+		rendered = cache.render(conv.message_sequence.messages, False)
+		self.assertEqual(rendered.prompt_cache[1], "prompt")
+		
+		conv.add_message(Message("New message", UserSource()))
+		rendered = cache.render(conv.message_sequence.messages, False)
+		self.assertIsNone(rendered.prompt_cache[1])
+	
+	def test_extending_keeps_earlier_views(self):
+		cache = ChatRenderCache()
+		conv = self.create_conversation(4)
+		before = cache.render(conv.message_sequence.messages, False)
+		chat_before = deepcopy(before.chat)
+		
+		conv.add_message(Message("Merged into the last user message", UserSource()))
+		after = cache.render(conv.message_sequence.messages, False)
+		self.assertIs(after.messages, before.messages)
+		self.assertEqual(before.chat, chat_before)
+		self.assertEqual(after.chat, render_fresh(conv.message_sequence.messages, False))
+	
+	def test_prompt_head_only_renders_new_entries(self):
+		cache = ChatRenderCache()
+		conv = self.create_conversation(6)
+		rendered_entries = []
+		def render_segment(entry, index):
+			rendered_entries.append(index)
+			return f"{entry['role']}:{entry['content']}|"
+		
+		rendered = cache.render(conv.message_sequence.messages, False)
+		head = rendered.prompt_head("test", render_segment)
+		chat = rendered.chat
+		self.assertEqual(head, "".join(render_segment(entry, i) for i, entry in enumerate(chat[:-1])))
+		
+		rendered_entries.clear()
+		conv.add_message(Message("A user reply", UserSource()))
+		rendered = cache.render(conv.message_sequence.messages, False)
+		rendered.prompt_head("test", render_segment)
+		self.assertEqual(rendered_entries, [len(chat)-1])
+	
+	def test_prompts_match_rendering_from_scratch(self):
+		for llm, render in [
+			(SegmentedLLM(LLMSettings()), lambda chat, start_str: SegmentedLLM(LLMSettings())._apply_chat_template(chat, start_str)),
+			(LLM(LLMSettings()), lambda chat, start_str: json.dumps(chat))
+		]:
+			conv = self.create_conversation(3)
+			for i in range(4):
+				conv.add_message(Message(f"Turn {i}", UserSource() if i % 2 == 0 else ModelSource()))
+				for start_str in ["", "Sure", "Sure"]:
+					message, chat = llm._new_message(conv, start_str)
+					self.assertEqual(message.source.full_prompt(), render(chat, start_str))
+	
+	def test_conversation_tokens_only_counts_new_messages(self):
+		llm = SegmentedLLM(LLMSettings())
+		counted = []
+		count_message_tokens = llm.count_message_tokens
+		llm.count_message_tokens = lambda message: counted.append(message) or count_message_tokens(message)
+		
+		conv = self.create_conversation(4)
+		message, _ = llm._new_message(conv)
+		self.assertEqual(message.source.in_token_count, len(message.source.full_prompt().split()))
+		self.assertEqual(len(counted), 5)
+		
+		conv.add_message(Message("One more message", UserSource()))
+		message, _ = llm._new_message(conv)
+		self.assertEqual(message.source.in_token_count, len(message.source.full_prompt().split()))
+		self.assertEqual(len(counted), 6)
+	
+	def test_generating_message_is_rendered_again_once_changed(self):
+		cache = ChatRenderCache()
+		conv = self.create_conversation(2)
+		source = ModelSource()
+		source.generating = True
+		reply = Message("Partial", source)
+		conv.add_message(reply)
+		cache.render(conv.message_sequence.messages, False)
+		
+		reply.append(" and the rest")
+		rendered = cache.render(conv.message_sequence.messages, False)
+		self.assertEqual(rendered.chat[-1]["content"], "Partial and the rest")
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
@@ -0,0 +1,67 @@
+import unittest
+import json
+from AbstractAI.LLMs.ChunkLog import ChunkLog
+
+class RawChunk:
+	def __init__(self, text:str, usage:dict=None):
+		self.text = text
+		self.usage = usage
+
+class TestChunkLog(unittest.TestCase):
+	def setUp(self) -> None:
+		self.converted = []
+		return super().setUp()
+	
+	def to_dict(self, chunk:RawChunk) -> dict:
+		self.converted.append(chunk.text)
+		return dict(vars(chunk))
+	
+	def log(self) -> ChunkLog:
+		log = ChunkLog(self.to_dict)
+		for text in ["Hel", "lo", " wor", "ld"]:
+			log.append(RawChunk(text), text)
+		log.append(RawChunk("", {"prompt_tokens":3}), None, "stop", usage=True)
+		log.append(RawChunk("!"), "!")
+		return log
+	
+	def test_only_keeps_some_chunks_raw(self):
+		log = self.log()
+		self.assertEqual(len(log), 6)
+		self.assertEqual(log.text(), "Hello world!")
+		self.assertEqual(sorted(log.raw.keys()), [0, 4])
+		self.assertEqual(log.last_raw()["text"], "!")
+		self.assertEqual(log.last_raw()["text"], "!")
+		self.assertEqual(self.converted, ["Hel", "", "!"])
+	
+	def test_round_trip(self):
+		log = self.log()
+		serialized = json.loads(json.dumps(log.serialize()))
+		copy = ChunkLog.deserialize(serialized)
+		
+		self.assertEqual(copy.deltas, log.deltas)
+		self.assertEqual(list(copy.times), list(log.times))
+		self.assertEqual(copy.finish_reasons, {4:"stop"})
+		self.assertEqual(sorted(copy.raw.keys()), [0, 4, 5])
+		self.assertEqual(copy.last_raw()["text"], "!")
+		self.assertEqual(copy.start_time, log.start_time)
+		
+		chunks = list(copy.chunks())
+		self.assertEqual([c.delta for c in chunks], ["Hel", "lo", " wor", "ld", "", "!"])
+		self.assertEqual(chunks[4].raw["usage"], {"prompt_tokens":3})
+		self.assertIsNone(chunks[2].raw)
+	
+	def test_unicode(self):
+		log = ChunkLog()
+		for text in ["hé", "\U0001F600", "你好"]:
+			log.append({"text":text}, text)
+		copy = ChunkLog.deserialize(json.loads(json.dumps(log.serialize())))
+		self.assertEqual(copy.deltas, log.deltas)
+	
+	def test_empty(self):
+		log = ChunkLog()
+		self.assertIsNone(log.last_raw())
+		copy = ChunkLog.deserialize(log.serialize())
+		self.assertEqual(len(copy), 0)
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
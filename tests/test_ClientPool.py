@@ -0,0 +1,98 @@
+import unittest
+import asyncio
+import gc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+try:
+	from AbstractAI.LLMs.ClientPool import ClientPool
+except ImportError:
+	ClientPool = None
+
+class StandInHandler(BaseHTTPRequestHandler):
+	protocol_version = "HTTP/1.1"
+	
+	def do_POST(self):
+		self.rfile.read(int(self.headers.get("Content-Length", 0)))
+		body = b'{"ok": true}'
+		self.send_response(200)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+	
+	def log_message(self, format, *args):
+		pass
+
+@unittest.skipIf(ClientPool is None, "httpx is not installed")
+class TestClientPool(unittest.TestCase):
+	def setUp(self) -> None:
+		self.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+		self.thread = Thread(target=self.server.serve_forever, daemon=True)
+		self.thread.start()
+		self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+		return super().setUp()
+	
+	def tearDown(self) -> None:
+		self.server.shutdown()
+		self.server.server_close()
+		return super().tearDown()
+	
+	def test_clients_are_shared_by_key(self):
+		pool = ClientPool()
+		client = pool.client("OpenAI", self.base_url, "key")
+		self.assertIs(pool.client("OpenAI", self.base_url, "key"), client)
+		self.assertIsNot(pool.client("OpenAI", self.base_url, "other key"), client)
+		self.assertIsNot(pool.client("Groq", self.base_url, "key"), client)
+	
+	def test_async_clients_are_shared_per_event_loop(self):
+		pool = ClientPool()
+		async def clients():
+			return pool.async_client("OpenAI", self.base_url, "key"), pool.async_client("OpenAI", self.base_url, "key")
+		first, same_loop = asyncio.run(clients())
+		second, _ = asyncio.run(clients())
+		self.assertIs(first, same_loop)
+		self.assertIsNot(first, second)
+		self.assertIsNot(first, pool.client("OpenAI", self.base_url, "key"))
+		with self.assertRaises(RuntimeError):
+			pool.async_client("OpenAI", self.base_url, "key")
+	
+	def test_async_clients_are_dropped_with_their_loop(self):
+		pool = ClientPool()
+		loop = asyncio.new_event_loop()
+		client = loop.run_until_complete(self.async_client(pool))
+		self.assertEqual(len(pool._async_clients._values), 1)
+		loop.run_until_complete(client.aclose())
+		loop.close()
+		del loop
+		gc.collect()
+		self.assertEqual(len(pool._async_clients._values), 0)
+	
+	async def async_client(self, pool:"ClientPool"):
+		return pool.async_client("OpenAI", self.base_url, "key")
+	
+	def test_connections_are_reused(self):
+		pool = ClientPool()
+		for i in range(5):
+			# A new client each time like a freshly loaded LLM would ask for:
+			client = pool.client("OpenAI", self.base_url, "key")
+			self.assertEqual(client.post(f"{self.base_url}/chat", json={}).json(), {"ok":True})
+		
+		stats = pool.stats("OpenAI", self.base_url, "key")
+		self.assertEqual(stats.requests, 5)
+		self.assertEqual(stats.new_connections, 1)
+		self.assertEqual(stats.reused_connections, 4)
+		self.assertEqual(pool.stats().requests, 5)
+	
+	def test_max_connections(self):
+		pool = ClientPool(max_connections=1, max_keepalive_connections=1)
+		client = pool.client("OpenAI", self.base_url, "key")
+		threads = [Thread(target=client.post, args=(f"{self.base_url}/chat",), kwargs={"json":{}}) for i in range(4)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(pool.stats("OpenAI", self.base_url, "key").new_connections, 1)
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
@@ -0,0 +1,64 @@
+import unittest
+import os
+import tempfile
+from AbstractAI.LLMs.CompletionCache import CompletionCache, CachedCompletion
+
+class TestCompletionCache(unittest.TestCase):
+	def setUp(self) -> None:
+		self.directory = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.directory.name, "completions.sqlite")
+		return super().setUp()
+	
+	def tearDown(self) -> None:
+		self.directory.cleanup()
+		return super().tearDown()
+	
+	def test_round_trip(self):
+		cache = CompletionCache(self.path)
+		key = CompletionCache.key("settings id", [{"role":"user", "content":"hi"}], "", 10)
+		self.assertIsNone(cache.get(key))
+		
+		cache.put(key, CachedCompletion(["Hel", "lo", "!"], 5, 3, True))
+		cached = cache.get(key)
+		self.assertEqual(cached.chunks, ["Hel", "lo", "!"])
+		self.assertEqual(cached.content, "Hello!")
+		self.assertEqual((cached.in_token_count, cached.out_token_count, cached.finished), (5, 3, True))
+		self.assertEqual((cache.hits, cache.misses), (1, 1))
+		cache.close()
+	
+	def test_keys_differ_by_request(self):
+		self.assertEqual(CompletionCache.key("a", "prompt", 10), CompletionCache.key("a", "prompt", 10))
+		self.assertNotEqual(CompletionCache.key("a", "prompt", 10), CompletionCache.key("a", "prompt", 11))
+		self.assertNotEqual(CompletionCache.key("a", "prompt", 10), CompletionCache.key("b", "prompt", 10))
+	
+	def test_persists(self):
+		cache = CompletionCache(self.path)
+		cache.put("key", CachedCompletion(["stored"]))
+		cache.close()
+		
+		cache = CompletionCache(self.path)
+		self.assertEqual(cache.get("key").content, "stored")
+		cache.close()
+	
+	def test_evicts_least_recently_used(self):
+		cache = CompletionCache(self.path, max_bytes=40)
+		cache.put("a", CachedCompletion(["x"*10]))
+		cache.put("b", CachedCompletion(["y"*10]))
+		cache.get("a")
+		cache.put("c", CachedCompletion(["z"*10]))
+		
+		self.assertIsNotNone(cache.get("a"))
+		self.assertIsNone(cache.get("b"))
+		self.assertIsNotNone(cache.get("c"))
+		self.assertLessEqual(cache.size(), 40)
+		cache.close()
+	
+	def test_skips_completions_larger_than_the_cache(self):
+		cache = CompletionCache(self.path, max_bytes=10)
+		cache.put("a", CachedCompletion(["x"*100]))
+		self.assertIsNone(cache.get("a"))
+		self.assertEqual(cache.size(), 0)
+		cache.close()
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
@@ -0,0 +1,64 @@
+import unittest
+from AbstractAI.LLMs.ContextWindow import ContextWindow
+
+class TestContextWindow(unittest.TestCase):
+	def window(self, *items) -> ContextWindow:
+		window = ContextWindow()
+		window.extend(items)
+		return window
+	
+	def test_keeps_everything_that_fits(self):
+		window = self.window((10, True), (20, False), (30, False))
+		self.assertEqual(window.tokens(0), 60)
+		self.assertEqual(window.fit(60), 0)
+		self.assertEqual(window.fit(1000), 0)
+	
+	def test_keeps_largest_suffix(self):
+		window = self.window((10, False), (20, False), (30, False), (40, False))
+		self.assertEqual(window.fit(70), 2)
+		self.assertEqual(window.fit(69), 3)
+		self.assertEqual(window.fit(39), 4)
+	
+	def test_always_keeps_system_messages(self):
+		window = self.window((5, True), (100, False), (100, False), (5, True), (20, False))
+		# Leaving out both long messages still pays for both system messages:
+		self.assertEqual(window.tokens(3), 30)
+		self.assertEqual(window.fit(30), 3)
+		self.assertEqual(window.systems_before(3), [0])
+		self.assertEqual(window.systems_before(4), [0, 3])
+	
+	def test_uncountable(self):
+		window = self.window((10, False), (-1, False))
+		self.assertIsNone(window.fit(100))
+	
+	def test_extend_to(self):
+		window = ContextWindow()
+		costs = [(1, False), (2, False), (3, False)]
+		counted = []
+		def cost(i):
+			counted.append(i)
+			return costs[i]
+		window.extend_to(2, cost)
+		window.extend_to(3, cost)
+		window.extend_to(3, cost)
+		self.assertEqual(counted, [0, 1, 2])
+		self.assertEqual(window.tokens(0), 6)
+	
+	def test_shorter_length(self):
+		window = self.window((10, False), (20, False), (30, False), (-1, False))
+		self.assertIsNone(window.fit(100))
+		self.assertEqual(window.tokens(0, 2), 30)
+		self.assertEqual(window.fit(20, 2), 1)
+		self.assertEqual(window.fit(1000, 3), 0)
+	
+	def test_truncated(self):
+		window = self.window((1, True), (2, False), (3, True), (4, False))
+		copy = window.truncated(2)
+		self.assertEqual(len(copy), 2)
+		self.assertEqual(copy.tokens(0), 3)
+		self.assertEqual(copy.system_indices, [0])
+		copy.extend([(10, False)])
+		self.assertEqual(window.tokens(0), 10)
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
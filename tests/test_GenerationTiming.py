@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import patch
+from types import SimpleNamespace
+from datetime import datetime
+from AbstractAI.Model.Converse import *
+from AbstractAI.Model.Converse.GenerationTiming import GenerationTiming
+from AbstractAI.LLMs.LLM_Response import LLM_Response
+
+START = 1000.0
+
+class FakeClock:
+	def __init__(self):
+		self.now = START
+	
+	def time(self) -> float:
+		return self.now
+
+class TestGenerationTiming(unittest.TestCase):
+	def setUp(self):
+		self.clock = FakeClock()
+		patcher = patch("AbstractAI.LLMs.LLM_Response.time", SimpleNamespace(time=self.clock.time))
+		patcher.start()
+		self.addCleanup(patcher.stop)
+	
+	def response(self, start_str:str="") -> LLM_Response:
+		source = ModelSource(start_str=start_str)
+		source.timing = GenerationTiming(start_time=datetime.fromtimestamp(START))
+		return LLM_Response(Message(start_str, source), None)
+	
+	def stream(self, response:LLM_Response, gaps):
+		'''Appends a chunk after each gap, noting progress as LLM does.'''
+		for gap in gaps:
+			self.clock.now += gap
+			response.message.append("x")
+			response.note_progress()
+	
+	def test_streamed(self):
+		response = self.response()
+		self.stream(response, [2] + list(range(1, 11)))
+		self.clock.now += 1
+		response.report_usage(5, 21)
+		response.finish()
+		timing = response.source.timing
+		
+		self.assertAlmostEqual(timing.time_to_first_token, 2)
+		self.assertAlmostEqual(timing.total_seconds, 2 + 55 + 1)
+		self.assertEqual((timing.out_token_count, timing.chunk_count), (21, 11))
+		# The gaps are 1 through 10 seconds:
+		self.assertAlmostEqual(timing.inter_token_p50, 6)
+		self.assertAlmostEqual(timing.inter_token_p90, 10)
+		self.assertAlmostEqual(timing.inter_token_p99, 10)
+		# 20 tokens after the first, over the 56 seconds after it arrived:
+		self.assertAlmostEqual(timing.tokens_per_second, 20 / 56)
+	
+	def test_only_growth_is_noted(self):
+		response = self.response(start_str="Sure")
+		response.note_progress()
+		self.clock.now += 1
+		response.note_progress()
+		self.stream(response, [1, 1])
+		self.clock.now += 3
+		response.note_progress()
+		response.finish()
+		timing = response.source.timing
+		
+		self.assertEqual(timing.chunk_count, 2)
+		self.assertAlmostEqual(timing.time_to_first_token, 2)
+		self.assertAlmostEqual(timing.inter_token_p50, 1)
+	
+	def test_not_streamed(self):
+		response = self.response()
+		self.clock.now += 4
+		response.message.append("Hello there")
+		response.report_usage(5, 2)
+		response.finish()
+		timing = response.source.timing
+		
+		self.assertAlmostEqual(timing.time_to_first_token, 4)
+		self.assertAlmostEqual(timing.total_seconds, 4)
+		self.assertEqual(timing.chunk_count, 0)
+		self.assertIsNone(timing.inter_token_p50)
+		self.assertAlmostEqual(timing.tokens_per_second, 2 / 4)
+	
+	def test_single_chunk(self):
+		response = self.response()
+		self.stream(response, [1])
+		self.clock.now += 1
+		response.report_usage(5, 1)
+		response.finish()
+		timing = response.source.timing
+		
+		self.assertIsNone(timing.inter_token_p90)
+		# With nothing after the first token, it's over the whole time:
+		self.assertAlmostEqual(timing.tokens_per_second, 1 / 2)
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
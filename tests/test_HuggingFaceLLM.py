@@ -0,0 +1,266 @@
+import unittest
+import tempfile
+import asyncio
+import time
+import os
+from AbstractAI.Model.Converse import *
+
+try:
+	import torch
+	from tokenizers import Tokenizer
+	from tokenizers.models import WordLevel
+	from tokenizers.pre_tokenizers import Whitespace
+	from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+	from AbstractAI.LLMs.HuggingFaceLLM import ForwardCounter, AssistedDecodingStats, HuggingFaceLLM, model_bytes
+	from AbstractAI.Model.Settings.HuggingFace_LLMSettings import HuggingFace_LLMSettings, torch_dtype_redefine
+except ImportError:
+	torch = None
+
+WORDS = ["<unk>", "<pad>", "user", "assistant", "system", ":", "?", "hello", "there"] + [f"w{i}" for i in range(55)]
+
+def tiny_model_dir(directory:str) -> str:
+	'''
+	Saves a small randomly initialized Llama and a word level tokenizer
+	for it to directory, returning their path.
+	
+	It has no end token, so it always generates as many as it's asked for.
+	'''
+	config = LlamaConfig(
+		vocab_size=len(WORDS), hidden_size=32, intermediate_size=64, num_hidden_layers=2, num_attention_heads=2, num_key_value_heads=2,
+		max_position_embeddings=64, bos_token_id=None, eos_token_id=None, pad_token_id=WORDS.index("<pad>")
+	)
+	torch.manual_seed(0)
+	path = os.path.join(directory, "tiny-llama")
+	LlamaForCausalLM(config).save_pretrained(path)
+	
+	word_level = Tokenizer(WordLevel({word:i for i, word in enumerate(WORDS)}, unk_token="<unk>"))
+	word_level.pre_tokenizer = Whitespace()
+	tokenizer = PreTrainedTokenizerFast(tokenizer_object=word_level, unk_token="<unk>", pad_token="<pad>")
+	tokenizer.chat_template = "{% for m in messages %}{{ m['role'] }} : {{ m['content'] }} {% endfor %}{% if add_generation_prompt %}assistant :{% endif %}"
+	tokenizer.save_pretrained(path)
+	return path
+
+def conversation(text:str="hello there ?") -> Conversation:
+	conv = Conversation()
+	conv.add_message(Message(text, UserSource()))
+	return conv
+
+@unittest.skipIf(torch is None, "torch and transformers are not installed")
+class TestAssistedDecodingStats(unittest.TestCase):
+	def test_forward_counter_counts_while_hooked(self):
+		model = torch.nn.Linear(2, 2)
+		counter = ForwardCounter(model)
+		counter.hook()
+		for i in range(3):
+			model(torch.zeros(1, 2))
+		counter.unhook()
+		model(torch.zeros(1, 2))
+		
+		self.assertEqual(counter.calls, 3)
+		self.assertGreater(counter.seconds, 0)
+		self.assertLessEqual(counter.first_seconds, counter.seconds)
+	
+	def test_counts_each_model_separately(self):
+		model, draft_model = torch.nn.Linear(2, 2), torch.nn.Linear(2, 2)
+		with AssistedDecodingStats(model, draft_model) as stats:
+			model(torch.zeros(1, 2))
+			for i in range(4):
+				draft_model(torch.zeros(1, 2))
+			model(torch.zeros(1, 2))
+		self.assertEqual((stats.main.calls, stats.draft.calls), (2, 4))
+		self.assertGreater(stats.seconds, 0)
+	
+	def test_summary(self):
+		stats = AssistedDecodingStats(torch.nn.Linear(2, 2), torch.nn.Linear(2, 2))
+		stats.main.calls, stats.main.seconds, stats.main.first_seconds = 4, 1.0, 0.4
+		stats.draft.calls = 10
+		stats.seconds = 1.1
+		
+		summary = stats.summary(10)
+		# 4 passes made 10 tokens, so 6 of the 10 drafted were accepted:
+		self.assertEqual(summary["accepted_tokens"], 6)
+		self.assertAlmostEqual(summary["acceptance_rate"], 0.6)
+		# The prompt pass, then 9 more at the 0.2s the other 3 averaged:
+		self.assertAlmostEqual(summary["estimated_plain_seconds"], 2.2)
+		self.assertAlmostEqual(summary["estimated_speedup"], 2.0)
+	
+	def test_summary_without_drafts(self):
+		stats = AssistedDecodingStats(torch.nn.Linear(2, 2), torch.nn.Linear(2, 2))
+		stats.main.calls, stats.main.seconds, stats.main.first_seconds = 1, 0.5, 0.5
+		summary = stats.summary(1)
+		self.assertEqual((summary["accepted_tokens"], summary["acceptance_rate"], summary["estimated_speedup"]), (0, 0, 0))
+
+@unittest.skipIf(torch is None, "torch and transformers are not installed")
+class TestInt8(unittest.TestCase):
+	def setUp(self):
+		directory = tempfile.TemporaryDirectory()
+		self.addCleanup(directory.cleanup)
+		self.model_str = tiny_model_dir(directory.name)
+		self.cache_dir = os.path.join(directory.name, "int8")
+		HuggingFaceLLM.int8_benchmarks.clear()
+	
+	def llm(self, benchmark:bool=False) -> "HuggingFaceLLM":
+		settings = HuggingFace_LLMSettings(model_str=self.model_str)
+		settings.model.cpu_int8 = True
+		settings.model.int8_cache_dir = self.cache_dir
+		settings.model.int8_benchmark = benchmark
+		llm = HuggingFaceLLM(settings)
+		llm.benchmarks = 0
+		def tokens_per_second(model, new_tokens:int=16) -> float:
+			llm.benchmarks += 1
+			return 10.0 * llm.benchmarks
+		llm._tokens_per_second = tokens_per_second
+		return llm
+	
+	def test_quantizes_linear_layers(self):
+		float_model = LlamaForCausalLM.from_pretrained(self.model_str)
+		model = self.llm()._load_int8(self.model_str)
+		
+		quantized = [module for module in model.modules() if isinstance(module, torch.ao.nn.quantized.dynamic.Linear)]
+		self.assertGreater(len(quantized), 0)
+		self.assertLess(model_bytes(model), model_bytes(float_model))
+		
+		input_ids = torch.tensor([[1, 2, 3]])
+		with torch.no_grad():
+			self.assertEqual(model(input_ids).logits.shape, float_model(input_ids).logits.shape)
+	
+	def test_loads_from_the_cache(self):
+		model = self.llm()._load_int8(self.model_str)
+		self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+		
+		cached = self.llm()._load_int8(self.model_str)
+		self.assertIsNot(cached, model)
+		input_ids = torch.tensor([[1, 2, 3]])
+		with torch.no_grad():
+			self.assertTrue(torch.equal(cached(input_ids).logits, model(input_ids).logits))
+	
+	def test_only_benchmarks_when_asked(self):
+		llm = self.llm()
+		llm._load_int8(self.model_str)
+		self.assertEqual(llm.benchmarks, 0)
+	
+	def test_benchmarks_the_first_quantization_only(self):
+		llm = self.llm(benchmark=True)
+		llm._load_int8(self.model_str)
+		self.assertEqual(llm.benchmarks, 2)
+		self.assertEqual(llm._int8_benchmark(self.model_str), {"before":10.0, "after":20.0})
+		
+		# Kept next to the cache for later processes:
+		HuggingFaceLLM.int8_benchmarks.clear()
+		os.remove(llm._int8_cache_path(self.model_str))
+		again = self.llm(benchmark=True)
+		again._load_int8(self.model_str)
+		self.assertEqual(again.benchmarks, 0)
+		self.assertEqual(again._int8_benchmark(self.model_str), {"before":10.0, "after":20.0})
+
+@unittest.skipIf(torch is None, "torch and transformers are not installed")
+class TestMmapWeights(unittest.TestCase):
+	def test_matches_a_normal_load(self):
+		directory = tempfile.TemporaryDirectory()
+		self.addCleanup(directory.cleanup)
+		path = tiny_model_dir(directory.name)
+		settings = HuggingFace_LLMSettings(model_str=path)
+		settings.model.mmap_weights = True
+		model = HuggingFaceLLM(settings)._load_mmapped(path)
+		
+		self.assertEqual([name for name, parameter in model.named_parameters() if parameter.is_meta], [])
+		loaded = LlamaForCausalLM.from_pretrained(path, attn_implementation="eager")
+		input_ids = torch.tensor([[1, 2, 3, 7, 8]])
+		with torch.no_grad():
+			self.assertTrue(torch.allclose(model(input_ids).logits, loaded(input_ids).logits))
+
+@unittest.skipIf(torch is None, "torch and transformers are not installed")
+class TestChat(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls.directory = tempfile.TemporaryDirectory()
+		settings = HuggingFace_LLMSettings(model_str=tiny_model_dir(cls.directory.name))
+		settings.model.torch_dtype = torch_dtype_redefine.float32
+		settings.tokenize.use_fast = True
+		cls.llm = HuggingFaceLLM(settings)
+		cls.llm.start()
+	
+	@classmethod
+	def tearDownClass(cls):
+		cls.llm.unload()
+		cls.directory.cleanup()
+	
+	def test_achat_streams(self):
+		expected = self.llm.chat(conversation(), max_tokens=8)
+		async def contents():
+			return [response.message.content async for response in self.llm.achat(conversation(), stream=True, max_tokens=8)]
+		streamed = asyncio.run(contents())
+		
+		self.assertGreater(len(set(streamed)), 2)
+		for before, after in zip(streamed, streamed[1:]):
+			self.assertTrue(after.startswith(before))
+		self.assertEqual(streamed[-1], expected.message.content)
+		self.assertEqual(self.llm.in_flight, 0)
+	
+	def test_chat_batch_keeps_order(self):
+		texts = ["hello", "hello there ? w1 w2 w3 w4", "there", "w9 ? w8"]
+		conversations = [conversation(text) for text in texts]
+		responses = self.llm.chat_batch(conversations, max_tokens=6)
+		
+		self.assertEqual(len(responses), len(texts))
+		for conv, response in zip(conversations, responses):
+			self.assertIs(response.source.message_sequence, conv.message_sequence)
+			# Left padding the shorter prompts doesn't change what's generated for them:
+			expected = self.llm.chat(conversation(conv.message_sequence.messages[0].content), max_tokens=6)
+			self.assertEqual(response.message.content, expected.message.content)
+			self.assertEqual((response.source.in_token_count, response.source.out_token_count), (expected.source.in_token_count, 6))
+			self.assertTrue(response.source.finished)
+			self.assertFalse(response.source.generating)
+		self.assertEqual(self.llm.in_flight, 0)
+	
+	def test_empty_chat_batch(self):
+		self.assertEqual(self.llm.chat_batch([]), [])
+	
+	def slow_down(self) -> list:
+		'''Makes every forward pass take a few milliseconds, returning a list that counts them.'''
+		calls = []
+		def pre_forward(module, args):
+			calls.append(1)
+			time.sleep(0.005)
+		self.addCleanup(self.llm.model.register_forward_pre_hook(pre_forward).remove)
+		return calls
+	
+	def test_stream_matches_unstreamed(self):
+		expected = self.llm.chat(conversation(), max_tokens=8)
+		streamed = []
+		for response in self.llm.chat(conversation(), stream=True, max_tokens=8):
+			streamed.append(response.message.content)
+		
+		self.assertGreater(len(set(streamed)), 2)
+		for before, after in zip(streamed, streamed[1:]):
+			self.assertTrue(after.startswith(before))
+		self.assertEqual(streamed[-1], expected.message.content)
+		self.assertEqual(response.source.out_token_count, 8)
+		self.assertTrue(response.source.finished)
+	
+	def test_stopping_a_stream(self):
+		self.slow_down()
+		for response in self.llm.chat(conversation(), stream=True, max_tokens=50):
+			if len(response.message.content) > 0:
+				response.stop()
+		self.assertFalse(response.source.finished)
+		self.assertLess(response.source.out_token_count, 50)
+		self.assertFalse(response.source.generating)
+	
+	def test_closing_a_stream_stops_generating(self):
+		calls = self.slow_down()
+		responses = self.llm.chat(conversation(), stream=True, max_tokens=50)
+		for response in responses:
+			if len(response.message.content) > 0:
+				break
+		responses.close()
+		
+		# Closing waits for generate to stop, so nothing runs after:
+		stopped_at = len(calls)
+		time.sleep(0.05)
+		self.assertEqual(len(calls), stopped_at)
+		self.assertLess(stopped_at, 50)
+		self.assertEqual(self.llm.in_flight, 0)
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
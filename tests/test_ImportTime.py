@@ -0,0 +1,49 @@
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# Seconds a fresh interpreter may take to import the UI, overridable for slow machines:
+IMPORT_BUDGET = float(os.environ.get("ABSTRACTAI_IMPORT_BUDGET", 3))
+
+# Modules that should only load once a model, or speech, is actually used:
+HEAVY_MODULES = ["torch", "transformers", "whisper", "tiktoken", "pydub", "openai", "groq", "ollama", "llama_cpp"]
+
+MEASURE = '''
+import json, sys, time
+start = time.perf_counter()
+import AbstractAI.UI.main
+seconds = time.perf_counter() - start
+print(json.dumps({
+	"seconds":seconds,
+	"settings":sorted(AbstractAI.UI.main.llm_settings_types.keys()),
+	"heavy":[name for name in %r if name in sys.modules]
+}))
+''' % (HEAVY_MODULES,)
+
+def _installed(name:str) -> bool:
+	return importlib.util.find_spec(name) is not None
+
+@unittest.skipIf(not (_installed("PyQt5") and _installed("ClassyFlaskDB")), "PyQt5 and ClassyFlaskDB are needed to import the UI")
+class TestImportTime(unittest.TestCase):
+	def measure(self) -> dict:
+		root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+		env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+		output = subprocess.run([sys.executable, "-c", MEASURE], cwd=root, env=env, capture_output=True, text=True, check=True).stdout
+		return json.loads(output.strip().splitlines()[-1])
+	
+	def test_heavy_modules_are_not_imported(self):
+		result = self.measure()
+		self.assertEqual(result["heavy"], [])
+		self.assertIn("LLamaCPP", result["settings"])
+		self.assertIn("OpenAI", result["settings"])
+	
+	def test_import_budget(self):
+		# Best of a few, so a busy machine doesn't fail this:
+		seconds = min(self.measure()["seconds"] for _ in range(3))
+		self.assertLess(seconds, IMPORT_BUDGET, f"import AbstractAI.UI.main took {seconds:.2f}s")
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
@@ -0,0 +1,54 @@
+import unittest
+from threading import Event
+from AbstractAI.Model.Converse import *
+from AbstractAI.LLMs.LLM import LLM, LLM_Response
+from AbstractAI.Model.Settings.LLMSettings import LLMSettings
+
+class ChunkLoggingLLM(LLM):
+	'''Streams chunks, logging each like the remote backends do.'''
+	def __init__(self, chunks):
+		super().__init__(LLMSettings())
+		self.chunks = chunks
+	
+	def _chat(self, conversation:Conversation, start_str:str="", stream=False, max_tokens:int=None, auto_append:bool=False):
+		wip_message, _ = self._new_message(conversation, start_str, auto_append=auto_append, max_tokens=max_tokens)
+		response = LLM_Response(wip_message, None)
+		if stream:
+			yield response
+		for chunk in self.chunks:
+			response.message.append(chunk)
+			response.log_chunk({"text":chunk}, chunk)
+			if stream:
+				yield response
+		response.source.finished = True
+		response.finish()
+		return response
+
+def conversation() -> Conversation:
+	conv = Conversation()
+	conv.add_message(Message("Hello?", UserSource()))
+	return conv
+
+class TestFinish(unittest.TestCase):
+	def test_finished_stream_emits_changed(self):
+		llm = ChunkLoggingLLM(["Hel", "lo", "!"])
+		responses = llm.chat(conversation(), stream=True)
+		response = next(responses)
+		
+		# What ConversationCollection would save when the message changes:
+		saved = []
+		saved_finished = Event()
+		def save(message:Message):
+			saved.append((message.source.generating, "ChunkLog" in message.source.serialized_raw_output))
+			if not message.source.generating:
+				saved_finished.set()
+		response.message.changed.connect(save)
+		
+		for response in responses:
+			pass
+		self.assertTrue(saved_finished.wait(2))
+		self.assertEqual(saved[-1], (False, True))
+		self.assertEqual(response.message.content, "Hello!")
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
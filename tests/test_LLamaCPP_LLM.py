@@ -0,0 +1,40 @@
+import unittest
+from unittest.mock import patch
+
+try:
+	from AbstractAI.LLMs.LLamaCPP_LLM import LLamaCPP_LLM
+	from AbstractAI.Model.Settings.LLamaCpp_LLMSettings import LLamaCpp_LLMSettings, LLamaCpp_LLMInitSettings
+except ImportError:
+	LLamaCPP_LLM = None
+
+class FakeLlama:
+	'''Records what LLamaCPP_LLM loads instead of loading a model.'''
+	def __init__(self, model_path:str, **kwargs):
+		self.model_path = model_path
+		self.cache = None
+	
+	def set_cache(self, cache):
+		self.cache = cache
+
+class FakeRAMCache:
+	def __init__(self, capacity_bytes:int):
+		self.capacity_bytes = capacity_bytes
+
+@unittest.skipIf(LLamaCPP_LLM is None, "llama_cpp is not installed")
+class TestLLamaCPP_LLM(unittest.TestCase):
+	def load(self, prefix_cache_mb:int) -> LLamaCPP_LLM:
+		llm = LLamaCPP_LLM(LLamaCpp_LLMSettings(model=LLamaCpp_LLMInitSettings(model_path="model.gguf", prefix_cache_mb=prefix_cache_mb)))
+		with patch("AbstractAI.LLMs.LLamaCPP_LLM.Llama", FakeLlama), patch("AbstractAI.LLMs.LLamaCPP_LLM.LlamaRAMCache", FakeRAMCache):
+			llm._load_model()
+		return llm
+	
+	def test_prefix_cache(self):
+		llm = self.load(prefix_cache_mb=64)
+		self.assertIsInstance(llm.model.cache, FakeRAMCache)
+		self.assertEqual(llm.model.cache.capacity_bytes, 64 * 2**20)
+	
+	def test_no_prefix_cache(self):
+		self.assertIsNone(self.load(prefix_cache_mb=0).model.cache)
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
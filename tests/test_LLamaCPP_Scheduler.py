@@ -0,0 +1,128 @@
+import unittest
+from threading import Event
+
+try:
+	import numpy as np
+	from AbstractAI.LLMs.LLamaCPP_Scheduler import LLamaCPP_Scheduler, SamplingSettings
+except ImportError:
+	LLamaCPP_Scheduler = None
+
+VOCAB = 32
+EOS = 0
+
+class FakeLlama:
+	'''Just enough of a llama_cpp.Llama for the scheduler.'''
+	def n_vocab(self) -> int:
+		return VOCAB
+	
+	def token_eos(self) -> int:
+		return EOS
+	
+	def detokenize(self, tokens) -> bytes:
+		return "".join(f"<{token}>" for token in tokens).encode()
+
+class FakeBatch:
+	def __init__(self, n_batch:int):
+		self.token = [0] * n_batch
+		self.pos = [0] * n_batch
+		self.n_seq_id = [0] * n_batch
+		self.seq_id = [[0] for i in range(n_batch)]
+		self.logits = [False] * n_batch
+		self.n_tokens = 0
+
+if LLamaCPP_Scheduler is not None:
+	class FakeScheduler(LLamaCPP_Scheduler):
+		'''A model that always continues with the token after the last one it was given.'''
+		def _new_context(self, n_threads:int) -> tuple:
+			self.batch_sizes = []
+			self.rows = {}
+			self.decoding = Event()
+			self.decoding.set()
+			return None, FakeBatch(self.n_batch)
+		
+		def _free_context(self):
+			pass
+		
+		def _decode(self) -> int:
+			self.decoding.wait()
+			self.batch_sizes.append(self.batch.n_tokens)
+			self.rows = {}
+			for i in range(self.batch.n_tokens):
+				if self.batch.logits[i]:
+					row = np.zeros(VOCAB, dtype=np.float32)
+					row[(self.batch.token[i] + 1) % VOCAB] = 10
+					self.rows[i] = row
+			return 0
+		
+		def _logits(self, batch_index:int):
+			return self.rows[batch_index]
+		
+		def _clear_slot(self, slot:int):
+			pass
+
+GREEDY = SamplingSettings(temperature=0) if LLamaCPP_Scheduler is not None else None
+
+@unittest.skipIf(LLamaCPP_Scheduler is None, "llama_cpp is not installed")
+class TestLLamaCPP_Scheduler(unittest.TestCase):
+	def scheduler(self, **kwargs) -> "FakeScheduler":
+		kwargs = {"n_slots":2, "n_ctx_per_slot":64, **kwargs}
+		scheduler = FakeScheduler(FakeLlama(), **kwargs)
+		self.addCleanup(scheduler.close)
+		return scheduler
+	
+	def test_generates_until_max_tokens(self):
+		request = self.scheduler().submit([1, 2, 3], 4, GREEDY)
+		self.assertEqual("".join(request), "<4><5><6><7>")
+		self.assertEqual(request.finish_reason, "length")
+		self.assertEqual(request.generated_tokens, [4, 5, 6, 7])
+		self.assertEqual(request.context_tokens, [1, 2, 3, 4, 5, 6, 7])
+	
+	def test_stops_at_the_end_token(self):
+		request = self.scheduler().submit([29, 30], 10, GREEDY)
+		self.assertEqual("".join(request), "<31>")
+		self.assertEqual(request.finish_reason, "stop")
+	
+	def test_stops_when_the_slot_is_full(self):
+		request = self.scheduler(n_ctx_per_slot=8).submit([1, 2, 3, 4, 5], 0, GREEDY)
+		self.assertEqual("".join(request), "<6><7><8>")
+		self.assertEqual(request.finish_reason, "length")
+	
+	def test_rejects_prompts_longer_than_a_slot(self):
+		scheduler = self.scheduler(n_ctx_per_slot=8)
+		with self.assertRaises(ValueError):
+			scheduler.submit(list(range(1, 10)), 1, GREEDY)
+		with self.assertRaises(ValueError):
+			scheduler.submit([], 1, GREEDY)
+	
+	def test_serves_more_requests_than_slots(self):
+		scheduler = self.scheduler(n_slots=2)
+		requests = [scheduler.submit([start], 3, GREEDY) for start in [1, 5, 9, 13, 17]]
+		for start, request in zip([1, 5, 9, 13, 17], requests):
+			self.assertEqual("".join(request), "".join(f"<{start + i}>" for i in range(1, 4)))
+		self.assertEqual(scheduler.active_requests, 0)
+		self.assertEqual(scheduler.waiting_requests, 0)
+	
+	def test_prefills_long_prompts_in_chunks(self):
+		scheduler = self.scheduler(n_batch=4, prefill_chunk=3)
+		request = scheduler.submit(list(range(1, 11)), 2, GREEDY)
+		self.assertEqual("".join(request), "<11><12>")
+		self.assertLessEqual(max(scheduler.batch_sizes), 4)
+		self.assertEqual(sum(scheduler.batch_sizes), 10 + 1)
+	
+	def test_cancelling_a_waiting_request(self):
+		scheduler = self.scheduler(n_slots=1)
+		# Holds the first request in the only slot until it's let go:
+		scheduler.decoding.clear()
+		self.addCleanup(scheduler.decoding.set)
+		busy = scheduler.submit([1], 4, GREEDY)
+		waiting = scheduler.submit([2], 4, GREEDY)
+		
+		waiting.cancel()
+		self.assertEqual(list(waiting), [])
+		self.assertEqual(waiting.finish_reason, "cancelled")
+		
+		scheduler.decoding.set()
+		self.assertEqual("".join(busy), "<2><3><4><5>")
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
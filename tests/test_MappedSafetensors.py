@@ -0,0 +1,66 @@
+import unittest
+from array import array
+import json
+import os
+import struct
+import sys
+import tempfile
+
+try:
+	import torch
+	from AbstractAI.Helpers.MappedSafetensors import MappedSafetensors
+except ImportError:
+	MappedSafetensors = None
+
+def write_safetensors(path:str, tensors:dict):
+	'''Writes float32 tensors, given as (shape, values), in the safetensors format.'''
+	header = {"__metadata__":{"format":"pt"}}
+	data = b""
+	for name, (shape, values) in tensors.items():
+		values = array('f', values)
+		if sys.byteorder != "little":
+			values.byteswap()
+		header[name] = {"dtype":"F32", "shape":shape, "data_offsets":[len(data), len(data) + len(values) * 4]}
+		data += values.tobytes()
+	header_bytes = json.dumps(header).encode("utf-8")
+	with open(path, "wb") as file:
+		file.write(struct.pack("<Q", len(header_bytes)))
+		file.write(header_bytes)
+		file.write(data)
+
+@unittest.skipIf(MappedSafetensors is None, "torch is not installed")
+class TestMappedSafetensors(unittest.TestCase):
+	def setUp(self) -> None:
+		self.directory = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.directory.name, "model.safetensors")
+		write_safetensors(self.path, {
+			"weight":([2, 3], [1, 2, 3, 4, 5, 6]),
+			"bias":([2], [0.5, -0.5]),
+			"empty":([0], [])
+		})
+	
+	def tearDown(self) -> None:
+		self.directory.cleanup()
+	
+	def test_reads_tensors(self):
+		checkpoint = MappedSafetensors(self.path)
+		self.assertEqual(set(checkpoint.keys()), {"weight", "bias", "empty"})
+		self.assertEqual(checkpoint.metadata, {"format":"pt"})
+		self.assertEqual(checkpoint.nbytes, os.path.getsize(self.path))
+		
+		weight = checkpoint.tensor("weight")
+		self.assertEqual(weight.dtype, torch.float32)
+		self.assertEqual(weight.tolist(), [[1, 2, 3], [4, 5, 6]])
+		self.assertEqual(checkpoint.tensor("bias").tolist(), [0.5, -0.5])
+		self.assertEqual(checkpoint.tensor("empty").shape, (0,))
+	
+	def test_writes_stay_private(self):
+		checkpoint = MappedSafetensors(self.path)
+		checkpoint.tensor("weight")[0, 0] = 100
+		
+		# Other views of the mapping see it, but the file is untouched:
+		self.assertEqual(checkpoint.tensor("weight")[0, 0].item(), 100)
+		self.assertEqual(MappedSafetensors(self.path).tensor("weight")[0, 0].item(), 1)
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
@@ -0,0 +1,132 @@
+import unittest
+import asyncio
+from types import SimpleNamespace
+from AbstractAI.Model.Converse import *
+from AbstractAI.LLMs.Ollama_LLM import Ollama_LLM
+from AbstractAI.Model.Settings.Ollama_LLMSettings import Ollama_LLMSettings
+
+class FakeStream:
+	def __init__(self, chunks):
+		self.chunks = chunks
+		self.closed = False
+	
+	def __iter__(self):
+		return iter(self.chunks)
+	
+	def close(self):
+		self.closed = True
+
+class FakeAsyncStream(FakeStream):
+	async def __aiter__(self):
+		for chunk in self.chunks:
+			yield chunk
+	
+	async def aclose(self):
+		self.closed = True
+
+def chunk(content:str, done:bool=False, **fields):
+	'''A stand in for one of the chat chunks the ollama client streams.'''
+	return dict(message={"role":"assistant", "content":content}, done=done, **fields)
+
+def conversation() -> Conversation:
+	conv = Conversation()
+	conv.add_message(Message("Hello?", UserSource()))
+	return conv
+
+class TestOllama_LLM(unittest.TestCase):
+	def llm(self, completion, **settings) -> Ollama_LLM:
+		llm = Ollama_LLM(Ollama_LLMSettings(model_name="llama3", **settings))
+		self.params = None
+		self.completion = completion
+		def chat(**params):
+			self.params = params
+			return self.completion
+		llm.client = SimpleNamespace(chat=chat)
+		return llm
+	
+	def stream(self, chunks, max_tokens:int=None, **settings):
+		self.contents = []
+		for response in self.llm(FakeStream(chunks), **settings).chat(conversation(), stream=True, max_tokens=max_tokens):
+			self.contents.append(response.message.content)
+		return response
+	
+	def test_request_params(self):
+		self.stream([chunk("", done=True, done_reason="stop")])
+		self.assertEqual(self.params["model"], "llama3")
+		self.assertEqual([(m["role"], m["content"]) for m in self.params["messages"]], [("user", "Hello?")])
+		self.assertTrue(self.params["stream"])
+		# Nothing the server should fall back to its own defaults for:
+		self.assertNotIn("options", self.params)
+		self.assertNotIn("keep_alive", self.params)
+	
+	def test_limits_are_passed_as_options(self):
+		self.stream([chunk("", done=True, done_reason="stop")], num_predict=100, num_ctx=4096)
+		self.assertEqual(self.params["options"], {"num_predict":100, "num_ctx":4096})
+		
+		self.stream([chunk("", done=True, done_reason="stop")], max_tokens=7, num_predict=100)
+		self.assertEqual(self.params["options"], {"num_predict":7})
+	
+	def test_keep_alive(self):
+		self.stream([chunk("", done=True, done_reason="stop")], keep_alive="10m")
+		self.assertEqual(self.params["keep_alive"], "10m")
+		self.stream([chunk("", done=True, done_reason="stop")], keep_alive="-1")
+		self.assertEqual(self.params["keep_alive"], -1)
+		self.stream([chunk("", done=True, done_reason="stop")], keep_alive="300")
+		self.assertEqual(self.params["keep_alive"], 300)
+	
+	def test_each_chunk_is_streamed(self):
+		self.stream([chunk("Hel"), chunk("lo"), chunk("!"), chunk("", done=True, done_reason="stop")])
+		self.assertEqual(self.contents, ["", "Hel", "Hello", "Hello!", "Hello!"])
+	
+	def test_stopping_closes_the_stream(self):
+		responses = self.llm(FakeStream([chunk(f" {i}") for i in range(10)])).chat(conversation(), stream=True)
+		response = next(responses)
+		next(responses)
+		response.stop()
+		remaining = list(responses)
+		self.assertLessEqual(len(remaining), 1)
+		self.assertTrue(self.completion.closed)
+		self.assertEqual(response.message.content, " 0")
+		self.assertFalse(response.source.finished)
+	
+	def test_not_streamed(self):
+		llm = self.llm({"message":{"role":"assistant", "content":"Hello"}, "done":True, "done_reason":"stop", "prompt_eval_count":9, "eval_count":2})
+		response = llm.chat(conversation())
+		self.assertFalse(self.params["stream"])
+		self.assertEqual(response.message.content, "Hello")
+		self.assertEqual((response.source.in_token_count, response.source.out_token_count), (9, 2))
+		self.assertTrue(response.source.finished)
+	
+	def test_async_stream(self):
+		llm = self.llm(None, num_predict=5)
+		completion = FakeAsyncStream([chunk("Hel"), chunk("lo"), chunk("", done=True, done_reason="stop", prompt_eval_count=9, eval_count=2)])
+		params = {}
+		async def chat(**kwargs):
+			params.update(kwargs)
+			return completion
+		llm.async_client = SimpleNamespace(get=lambda: SimpleNamespace(chat=chat))
+		
+		async def contents():
+			return [response async for response in llm.achat(conversation(), stream=True)]
+		responses = asyncio.run(contents())
+		self.assertEqual(params["options"], {"num_predict":5})
+		self.assertEqual(responses[-1].message.content, "Hello")
+		self.assertEqual(responses[-1].source.out_token_count, 2)
+		self.assertTrue(completion.closed)
+	
+	def test_usage_is_read_from_the_done_chunk(self):
+		response = self.stream([
+			chunk("Hel"), chunk("lo"), chunk("", done=True, done_reason="stop", prompt_eval_count=9, eval_count=2)
+		])
+		self.assertEqual(response.message.content, "Hello")
+		self.assertEqual((response.source.in_token_count, response.source.out_token_count), (9, 2))
+		self.assertTrue(response.source.finished)
+		self.assertTrue(self.completion.closed)
+	
+	def test_chunks_with_text_are_counted_without_usage(self):
+		response = self.stream([chunk("Hel"), chunk("lo"), chunk("", done=True, done_reason="length")])
+		self.assertEqual(response.source.out_token_count, 2)
+		self.assertFalse(response.source.finished)
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
@@ -0,0 +1,116 @@
+import unittest
+from types import SimpleNamespace
+from AbstractAI.Model.Converse import *
+from AbstractAI.LLMs.LLM_Response import LLM_Response
+from AbstractAI.LLMs.OpenAI_LLM import OpenAI_LLM
+from AbstractAI.LLMs.Groq_LLM import Groq_LLM
+from AbstractAI.Model.Settings.OpenAI_LLMSettings import OpenAI_LLMSettings
+from AbstractAI.Model.Settings.Groq_LLMSettings import Groq_LLMSettings
+
+class WordCountingOpenAI(OpenAI_LLM):
+	'''Counts words rather than loading a tiktoken encoding.'''
+	def count_tokens(self, text:str, model_name:str=None) -> int:
+		return len(text.split())
+	
+	def tokenizer_id(self) -> str:
+		return "test:words"
+
+class WordCountingGroq(Groq_LLM, WordCountingOpenAI):
+	pass
+
+def chunk(content:str=None, finish_reason:str=None, usage=None, choices:bool=True, **fields):
+	'''A stand in for a ChatCompletionChunk.'''
+	return SimpleNamespace(
+		choices=[SimpleNamespace(delta=SimpleNamespace(content=content), finish_reason=finish_reason)] if choices else [],
+		usage=usage,
+		**fields
+	)
+
+def usage(prompt_tokens:int, completion_tokens:int) -> SimpleNamespace:
+	return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+class FakeStream:
+	def __init__(self, chunks, error:Exception=None):
+		self.chunks = chunks
+		self.error = error
+		self.closed = False
+	
+	def __iter__(self):
+		yield from self.chunks
+		if self.error is not None:
+			raise self.error
+	
+	def close(self):
+		self.closed = True
+
+def fake_client(completion) -> SimpleNamespace:
+	return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **params: completion)))
+
+def conversation() -> Conversation:
+	conv = Conversation()
+	conv.add_message(Message("Say hello please", UserSource()))
+	return conv
+
+class TestOpenAI_LLM(unittest.TestCase):
+	def test_temperature_is_left_to_the_server_by_default(self):
+		llm = OpenAI_LLM(OpenAI_LLMSettings(model_name="gpt-4o"))
+		self.assertNotIn("temperature", llm._completion_params([], False, None))
+		self.assertFalse(llm.is_deterministic())
+	
+	def test_temperature_is_sent_once_set(self):
+		llm = OpenAI_LLM(OpenAI_LLMSettings(model_name="gpt-4o", temperature=0))
+		self.assertEqual(llm._completion_params([], False, None)["temperature"], 0)
+		self.assertTrue(llm.is_deterministic())
+	
+	def test_streams_ask_for_usage(self):
+		llm = OpenAI_LLM(OpenAI_LLMSettings(model_name="gpt-4o"))
+		self.assertEqual(llm._completion_params([], True, None)["stream_options"], {"include_usage":True})
+		self.assertNotIn("stream_options", llm._completion_params([], False, None))
+		# Groq always reports it:
+		groq = Groq_LLM(Groq_LLMSettings(model_name="llama3"))
+		self.assertNotIn("stream_options", groq._completion_params([], True, None))
+	
+	def stream(self, llm:OpenAI_LLM, chunks) -> LLM_Response:
+		llm.client = fake_client(FakeStream(chunks))
+		for response in llm.chat(conversation(), stream=True):
+			pass
+		return response
+	
+	def test_usage_chunk_without_choices(self):
+		response = self.stream(WordCountingOpenAI(OpenAI_LLMSettings(model_name="gpt-4o")), [
+			chunk("Hel"), chunk("lo", finish_reason="stop"), chunk(choices=False, usage=usage(12, 3))
+		])
+		self.assertEqual(response.message.content, "Hello")
+		self.assertEqual((response.source.in_token_count, response.source.out_token_count), (12, 3))
+		self.assertTrue(response.source.finished)
+		self.assertEqual(len(response.chunk_log), 3)
+	
+	def test_groq_usage_is_read_from_x_groq(self):
+		response = self.stream(WordCountingGroq(Groq_LLMSettings(model_name="llama3")), [
+			chunk("Hel", x_groq=None), chunk("lo", finish_reason="stop", x_groq=SimpleNamespace(usage=usage(7, 2)))
+		])
+		self.assertEqual((response.source.in_token_count, response.source.out_token_count), (7, 2))
+	
+	def test_chunks_with_text_are_counted_without_usage(self):
+		response = self.stream(WordCountingOpenAI(OpenAI_LLMSettings(model_name="gpt-4o")), [
+			chunk("Hel"), chunk(""), chunk("lo"), chunk(None, finish_reason="length")
+		])
+		self.assertEqual(response.source.out_token_count, 2)
+		# Still the prompt we counted ourselves:
+		self.assertEqual(response.source.in_token_count, len(response.source.full_prompt().split()))
+		self.assertFalse(response.source.finished)
+	
+	def test_failed_stream_settles_its_reservation(self):
+		llm = WordCountingOpenAI(OpenAI_LLMSettings(model_name="gpt-4o", api_key="test_failed_stream", tokens_per_minute=1000))
+		stream = FakeStream([chunk("Hel"), chunk("lo")], ConnectionError())
+		llm.client = fake_client(stream)
+		
+		with self.assertRaises(ConnectionError):
+			for response in llm.chat(conversation(), stream=True, max_tokens=500):
+				pass
+		# Only what the prompt used is still reserved, not the 500 it could have generated:
+		scheduler = llm._scheduler()
+		self.assertGreater(scheduler._tokens.available, 900)
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
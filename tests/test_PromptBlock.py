@@ -0,0 +1,81 @@
+import unittest
+from AbstractAI.Model.Converse.PromptBlock import PromptBlock
+from AbstractAI.Model.Converse.MessageSources import ModelSource
+
+class TestPromptBlock(unittest.TestCase):
+	def setUp(self):
+		self.max_text_length = PromptBlock.max_text_length
+		PromptBlock.max_text_length = 16
+	
+	def tearDown(self):
+		PromptBlock.max_text_length = self.max_text_length
+	
+	def test_round_trip(self):
+		for text in ["", "short", "x" * 16, "a longer prompt than fits in one block"]:
+			self.assertEqual(PromptBlock.store(text).full_text(), text)
+	
+	def test_shares_previous_prefix(self):
+		prompts = []
+		text = "system: be helpful\n"
+		for i in range(50):
+			text += f"user: question {i}\nassistant: answer {i}\n"
+			prompts.append(text)
+		
+		previous = None
+		stored = 0
+		for prompt in prompts:
+			block = PromptBlock.store(prompt, previous)
+			self.assertEqual(block.full_text(), prompt)
+			shared = set(id(b) for b in previous.chain()) if previous is not None else set()
+			stored += sum(len(b.text) for b in block.chain() if id(b) not in shared)
+			previous = block
+		
+		# Each prompt only repeats at most one partial block of the one before it:
+		self.assertLessEqual(stored, len(prompts[-1]) + len(prompts) * PromptBlock.max_text_length)
+	
+	def test_diverging_prompt(self):
+		first = PromptBlock.store("the same start, then one ending")
+		second = PromptBlock.store("the same start, then another", first)
+		self.assertEqual(second.full_text(), "the same start, then another")
+		self.assertIs(second.chain()[0], first.chain()[0])
+	
+	def test_chain_depth_is_bounded(self):
+		text = ""
+		block = None
+		for i in range(200):
+			text += f"turn {i}\n"
+			block = PromptBlock.store(text, block)
+		
+		chain = block.chain()
+		self.assertEqual(len(chain), -(-len(text) // PromptBlock.max_text_length))
+		self.assertTrue(all(len(b.text) == PromptBlock.max_text_length for b in chain[:-1]))
+		self.assertEqual([b.length for b in chain], [sum(len(c.text) for c in chain[:i+1]) for i in range(len(chain))])
+	
+	def test_short_blocks_are_collapsed(self):
+		# A chain of short blocks, like those stored before blocks had to be full:
+		block = None
+		for piece in ["ab", "cd", "ef", "gh"]:
+			block = PromptBlock(piece, block, (block.length if block is not None else 0) + len(piece))
+		
+		collapsed = PromptBlock.store("abcdefgh and then some more", block)
+		self.assertEqual(collapsed.full_text(), "abcdefgh and then some more")
+		self.assertEqual([len(b.text) for b in collapsed.chain()], [16, 11])
+	
+	def test_full_prompt(self):
+		first = ModelSource()
+		first.store_prompt("system: hi\nuser: a question\n")
+		second = ModelSource()
+		second.store_prompt("system: hi\nuser: a question\nassistant: an answer\nuser: another\n", first)
+		
+		self.assertIsNone(second.prompt)
+		self.assertIs(second.prompt_block.chain()[0], first.prompt_block.chain()[0])
+		# Rebuilt from the blocks, as it is once loaded:
+		second._prompt_text = None
+		self.assertEqual(second.full_prompt(), "system: hi\nuser: a question\nassistant: an answer\nuser: another\n")
+		
+		legacy = ModelSource(prompt="a whole prompt")
+		self.assertEqual(legacy.full_prompt(), "a whole prompt")
+		self.assertIsNone(ModelSource().full_prompt())
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
@@ -0,0 +1,159 @@
+import unittest
+import asyncio
+from AbstractAI.LLMs.RateLimiter import TokenBucket, RequestScheduler
+
+class FakeClock:
+	def __init__(self):
+		self.now = 0.0
+		self.sleeps = []
+		self.async_sleeps = []
+	
+	def __call__(self) -> float:
+		return self.now
+	
+	def sleep(self, seconds:float):
+		self.sleeps.append(seconds)
+		self.now += seconds
+	
+	async def async_sleep(self, seconds:float):
+		self.async_sleeps.append(seconds)
+		self.now += seconds
+		await asyncio.sleep(0)
+
+class RateLimited(Exception):
+	status_code = 429
+
+class TestTokenBucket(unittest.TestCase):
+	def test_refills_over_time(self):
+		clock = FakeClock()
+		bucket = TokenBucket(60, clock)
+		bucket.take(60)
+		self.assertAlmostEqual(bucket.wait_time(30), 30)
+		clock.now += 10
+		self.assertAlmostEqual(bucket.wait_time(30), 20)
+		clock.now += 1000
+		self.assertEqual(bucket.wait_time(60), 0)
+		self.assertAlmostEqual(bucket.available, 60)
+	
+	def test_wait_is_capped_at_capacity(self):
+		bucket = TokenBucket(60, FakeClock())
+		bucket.take(60)
+		self.assertAlmostEqual(bucket.wait_time(1000), 60)
+
+class TestRequestScheduler(unittest.TestCase):
+	def scheduler(self, **kwargs) -> RequestScheduler:
+		self.clock = FakeClock()
+		return RequestScheduler(clock=self.clock, sleep=self.clock.sleep, async_sleep=self.clock.async_sleep, jitter=lambda: 0.5, **kwargs)
+	
+	def test_requests_per_minute(self):
+		scheduler = self.scheduler(requests_per_minute=60)
+		for i in range(61):
+			scheduler.acquire(0)
+		self.assertAlmostEqual(self.clock.now, 1)
+		self.assertEqual(scheduler.stats.requests, 61)
+		self.assertAlmostEqual(scheduler.stats.max_wait_seconds, 1)
+		self.assertEqual(scheduler.queue_depth, 0)
+	
+	def test_tokens_per_minute_and_settling(self):
+		scheduler = self.scheduler(tokens_per_minute=600)
+		reservation = scheduler.acquire(600)
+		scheduler.settle(reservation, 300)
+		
+		# What the first request didn't use was given back:
+		scheduler.acquire(300)
+		self.assertAlmostEqual(self.clock.now, 0)
+		scheduler.acquire(60)
+		self.assertAlmostEqual(self.clock.now, 6)
+	
+	def test_no_limits(self):
+		scheduler = self.scheduler()
+		for i in range(1000):
+			scheduler.acquire(1000)
+		self.assertEqual(self.clock.sleeps, [])
+	
+	def test_retries_rate_limited_requests(self):
+		scheduler = self.scheduler(base_backoff=2)
+		attempts = []
+		def request():
+			attempts.append(self.clock.now)
+			if len(attempts) < 3:
+				raise RateLimited()
+			return "done"
+		
+		result, reservation = scheduler.run(request, 10, lambda e: getattr(e, "status_code", None) == 429)
+		self.assertEqual(result, "done")
+		self.assertEqual(scheduler.stats.rate_limited, 2)
+		# Backoff of 2 then 4 seconds, each with 3/4 of it after jitter:
+		self.assertEqual(attempts, [0, 1.5, 4.5])
+	
+	def test_retries_are_refunded_their_tokens(self):
+		scheduler = self.scheduler(tokens_per_minute=600, base_backoff=1)
+		attempts = []
+		def request():
+			attempts.append(self.clock.now)
+			if len(attempts) < 2:
+				raise RateLimited()
+			return "done"
+		
+		scheduler.run(request, 600, lambda e: True)
+		# Only the backoff, not a minute waiting for the first attempt's tokens:
+		self.assertEqual(attempts, [0, 0.75])
+	
+	def test_async_requests_wait_without_blocking(self):
+		scheduler = self.scheduler(requests_per_minute=60, base_backoff=2)
+		attempts = []
+		async def request():
+			attempts.append(self.clock.now)
+			if len(attempts) == 2:
+				raise RateLimited()
+			return "done"
+		async def requests():
+			for i in range(3):
+				await scheduler.arun(request, 0, lambda e: True)
+		
+		asyncio.run(requests())
+		self.assertEqual(scheduler.stats.requests, 4)
+		self.assertEqual(scheduler.stats.rate_limited, 1)
+		self.assertEqual(scheduler.queue_depth, 0)
+		# The bucket starts full, then the backoff of 1.5 seconds:
+		self.assertEqual(attempts, [0, 0, 1.5, 1.5])
+		self.assertEqual(self.clock.sleeps, [])
+		self.assertEqual(self.clock.async_sleeps, [1.5])
+	
+	def test_retry_after_is_respected(self):
+		scheduler = self.scheduler(base_backoff=1)
+		attempts = []
+		def request():
+			attempts.append(self.clock.now)
+			if len(attempts) < 2:
+				raise RateLimited()
+			return "done"
+		
+		scheduler.run(request, 10, lambda e: True, lambda e: 30)
+		self.assertEqual(attempts, [0, 30])
+	
+	def test_gives_up_after_max_retries(self):
+		scheduler = self.scheduler(max_retries=2)
+		def request():
+			raise RateLimited()
+		with self.assertRaises(RateLimited):
+			scheduler.run(request, 10, lambda e: True)
+		self.assertEqual(scheduler.stats.requests, 3)
+	
+	def test_other_errors_are_not_retried(self):
+		scheduler = self.scheduler()
+		def request():
+			raise ValueError()
+		with self.assertRaises(ValueError):
+			scheduler.run(request, 10, lambda e: isinstance(e, RateLimited))
+		self.assertEqual(scheduler.stats.requests, 1)
+	
+	def test_shared(self):
+		a = RequestScheduler.shared(("test_shared", "key"), 10, 100)
+		self.assertIs(RequestScheduler.shared(("test_shared", "key"), 10, 100), a)
+		self.assertIs(RequestScheduler.shared(("test_shared", "key"), 20, 100), a)
+		self.assertEqual(a.requests_per_minute, 20)
+		self.assertIsNot(RequestScheduler.shared(("test_shared", "other key"), 10, 100), a)
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
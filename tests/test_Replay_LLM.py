@@ -0,0 +1,76 @@
+import unittest
+from AbstractAI.Model.Converse import *
+from AbstractAI.LLMs.Replay_LLM import Replay_LLM
+from AbstractAI.LLMs.Synthetic_LLM import Synthetic_LLM
+from AbstractAI.LLMs.ChunkLog import ChunkLog
+from AbstractAI.Model.Settings.Replay_LLMSettings import Replay_LLMSettings
+from AbstractAI.Model.Settings.Synthetic_LLMSettings import Synthetic_LLMSettings
+
+def conversation() -> Conversation:
+	conv = Conversation()
+	conv.add_message(Message("Tell me a story.", UserSource()))
+	return conv
+
+def chunk_log(message:Message) -> ChunkLog:
+	return ChunkLog.deserialize(message.source.serialized_raw_output["ChunkLog"])
+
+class TestReplay_LLM(unittest.TestCase):
+	def record(self, start_str:str="") -> Message:
+		'''Streams a message from a seeded synthetic model, 2 words every 20ms.'''
+		llm = Synthetic_LLM(Synthetic_LLMSettings(time_to_first_token=0.02, tokens_per_second=100, chunk_tokens=2, jitter=0, response_tokens=10, seed=3))
+		llm.start()
+		for response in llm.chat(conversation(), start_str=start_str, stream=True):
+			pass
+		return response.message
+	
+	def replay(self, recorded:Message, speed:float=1, start_str:str="") -> Message:
+		llm = Replay_LLM(Replay_LLMSettings(speed=speed), message=recorded)
+		llm.start()
+		self.streamed = []
+		for response in llm.chat(conversation(), start_str=start_str, stream=True):
+			self.streamed.append(response.message.content)
+		return response.message
+	
+	def test_round_trip(self):
+		recorded = self.record()
+		replayed = self.replay(recorded)
+		
+		self.assertEqual(replayed.content, recorded.content)
+		self.assertEqual(chunk_log(replayed).deltas, chunk_log(recorded).deltas)
+		self.assertEqual(self.streamed[1:], ["".join(chunk_log(recorded).deltas[:i + 1]) for i in range(5)])
+		self.assertEqual(
+			(replayed.source.in_token_count, replayed.source.out_token_count, replayed.source.finished),
+			(recorded.source.in_token_count, recorded.source.out_token_count, recorded.source.finished)
+		)
+		self.assertEqual(replayed.source.serialized_raw_output["Replay"]["message"], recorded.auto_id)
+	
+	def test_keeps_the_recorded_pace(self):
+		recorded = self.record()
+		span = lambda message: chunk_log(message).times[-1] - chunk_log(message).times[0]
+		self.assertGreaterEqual(span(self.replay(recorded)), span(recorded) * 0.9)
+		self.assertLess(span(self.replay(recorded, speed=4)), span(recorded))
+	
+	def test_all_at_once(self):
+		recorded = self.record()
+		self.assertEqual(self.replay(recorded, speed=0).content, recorded.content)
+		self.assertEqual(len(self.streamed), 6)
+	
+	def test_start_str_is_kept(self):
+		recorded = self.record(start_str="Once")
+		replayed = self.replay(recorded, speed=0, start_str="Once")
+		self.assertEqual(replayed.content, recorded.content)
+		self.assertEqual(self.streamed[0], "Once")
+	
+	def test_legacy_chunks(self):
+		message = Message("Hello!", ModelSource(out_token_count=3, finished=True))
+		message.source.serialized_raw_output["Chunks"] = [
+			{"choices":[{"delta":{"content":"Hel"}}]},
+			{"choices":[{"text":"lo"}]},
+			{"message":{"content":"!"}}
+		]
+		replayed = self.replay(message, speed=0)
+		self.assertEqual(self.streamed, ["", "Hel", "Hello", "Hello!"])
+		self.assertEqual((replayed.source.out_token_count, replayed.source.finished), (3, True))
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
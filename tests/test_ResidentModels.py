@@ -0,0 +1,97 @@
+import unittest
+from AbstractAI.LLMs.ResidentModels import ResidentModels
+
+class FakeLLM:
+	def __init__(self, settings:"FakeSettings"):
+		self.settings = settings
+		self.started = False
+		self.in_flight = 0
+	
+	def start(self):
+		self.settings.loads += 1
+		self.started = True
+	
+	def unload(self):
+		self.started = False
+	
+	def memory_footprint(self) -> int:
+		return self.settings.footprint_mb * 1024 * 1024
+
+class FakeSettings:
+	def __init__(self, auto_id:str, footprint_mb:int):
+		self.auto_id = auto_id
+		self.user_model_name = auto_id
+		self.footprint_mb = footprint_mb
+		self.loads = 0
+	
+	def load(self) -> FakeLLM:
+		return FakeLLM(self)
+
+class TestResidentModels(unittest.TestCase):
+	def test_reuses_loaded_models(self):
+		models = ResidentModels(ram_budget_mb=100)
+		a = FakeSettings("a", 10)
+		llm = models.get(a)
+		self.assertIs(models.get(a), llm)
+		self.assertEqual(a.loads, 1)
+		self.assertTrue(llm.started)
+	
+	def test_evicts_least_recently_used_over_budget(self):
+		models = ResidentModels(ram_budget_mb=100)
+		a, b, c = FakeSettings("a", 40), FakeSettings("b", 40), FakeSettings("c", 40)
+		llm_a = models.get(a)
+		llm_b = models.get(b)
+		models.get(a)
+		models.get(c)
+		
+		self.assertIn(a, models)
+		self.assertNotIn(b, models)
+		self.assertIn(c, models)
+		self.assertFalse(llm_b.started)
+		self.assertTrue(llm_a.started)
+		self.assertEqual(models.footprint_bytes(), 80 * 1024 * 1024)
+		self.assertEqual([e.kind for e in models.history], ["load", "load", "load", "evict"])
+	
+	def test_keeps_newest_model_even_if_over_budget(self):
+		models = ResidentModels(ram_budget_mb=0)
+		a, b = FakeSettings("a", 10), FakeSettings("b", 10)
+		models.get(a)
+		models.get(b)
+		self.assertEqual(len(models), 1)
+		self.assertIn(b, models)
+	
+	def test_keeps_models_with_requests_in_flight(self):
+		models = ResidentModels(ram_budget_mb=50)
+		a, b, c = FakeSettings("a", 40), FakeSettings("b", 40), FakeSettings("c", 40)
+		llm_a = models.get(a)
+		llm_a.in_flight = 1
+		models.get(b)
+		self.assertIn(a, models)
+		self.assertTrue(llm_a.started)
+		
+		llm_a.in_flight = 0
+		models.get(c)
+		self.assertNotIn(a, models)
+		self.assertNotIn(b, models)
+		self.assertFalse(llm_a.started)
+	
+	def test_caps_models_without_footprints(self):
+		models = ResidentModels(ram_budget_mb=100, max_models=2)
+		remote = [FakeSettings(name, 0) for name in "abc"]
+		for settings in remote:
+			models.get(settings)
+		self.assertEqual(len(models), 2)
+		self.assertNotIn(remote[0], models)
+	
+	def test_evict(self):
+		models = ResidentModels(ram_budget_mb=100)
+		a = FakeSettings("a", 10)
+		llm = models.get(a)
+		self.assertTrue(models.evict(a))
+		self.assertFalse(models.evict(a))
+		self.assertFalse(llm.started)
+		models.get(a)
+		self.assertEqual(a.loads, 2)
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
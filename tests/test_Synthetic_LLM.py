@@ -0,0 +1,70 @@
+import unittest
+from AbstractAI.Model.Converse import *
+from AbstractAI.LLMs.Synthetic_LLM import Synthetic_LLM, SyntheticFailure
+from AbstractAI.LLMs.ChunkLog import ChunkLog
+from AbstractAI.Model.Settings.Synthetic_LLMSettings import Synthetic_LLMSettings
+
+def conversation() -> Conversation:
+	conv = Conversation()
+	conv.add_message(Message("Tell me a story.", UserSource()))
+	return conv
+
+class TestSynthetic_LLM(unittest.TestCase):
+	def llm(self, **settings) -> Synthetic_LLM:
+		settings = {"time_to_first_token":0, "tokens_per_second":0, "jitter":0, "response_tokens":12, "seed":1, **settings}
+		llm = Synthetic_LLM(Synthetic_LLMSettings(**settings))
+		llm.start()
+		return llm
+	
+	def stream(self, llm:Synthetic_LLM, max_tokens:int=None):
+		self.streamed = 0
+		for response in llm.chat(conversation(), stream=True, max_tokens=max_tokens):
+			self.streamed += 1
+		return response
+	
+	def test_output_length(self):
+		self.assertEqual(len(self.llm().chat(conversation()).message.content.split()), 12)
+		self.assertEqual(len(self.llm().chat(conversation(), max_tokens=5).message.content.split()), 5)
+	
+	def test_seeded_output_repeats(self):
+		first = self.llm(seed=7).chat(conversation()).message.content
+		self.assertEqual(self.llm(seed=7).chat(conversation()).message.content, first)
+		self.assertNotEqual(self.llm(seed=8).chat(conversation()).message.content, first)
+	
+	def test_streamed_chunks(self):
+		response = self.stream(self.llm(chunk_tokens=5), max_tokens=12)
+		# The empty response, then chunks of 5, 5 and 2 words:
+		self.assertEqual(self.streamed, 4)
+		log = ChunkLog.deserialize(response.source.serialized_raw_output["ChunkLog"])
+		self.assertEqual([len(delta.split()) for delta in log.deltas], [5, 5, 2])
+		self.assertEqual(log.text(), response.message.content)
+		self.assertEqual(log.finish_reasons, {2:"length"})
+	
+	def test_finish_and_usage(self):
+		response = self.stream(self.llm(), max_tokens=6)
+		self.assertTrue(response.source.finished)
+		self.assertFalse(response.source.generating)
+		self.assertEqual(response.source.out_token_count, 6)
+		self.assertGreater(response.source.in_token_count, 0)
+	
+	def test_start_str_is_continued(self):
+		response = self.llm().chat(conversation(), start_str="Once", max_tokens=3)
+		self.assertTrue(response.message.content.startswith("Once "))
+		self.assertEqual(len(response.message.content.split()), 4)
+	
+	def test_stopping(self):
+		responses = self.llm(response_tokens=1000).chat(conversation(), stream=True)
+		response = next(responses)
+		next(responses)
+		response.stop()
+		for response in responses:
+			pass
+		self.assertFalse(response.source.finished)
+		self.assertLess(response.source.out_token_count, 1000)
+	
+	def test_failure(self):
+		with self.assertRaises(SyntheticFailure):
+			self.llm(failure_rate=1).chat(conversation())
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
@@ -0,0 +1,72 @@
+import unittest
+from AbstractAI.LLMs.LLM import LLM
+from AbstractAI.LLMs.TokenCountCache import TokenCountCache
+from AbstractAI.Model.Settings.LLMSettings import LLMSettings
+
+class AlternatingLLM(LLM):
+	'''A Llama-2 like template that rejects two turns in a row from the same side.'''
+	def __init__(self, tokenizer_id:str):
+		super().__init__(LLMSettings())
+		self._tokenizer_id = tokenizer_id
+		self.renders = 0
+	
+	def _apply_chat_template(self, chat, start_str=""):
+		self.renders += 1
+		prompt = "<s>"
+		previous = None
+		for entry in chat:
+			role = "user" if entry["role"] == "system" else entry["role"]
+			if role == previous:
+				raise ValueError("Conversation roles must alternate user/assistant/user/assistant/...")
+			if entry["role"] == "system":
+				prompt += f" [SYS] {entry['content']} [/SYS]"
+			elif role == "user":
+				prompt += f" [INST] {entry['content']} [/INST]"
+			else:
+				prompt += f" {entry['content']} </s>"
+			previous = role
+		return prompt
+	
+	def count_tokens(self, text:str) -> int:
+		return len(text.split())
+	
+	def tokenizer_id(self) -> str:
+		return self._tokenizer_id
+
+class BrokenLLM(AlternatingLLM):
+	def _apply_chat_template(self, chat, start_str=""):
+		self.renders += 1
+		raise ValueError("No chat template.")
+
+class TestTemplateOverhead(unittest.TestCase):
+	def setUp(self):
+		TokenCountCache.singleton.clear()
+		self.addCleanup(TokenCountCache.singleton.clear)
+	
+	def test_template_that_must_alternate(self):
+		llm = AlternatingLLM("test:alternating")
+		overhead = llm.template_overhead()
+		self.assertTrue(overhead.calibrated)
+		self.assertEqual(overhead.per_message, {"user":2, "assistant":1, "system":2})
+		self.assertEqual(overhead.base, 1)
+		
+		renders = llm.renders
+		llm.template_overhead()
+		AlternatingLLM("test:alternating").template_overhead()
+		self.assertEqual(llm.renders, renders)
+	
+	def test_failed_calibration_is_cached(self):
+		llm = BrokenLLM("test:broken")
+		overhead = llm.template_overhead()
+		self.assertFalse(overhead.calibrated)
+		self.assertEqual(overhead.estimate([{"role":"user"}] * 200, 1000), 1000)
+		
+		llm.template_overhead()
+		self.assertEqual(llm.renders, 1)
+		
+		TokenCountCache.singleton.forget_uncalibrated("test:broken")
+		llm.template_overhead()
+		self.assertEqual(llm.renders, 2)
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
@@ -0,0 +1,56 @@
+import unittest
+from AbstractAI.LLMs.TokenCountCache import TokenCountCache, TemplateOverhead
+
+class TestTokenCountCache(unittest.TestCase):
+	def setUp(self) -> None:
+		self.counted = []
+		return super().setUp()
+	
+	def count_words(self, text:str) -> int:
+		self.counted.append(text)
+		return len(text.split())
+	
+	def test_counts_once_per_key(self):
+		cache = TokenCountCache()
+		self.assertEqual(cache.count("words", "msg1", "hello there", self.count_words), 2)
+		self.assertEqual(cache.count("words", "msg1", "hello there", self.count_words), 2)
+		self.assertEqual(self.counted, ["hello there"])
+		self.assertEqual(cache.hits, 1)
+		self.assertEqual(cache.misses, 1)
+	
+	def test_tokenizers_are_separate(self):
+		cache = TokenCountCache()
+		cache.count("words", "msg1", "a b c", self.count_words)
+		self.assertEqual(cache.count("chars", "msg1", "a b c", len), 5)
+		self.assertEqual(len(cache), 2)
+	
+	def test_changed_text_is_recounted(self):
+		cache = TokenCountCache()
+		cache.count("words", "msg1", "a", self.count_words)
+		self.assertEqual(cache.count("words", "msg1", "a b", self.count_words), 2)
+		self.assertEqual(self.counted, ["a", "a b"])
+		self.assertEqual(len(cache), 1)
+	
+	def test_least_recently_used_is_evicted(self):
+		cache = TokenCountCache(max_entries=2)
+		cache.count("words", "msg1", "a", self.count_words)
+		cache.count("words", "msg2", "b", self.count_words)
+		cache.count("words", "msg1", "a", self.count_words)
+		cache.count("words", "msg3", "c", self.count_words)
+		self.assertEqual(len(cache), 2)
+		
+		cache.count("words", "msg1", "a", self.count_words)
+		cache.count("words", "msg2", "b", self.count_words)
+		self.assertEqual(self.counted, ["a", "b", "c", "b"])
+	
+	def test_template_overhead_estimate(self):
+		overhead = TemplateOverhead(base=1, per_message={"user":4, "assistant":5})
+		chat = [
+			{"role":"user", "content":"..."},
+			{"role":"assistant", "content":"..."},
+			{"role":"system", "content":"..."}
+		]
+		self.assertEqual(overhead.estimate(chat, 10), 1 + 10 + 4 + 5 + 4)
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
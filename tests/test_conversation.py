@@ -1,5 +1,7 @@
 import unittest
+from datetime import timedelta
 from AbstractAI.Model.Converse import *
+from AbstractAI.Model.Converse.GenerationTiming import GenerationTiming
 from ClassyFlaskDB.DATA import DATAEngine, print_DATA_json
 
 class TestConversation(unittest.TestCase):
@@ -25,6 +27,24 @@ class TestConversation(unittest.TestCase):
 		self.assertEqual(conv.message_sequence.messages[1], msg2)
 		self.assertEqual(conv.message_sequence.messages[2], msg3)
 
+	def test_add_messages_at_once(self):
+		conv = Conversation()
+		user_source = UserSource()
+		conv.add_message(Message("Hello", user_source))
+		first_sequence = conv.message_sequence
+		
+		added = []
+		conv.message_added.connect(added.append)
+		messages = [Message(str(i), user_source) for i in range(3)]
+		conv.add_messages(messages)
+		
+		self.assertEqual(conv.message_sequence.messages[1:], messages)
+		self.assertIs(messages[0].prev_message, conv.message_sequence.messages[0])
+		self.assertIs(messages[2].prev_message, messages[1])
+		self.assertEqual(added, messages)
+		self.assertEqual(len(first_sequence.messages), 1)
+		self.assertNotEqual(conv.message_sequence.get_primary_key(), first_sequence.get_primary_key())
+	
 	def test_message_sequence_id_changes(self):
 		conv = Conversation()
 		user_source = UserSource()
@@ -256,6 +276,18 @@ class TestConversation(unittest.TestCase):
 		self.assertEqual(len(alternates), len(all_sequences))
 		for real_alt, alt in zip(all_sequences, alternates):
 			self.assertEqual(real_alt.get_primary_key(), alt.get_primary_key())
+	
+	def test_generation_timing_query(self):
+		day = get_local_time().replace(hour=12, minute=0, second=0, microsecond=0)
+		for index, (model_name, start_time) in enumerate([("a", day), ("b", day + timedelta(minutes=30)), ("a", day + timedelta(days=1)), ("a", day - timedelta(days=1))]):
+			self.engine.merge(GenerationTiming(model_name=model_name, start_time=start_time, total_seconds=index))
+		
+		query = lambda **kwargs: [timing.total_seconds for timing in GenerationTiming.query(self.engine, **kwargs)]
+		self.assertEqual(query(model_name="a"), [3, 0, 2])
+		self.assertEqual(query(model_name="b"), [1])
+		self.assertEqual(query(model_name="a", since=day), [0, 2])
+		self.assertEqual(query(model_name="a", since=day, until=day + timedelta(days=1)), [0])
+		self.assertEqual(query(until=day + timedelta(hours=1)), [3, 0, 1])
 		
 if __name__ == '__main__':
 	unittest.main()
\ No newline at end of file